@@ -1,17 +1,77 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_from_directory
+from flask import Flask, Response, stream_with_context, render_template, request, redirect, url_for, flash, jsonify, abort
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from werkzeug.utils import secure_filename
-from models import db, User, Student, Attendance, LostFound, Complaint, Message, Note, Teacher, LostFoundImage
+from werkzeug.security import safe_join
+import click
+from sqlalchemy.orm import joinedload, selectinload
+from models import db, User, Student, LostFound, Complaint, Message, Note, Teacher, LostFoundImage
+from pagination import keyset_page
+import attendance_store
+import archive
+from attendance_store import ATTENDANCE_STATUSES, upsert_attendance
+from stats import get_dashboard_stats, rebuild_counters
+import reports
+from chatbot import get_chatbot_response
+from search import SEARCH_SOURCES, rebuild_search_index, search as search_posts
+from images import generate_derivatives, has_derivatives, remove_derivatives, pick_variant
+from file_responses import send_stored_file
+from storage import store_upload, release, remove_orphan, is_blob_ref, blob_hash, blob_path, dedupe_existing_uploads
+import jobs
+from jobs import job_handler, enqueue
+from migrations import migrate, schema_version
+from query_plans import find_table_scans
+import query_audit
+import passwords
+import user_cache
+import page_cache
+import live
+import student_import
+import rollover
+import exports
+import metrics
+import hmac
 import os
+import time
 from datetime import datetime, date, timedelta
 import json
 
-app = Flask(__name__)
+app = Flask(__name__, template_folder='Templates')
 app.config['SECRET_KEY'] = 'your-secret-key-here-change-in-production'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///college_app.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///college_app.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['UPLOAD_FOLDER'] = 'static/uploads'
+app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', 'static/uploads')
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # Increased to 50MB max file size
+app.config['FEED_PAGE_SIZE'] = int(os.environ.get('FEED_PAGE_SIZE', 25))  # Posts per page on list views
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))  # Background job threads; 0 to run them with 'flask run-jobs'
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')  # Lets a Prometheus scraper read /metrics without a login
+app.config['QUERY_AUDIT'] = os.environ.get('QUERY_AUDIT') == '1'  # Log N+1 and template queries per request (development)
+app.config['QUERY_AUDIT_REPEAT_LIMIT'] = int(os.environ.get('QUERY_AUDIT_REPEAT_LIMIT', 3))  # Same statement more often is flagged
+app.config['QUERY_BUDGET'] = int(os.environ.get('QUERY_BUDGET', 15))  # Max queries per page for 'flask check-query-budget'
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')  # Older hashes are upgraded at login
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', max((os.cpu_count() or 2) // 2, 1)))  # 0 hashes on the request thread
+app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', 32))  # Hashes queued or running before logins are turned away
+app.config['PASSWORD_HASH_TIMEOUT'] = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+app.config['LOGIN_PHONE_BURST'] = int(os.environ.get('LOGIN_PHONE_BURST', 5))  # Attempts per phone number...
+app.config['LOGIN_PHONE_REFILL_SECONDS'] = float(os.environ.get('LOGIN_PHONE_REFILL_SECONDS', 60))  # ...plus one more every minute
+app.config['LOGIN_IP_BURST'] = int(os.environ.get('LOGIN_IP_BURST', 30))  # Attempts per client IP (a lab may share one)...
+app.config['LOGIN_IP_REFILL_SECONDS'] = float(os.environ.get('LOGIN_IP_REFILL_SECONDS', 2))  # ...plus one more every 2 seconds
+app.config['USER_CACHE_TTL'] = float(os.environ.get('USER_CACHE_TTL', 60))  # Seconds a logged-in user is cached; 0 disables
+app.config['USER_CACHE_POLL_SECONDS'] = float(os.environ.get('USER_CACHE_POLL_SECONDS', 2))  # How stale another worker's change may be
+app.config['USER_CACHE_SIZE'] = int(os.environ.get('USER_CACHE_SIZE', 10000))
+app.config['PAGE_CACHE_BACKEND'] = os.environ.get('PAGE_CACHE_BACKEND', 'memory')  # memory, disk (shared by workers) or none
+app.config['PAGE_CACHE_DIR'] = os.environ.get('PAGE_CACHE_DIR', os.path.join('instance', 'page_cache'))
+app.config['PAGE_CACHE_MAX_BYTES'] = int(os.environ.get('PAGE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+app.config['LIVE_MAX_STREAMS'] = int(os.environ.get('LIVE_MAX_STREAMS', 200))  # Streams plus waiting long polls per process; the rest get a 503 and retry
+app.config['LIVE_STREAM_SECONDS'] = int(os.environ.get('LIVE_STREAM_SECONDS', 300))  # Streams end and reconnect after this
+app.config['LIVE_HEARTBEAT_SECONDS'] = int(os.environ.get('LIVE_HEARTBEAT_SECONDS', 20))
+app.config['LIVE_LONG_POLL_SECONDS'] = int(os.environ.get('LIVE_LONG_POLL_SECONDS', 25))
+app.config['LIVE_POLL_SECONDS'] = float(os.environ.get('LIVE_POLL_SECONDS', 2))  # How often to look for other workers' posts
+app.config['ATTENDANCE_STORAGE'] = os.environ.get('ATTENDANCE_STORAGE', 'rows')  # rows or bitmap; see 'flask convert-attendance'
+app.config['ARCHIVE_DIR'] = os.environ.get('ARCHIVE_DIR', os.path.join('instance', 'archive'))  # One SQLite file per academic year
+app.config['ARCHIVE_AFTER_DAYS'] = int(os.environ.get('ARCHIVE_AFTER_DAYS', 730))  # Older records move there with 'flask archive'
+app.config['ARCHIVE_BATCH_SIZE'] = int(os.environ.get('ARCHIVE_BATCH_SIZE', 1000))  # Records moved per transaction
+app.config['ACADEMIC_YEAR_START_MONTH'] = int(os.environ.get('ACADEMIC_YEAR_START_MONTH', 7))  # July
+app.config['STUDENT_BRANCHES'] = [b for b in os.environ.get('STUDENT_BRANCHES', '').split(',') if b.strip()]  # Empty accepts any branch
 
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {
@@ -20,6 +80,15 @@ ALLOWED_EXTENSIONS = {
 }
 
 db.init_app(app)
+jobs.init_app(app)
+metrics.init_app(app)
+query_audit.init_app(app)
+passwords.init_app(app)
+user_cache.init_app(app)
+page_cache.init_app(app)
+live.init_app(app)
+attendance_store.init_app(app)
+archive.init_app(app)
 
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -28,38 +97,76 @@ login_manager.login_message_category = 'info'
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.load(int(user_id))
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# Context processor for all models and utilities
+def derived_image_dir():
+    return os.path.join(app.config['UPLOAD_FOLDER'], 'derived')
+
+def send_upload(ref, legacy_dirs, immutable=True):
+    """Serve a stored upload by reference, falling back to the pre-dedupe folders"""
+    if is_blob_ref(ref):
+        path = blob_path(app.config['UPLOAD_FOLDER'], ref)
+        if not os.path.exists(path):
+            abort(404)
+        # Blobs never change, so their hash is a strong ETag
+        return send_stored_file(path, etag=blob_hash(ref), download_name=ref.split('/', 1)[1],
+                                immutable=immutable)
+    for legacy_dir in legacy_dirs + ['']:
+        path = safe_join(app.config['UPLOAD_FOLDER'], legacy_dir, ref) if legacy_dir else \
+            safe_join(app.config['UPLOAD_FOLDER'], ref)
+        if path and os.path.isfile(path):
+            return send_stored_file(path)
+    abort(404)
+
+def discard_upload(ref, legacy_dir):
+    """Queue the release of a record's upload; call before committing the delete"""
+    enqueue('release_upload', ref=ref, legacy_dir=legacy_dir)
+
+# Background jobs (see jobs.py). Handlers must not commit.
+@job_handler('release_upload')
+def release_upload_job(ref, legacy_dir):
+    if is_blob_ref(ref):
+        if release(ref):
+            enqueue('remove_blob', digest=blob_hash(ref))
+        return
+    legacy_path = safe_join(app.config['UPLOAD_FOLDER'], legacy_dir, ref)
+    if legacy_path and os.path.exists(legacy_path):
+        os.remove(legacy_path)
+
+@job_handler('remove_blob')
+def remove_blob_job(digest):
+    if remove_orphan(app.config['UPLOAD_FOLDER'], digest):
+        remove_derivatives(derived_image_dir(), digest)
+
+@job_handler('image_derivatives', max_attempts=3)
+def image_derivatives_job(ref):
+    source_path = blob_path(app.config['UPLOAD_FOLDER'], ref)
+    key = blob_hash(ref)
+    # The image may have been deleted again before the job ran
+    if os.path.exists(source_path) and not has_derivatives(derived_image_dir(), key):
+        generate_derivatives(source_path, derived_image_dir(), key)
+
+# Context processor for template utilities. Model classes are deliberately not
+# exposed: templates must render what the view loaded instead of issuing queries.
 @app.context_processor
 def inject_models():
     return {
-        'User': User,
-        'Student': Student,
-        'Attendance': Attendance,
-        'LostFound': LostFound,
-        'LostFoundImage': LostFoundImage,
-        'Complaint': Complaint,
-        'Message': Message,
-        'Note': Note,
-        'Teacher': Teacher,
         'timedelta': timedelta,
         'datetime': datetime,
         'date': date
     }
 
-# Initialize database and create admin user
+# Bring the database schema up to date and create admin user
 def init_db():
     with app.app_context():
-        print("Dropping all existing tables...")
-        db.drop_all()  # ⚠️ This DELETES all existing data
-        
-        print("Creating new tables with updated schema...")
-        db.create_all()  # Creates fresh tables with new columns
+        # Applies only pending migrations; a no-op once the schema is current
+        applied = migrate()
+        if applied:
+            print(f"Applied {len(applied)} migration(s), schema version {schema_version()}")
         
         # Create admin user if not exists
         admin = User.query.filter_by(role='admin').first()
@@ -75,13 +182,7 @@ def init_db():
             print("Admin user created!")
         
         # Create upload directories
-        upload_dirs = ['lost_found', 'notes', 'messages']
-        for dir_name in upload_dirs:
-            dir_path = os.path.join(app.config['UPLOAD_FOLDER'], dir_name)
-            os.makedirs(dir_path, exist_ok=True)
-            print(f"Created directory: {dir_path}")
-        
-        print("✅ Database successfully recreated with new schema!")
+        os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'blobs'), exist_ok=True)
         
         # Create upload directories
         upload_dirs = ['lost_found', 'notes', 'messages']
@@ -89,6 +190,164 @@ def init_db():
             dir_path = os.path.join(app.config['UPLOAD_FOLDER'], dir_name)
             os.makedirs(dir_path, exist_ok=True)
 
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute the dashboard counters from the base tables"""
+    counters = rebuild_counters()
+    print(f"Rebuilt {len(counters)} dashboard counters")
+
+@app.cli.command('convert-attendance')
+@click.argument('storage', type=click.Choice(['rows', 'bitmap']))
+def convert_attendance_command(storage):
+    """Move existing attendance marks into rows or bitmap storage"""
+    dates, marks = attendance_store.convert(storage)
+    print(f"Moved {marks} mark(s) on {dates} date(s) to {storage} storage")
+    if app.config['ATTENDANCE_STORAGE'] != storage:
+        print(f"Set ATTENDANCE_STORAGE={storage} before starting the app")
+
+@app.cli.command('archive')
+@click.option('--before', help='Cutoff date (YYYY-MM-DD); default ARCHIVE_AFTER_DAYS ago')
+@click.option('--kind', 'kinds', multiple=True, type=click.Choice(archive.KINDS), help='Only these record kinds')
+@click.option('--dry-run', is_flag=True, help='Show what would be archived without moving anything')
+@click.option('--enable-incremental-vacuum', 'enable_vacuum', is_flag=True,
+              help='Only switch the database to incremental vacuum (a full VACUUM; needs its size in free disk)')
+def archive_command(before, kinds, dry_run, enable_vacuum):
+    """Move old messages, resolved complaints and lost & found posts and attendance into the yearly archives"""
+    if enable_vacuum:
+        if archive.enable_incremental_vacuum():
+            print("Incremental vacuum enabled; archiving now releases free pages")
+        else:
+            print("Incremental vacuum is already enabled")
+        return
+    try:
+        cutoff = datetime.strptime(before, '%Y-%m-%d').date() if before else archive.default_cutoff()
+    except ValueError:
+        raise SystemExit('--before must be a date like 2023-07-01')
+    kinds = kinds or archive.KINDS
+    if dry_run:
+        for kind, years in archive.pending(cutoff, kinds).items():
+            unit = 'date(s)' if kind == 'attendance' else 'record(s)'
+            for start_year, count in sorted(years.items()):
+                print(f"{kind} {archive.label(start_year)}: would archive {count} {unit}")
+        return
+    moved = archive.archive(cutoff, kinds)
+    print(f"Archived {sum(sum(years.values()) for years in moved.values())} record(s) older than {cutoff}")
+    released = archive.vacuum()
+    if released is None:
+        print("Run 'flask archive --enable-incremental-vacuum' to release the freed pages")
+    else:
+        print(f"Released {released} free page(s) from the hot database")
+
+@app.cli.command('import-students')
+@click.argument('path')
+@click.option('--dry-run', is_flag=True, help='Validate without writing anything')
+def import_students_command(path, dry_run):
+    """Bulk-import students from a CSV or XLSX file (name, branch, year, roll_number)"""
+    with open(path, 'rb') as f:
+        try:
+            report = student_import.import_students(student_import.read_rows(f, path),
+                                                    app.config['STUDENT_BRANCHES'], dry_run=dry_run)
+        except student_import.ImportFormatError as e:
+            raise SystemExit(str(e))
+    for line, roll_number, message in report['errors']:
+        print(f"line {line} {roll_number}: {message}")
+    verb = 'Would import' if dry_run else 'Imported'
+    print(f"{verb} {report['imported']} of {report['rows']} row(s) in {report['seconds']:.2f}s; "
+          f"{report['error_count']} error(s)")
+
+@app.cli.command('rollover')
+@click.option('--graduates', type=click.Choice(rollover.GRADUATES), default='archive', show_default=True,
+              help="Archive the final-year cohort's attendance or just remove it")
+@click.option('--dry-run', is_flag=True, help='Report the counts without changing anything')
+def rollover_command(graduates, dry_run):
+    """Start a new academic year: remove the final-year students and promote everyone else"""
+    report = rollover.rollover(graduates, dry_run=dry_run)
+    verb = 'Would promote' if dry_run else 'Promoted'
+    for year, count in sorted(report['promoted'].items()):
+        print(f"{verb} {count} student(s) to year {year}")
+    verb = 'Would remove' if dry_run else 'Removed'
+    archived = '' if dry_run else f" ({report['archived']} archived)"
+    print(f"{verb} {report['graduates']} graduate(s) with {report['marks']} attendance mark(s){archived} "
+          f"in {report['seconds']:.2f}s")
+
+@app.cli.command('rebuild-search')
+def rebuild_search_command():
+    """Create the full-text search tables if missing and reindex all posts"""
+    rebuild_search_index()
+    print("Search index rebuilt")
+
+@app.cli.command('backfill-image-variants')
+def backfill_image_variants_command():
+    """Create thumbnail/medium WebP and JPEG variants for lost & found images that lack them"""
+    derived_dir = derived_image_dir()
+    created = 0
+    for image in LostFoundImage.query.order_by(LostFoundImage.id).yield_per(500):
+        if not is_blob_ref(image.filename):
+            continue
+        source_path = blob_path(app.config['UPLOAD_FOLDER'], image.filename)
+        key = blob_hash(image.filename)
+        if not os.path.exists(source_path):
+            continue
+        if has_derivatives(derived_dir, key):
+            continue
+        try:
+            generate_derivatives(source_path, derived_dir, key)
+            created += 1
+        except Exception as e:
+            print(f"Skipping {image.filename}: {e}")
+    print(f"Created variants for {created} image(s)")
+
+@app.cli.command('dedupe-uploads')
+def dedupe_uploads_command():
+    """Move the legacy notes/messages/lost_found upload folders into the deduplicating store"""
+    moved, reclaimed = dedupe_existing_uploads(app.config['UPLOAD_FOLDER'])
+    print(f"Moved {moved} file(s) into the blob store, reclaimed {reclaimed / (1024 * 1024):.1f} MB")
+    print("Run 'flask backfill-image-variants' to rebuild lost & found thumbnails")
+
+@app.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Apply pending schema migrations"""
+    applied = migrate()
+    print(f"Applied {len(applied)} migration(s), schema version {schema_version()}")
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if any query behind the main pages falls back to a full table scan"""
+    problems = find_table_scans(app)
+    for path, sql, plan in problems:
+        print(f"{path}\n  {' '.join(sql.split())}\n  plan: {'; '.join(plan)}")
+    if problems:
+        raise SystemExit(f"{len(problems)} query(s) scan a whole table")
+    print("No full table scans")
+
+@app.cli.command('check-query-budget')
+def check_query_budget_command():
+    """Fail if a main page runs too many queries, repeats one (N+1) or queries from a template"""
+    failures = 0
+    for report in query_audit.audit_requests(app):
+        if query_audit.over_budget(report, app.config['QUERY_BUDGET']):
+            failures += 1
+            print(query_audit.format_report(report))
+    if failures:
+        raise SystemExit(f"{failures} page(s) over the query budget of {app.config['QUERY_BUDGET']} or with N+1 queries")
+    print("All pages within the query budget")
+
+@app.cli.command('run-jobs')
+def run_jobs_command():
+    """Run every due background job in the foreground"""
+    print(f"Ran {jobs.run_pending()} job(s)")
+
+@app.cli.command('jobs-status')
+def jobs_status_command():
+    """Show background queue depth and latency"""
+    for name, value in jobs.queue_stats().items():
+        print(f"{name}: {round(value, 3)}")
+
+@app.cli.command('retry-dead-jobs')
+def retry_dead_jobs_command():
+    """Requeue jobs that ran out of attempts"""
+    print(f"Requeued {jobs.retry_dead()} job(s)")
+
 # Routes
 @app.route('/')
 def index():
@@ -113,9 +372,26 @@ def login():
                 flash('Invalid secret code for teacher login', 'danger')
                 return redirect(url_for('login'))
         
+        # Throttle before hashing, so brute-force traffic cannot eat the CPU
+        if not passwords.allow_attempt(request.remote_addr, phone):
+            flash('Too many login attempts. Please wait a minute and try again.', 'danger')
+            return redirect(url_for('login'))
+        
         user = User.query.filter_by(phone=phone, role=role).first()
         
-        if user and user.check_password(password):
+        try:
+            valid = user is not None and passwords.verify_password(user.password_hash, password)
+        except passwords.HashingBusy:
+            flash('Too many people are signing in right now. Please try again in a moment.', 'warning')
+            return redirect(url_for('login'))
+        
+        if valid:
+            if passwords.needs_rehash(user.password_hash):
+                try:
+                    user.password_hash = passwords.hash_password(password)
+                    db.session.commit()
+                except passwords.HashingBusy:
+                    pass  # Upgraded at a later login instead
             login_user(user)
             flash(f'Welcome back, {user.name}!', 'success')
             next_page = request.args.get('next')
@@ -164,7 +440,14 @@ def register():
             phone=phone,
             role=role
         )
-        user.set_password(password)
+        if not passwords.allow_attempt(request.remote_addr):
+            flash('Too many attempts. Please wait a minute and try again.', 'danger')
+            return redirect(url_for('register'))
+        try:
+            user.password_hash = passwords.hash_password(password)
+        except passwords.HashingBusy:
+            flash('The server is busy right now. Please try again in a moment.', 'warning')
+            return redirect(url_for('register'))
         
         db.session.add(user)
         db.session.commit()
@@ -177,14 +460,8 @@ def register():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    # Add some stats for the dashboard
-    stats = {
-        'total_students': Student.query.count(),
-        'total_teachers': Teacher.query.count(),
-        'today_attendance': Attendance.query.filter_by(date=date.today()).count(),
-        'pending_complaints': Complaint.query.filter_by(is_resolved=False).count(),
-        'recent_lost_found': LostFound.query.filter_by(is_resolved=False).count()
-    }
+    # Counters are maintained by triggers, so this is one lookup instead of five COUNT(*) scans
+    stats = get_dashboard_stats()
     return render_template('dashboard.html', stats=stats)
 
 @app.route('/attendance', methods=['GET', 'POST'])
@@ -204,6 +481,10 @@ def attendance():
             flash('Please select both student and status', 'danger')
             return redirect(url_for('attendance'))
         
+        if status not in ATTENDANCE_STATUSES:
+            flash('Invalid attendance status', 'danger')
+            return redirect(url_for('attendance'))
+        
         # Handle date
         try:
             if attendance_date_str:
@@ -220,42 +501,18 @@ def attendance():
             flash('Selected student not found', 'danger')
             return redirect(url_for('attendance'))
         
-        # Check if attendance already marked for the date
-        existing = Attendance.query.filter_by(
-            student_id=student_id, 
-            date=attendance_date
-        ).first()
-        
-        if existing:
-            existing.status = status
-            existing.marked_by = current_user.id
-            action = 'updated'
-        else:
-            attendance = Attendance(
-                student_id=student_id,
-                date=attendance_date,
-                status=status,
-                marked_by=current_user.id
-            )
-            db.session.add(attendance)
-            action = 'marked'
-        
+        # Insert or overwrite the mark for that date in one statement
+        upsert_attendance({student.id: status}, attendance_date, current_user.id)
         db.session.commit()
-        flash(f'Attendance {action} successfully for {student.name} on {attendance_date}', 'success')
+        flash(f'Attendance marked successfully for {student.name} on {attendance_date}', 'success')
         return redirect(url_for('attendance'))
     
     # GET request - show attendance page
     students = Student.query.order_by(Student.name).all()
-    today_attendance = Attendance.query.filter_by(date=date.today()).all()
+    today_attendance = attendance_store.marks_on(date.today())
     
     # Get unique dates for filter (last 30 days)
-    thirty_days_ago = date.today() - timedelta(days=30)
-    attendance_dates = db.session.query(Attendance.date).filter(
-        Attendance.date >= thirty_days_ago
-    ).distinct().order_by(Attendance.date.desc()).all()
-    
-    # Convert to simple list
-    attendance_dates = [att_date[0] for att_date in attendance_dates]
+    attendance_dates = attendance_store.marked_dates(date.today() - timedelta(days=30))
     
     return render_template('attendance.html', 
                          students=students, 
@@ -269,15 +526,11 @@ def attendance_by_date(selected_date):
     """View attendance for a specific date"""
     try:
         selected_date_obj = datetime.strptime(selected_date, '%Y-%m-%d').date()
-        attendance_records = Attendance.query.filter_by(date=selected_date_obj).all()
+        attendance_records = attendance_store.marks_on(selected_date_obj)
         students = Student.query.order_by(Student.name).all()
         
         # Get unique dates for filter
-        thirty_days_ago = date.today() - timedelta(days=30)
-        attendance_dates = db.session.query(Attendance.date).filter(
-            Attendance.date >= thirty_days_ago
-        ).distinct().order_by(Attendance.date.desc()).all()
-        attendance_dates = [att_date[0] for att_date in attendance_dates]
+        attendance_dates = attendance_store.marked_dates(date.today() - timedelta(days=30))
         
         return render_template('attendance.html',
                              students=students,
@@ -289,6 +542,164 @@ def attendance_by_date(selected_date):
         flash('Invalid date format', 'danger')
         return redirect(url_for('attendance'))
 
+@app.route('/attendance/roster', methods=['GET', 'POST'])
+@login_required
+def attendance_roster():
+    """Mark a whole class (branch + year) for one date in a single submission"""
+    if current_user.role not in ['admin', 'teacher']:
+        flash('You are not authorized to mark attendance', 'danger')
+        return redirect(url_for('attendance'))
+    
+    source = request.form if request.method == 'POST' else request.args
+    branch = source.get('branch')
+    year = source.get('year')
+    attendance_date_str = source.get('date')
+    
+    try:
+        if attendance_date_str:
+            attendance_date = datetime.strptime(attendance_date_str, '%Y-%m-%d').date()
+        else:
+            attendance_date = date.today()
+    except ValueError:
+        flash('Invalid date format', 'danger')
+        return redirect(url_for('attendance'))
+    
+    if request.method == 'POST':
+        # Every grid cell arrives as status_<student_id>=<status>
+        statuses = {}
+        for key, status in request.form.items():
+            if not key.startswith('status_'):
+                continue
+            try:
+                student_id = int(key[len('status_'):])
+            except ValueError:
+                continue
+            if status not in ATTENDANCE_STATUSES:
+                flash('Invalid attendance status', 'danger')
+                return redirect(url_for('attendance_roster', branch=branch, year=year, date=attendance_date))
+            statuses[student_id] = status
+        
+        if not statuses:
+            flash('No students were marked', 'warning')
+            return redirect(url_for('attendance_roster', branch=branch, year=year, date=attendance_date))
+        
+        # Drop ids that do not belong to a real student, with one lookup for the whole grid
+        known_ids = {row[0] for row in db.session.query(Student.id).filter(Student.id.in_(statuses)).all()}
+        statuses = {student_id: status for student_id, status in statuses.items() if student_id in known_ids}
+        
+        try:
+            marked = upsert_attendance(statuses, attendance_date, current_user.id)
+            db.session.commit()
+            flash(f'Attendance saved for {marked} student(s) on {attendance_date}', 'success')
+        except Exception as e:
+            db.session.rollback()
+            flash('Error saving attendance: ' + str(e), 'danger')
+        return redirect(url_for('attendance_by_date', selected_date=attendance_date))
+    
+    # GET request - show the grid for the selected class, prefilled with any existing marks
+    branches = [row[0] for row in db.session.query(Student.branch).distinct().order_by(Student.branch).all()]
+    students = []
+    existing = {}
+    if branch and year and year.isdigit():
+        students = Student.query.filter_by(branch=branch, year=int(year)).order_by(Student.roll_number).all()
+        existing = attendance_store.statuses_on(attendance_date, students)
+    
+    return render_template('attendance_roster.html',
+                         branches=branches,
+                         students=students,
+                         existing=existing,
+                         statuses=ATTENDANCE_STATUSES,
+                         branch=branch,
+                         year=year,
+                         attendance_date=attendance_date)
+
+@app.route('/attendance/reports')
+@login_required
+def attendance_reports():
+    """Attendance percentages, class rollups, shortfall list and monthly matrix"""
+    if current_user.role not in ['admin', 'teacher']:
+        flash('You are not authorized to view attendance reports', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    branch = request.args.get('branch') or None
+    year = request.args.get('year') or None
+    try:
+        today = date.today()
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') \
+            else today.replace(day=1)
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else today
+        threshold = float(request.args.get('threshold') or 75)
+        year = int(year) if year else None
+    except ValueError:
+        flash('Invalid report filters', 'danger')
+        return redirect(url_for('attendance_reports'))
+    
+    rollup = reports.branch_year_rollup(start, end)
+    below = reports.students_below_threshold(threshold, start, end, branch, year)
+    
+    # Per-student tables are only built for one class at a time to keep the page small
+    percentages = []
+    months, matrix = [], []
+    if branch:
+        percentages = reports.student_percentages(start, end, branch, year)
+        months, matrix = reports.monthly_matrix(start, end, branch, year)
+    
+    branches = [row[0] for row in db.session.query(Student.branch).distinct().order_by(Student.branch).all()]
+    return render_template('reports.html',
+                         rollup=rollup,
+                         below=below,
+                         percentages=percentages,
+                         months=months,
+                         matrix=matrix,
+                         branches=branches,
+                         branch=branch,
+                         year=year,
+                         start=start,
+                         end=end,
+                         threshold=threshold)
+
+@app.route('/export/<kind>')
+@login_required
+def export(kind):
+    """Stream attendance, students, teachers or complaints as CSV or XLSX"""
+    if kind not in exports.ROLES:
+        abort(404)
+    if current_user.role not in exports.ROLES[kind]:
+        flash('You are not authorized to export this data', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    fmt = request.args.get('format', 'csv')
+    branch = request.args.get('branch') or None
+    year = request.args.get('year') or None
+    try:
+        if fmt not in exports.FORMATS:
+            raise ValueError(fmt)
+        year = int(year) if year else None
+        if kind == 'attendance':
+            today = date.today()
+            start = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') \
+                else today.replace(day=1)
+            end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else today
+    except ValueError:
+        flash('Invalid export filters', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    if kind == 'attendance':
+        spec = exports.attendance(start, end, branch, year)
+    elif kind == 'students':
+        spec = exports.students(branch, year)
+    else:
+        spec = getattr(exports, kind)()
+    
+    # The ETag comes from the data versions, so an unchanged export is a 304 without running the query
+    etag = exports.etag(kind, spec, fmt)
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'private, no-cache'}
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    headers['Content-Disposition'] = f'attachment; filename="{secure_filename(spec.filename)}.{fmt}"'
+    return Response(stream_with_context(exports.WRITERS[fmt](spec)), content_type=exports.FORMATS[fmt],
+                    headers=headers)
+
 @app.route('/add_student', methods=['POST'])
 @login_required
 def add_student():
@@ -326,6 +737,54 @@ def add_student():
     
     return redirect(url_for('attendance'))
 
+@app.route('/import_students', methods=['POST'])
+@login_required
+def import_students():
+    if current_user.role != 'admin':
+        flash('Only admin can import students', 'danger')
+        return redirect(url_for('attendance'))
+    
+    file = request.files.get('file')
+    if not file or not file.filename:
+        flash('Please choose a CSV or XLSX file', 'danger')
+        return redirect(url_for('attendance'))
+    
+    try:
+        # Rows are read from the upload stream as they are imported
+        report = student_import.import_students(student_import.read_rows(file.stream, file.filename),
+                                                app.config['STUDENT_BRANCHES'])
+    except student_import.ImportFormatError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('attendance'))
+    
+    flash(f"Imported {report['imported']} of {report['rows']} students",
+          'success' if not report['error_count'] else 'warning')
+    return render_template('student_import.html', report=report)
+
+@app.route('/students/rollover', methods=['GET', 'POST'])
+@login_required
+def student_rollover():
+    """Preview (as a dry run) and then run the academic year rollover"""
+    if current_user.role != 'admin':
+        flash('Only admin can start a new academic year', 'danger')
+        return redirect(url_for('attendance'))
+    
+    if request.method == 'POST':
+        graduates = request.form.get('graduates', 'archive')
+        if graduates not in rollover.GRADUATES:
+            flash('Invalid rollover option', 'danger')
+            return redirect(url_for('student_rollover'))
+        try:
+            report = rollover.rollover(graduates)
+        except Exception as e:
+            flash('Error during rollover: ' + str(e), 'danger')
+            return redirect(url_for('attendance'))
+        flash(f"Promoted {sum(report['promoted'].values())} students and removed {report['graduates']} graduates",
+              'success')
+        return redirect(url_for('attendance'))
+    
+    return render_template('rollover.html', report=rollover.rollover(dry_run=True))
+
 @app.route('/edit_student/<int:student_id>', methods=['GET', 'POST'])
 @login_required
 def edit_student(student_id):
@@ -358,7 +817,7 @@ def delete_student(student_id):
     
     try:
         # Also delete attendance records for this student
-        Attendance.query.filter_by(student_id=student_id).delete()
+        attendance_store.delete_student_marks(student_id)
         db.session.delete(student)
         db.session.commit()
         flash('Student deleted successfully', 'success')
@@ -371,8 +830,17 @@ def delete_student(student_id):
 @app.route('/lost_found')
 @login_required
 def lost_found():
-    posts = LostFound.query.order_by(LostFound.posted_at.desc()).all()
-    return render_template('lost_found.html', posts=posts)
+    before = request.args.get('before')
+    is_admin = current_user.role == 'admin'
+    
+    def render_posts():
+        feed = LostFound.query.options(joinedload(LostFound.poster), selectinload(LostFound.images))
+        posts, next_cursor = keyset_page(feed, LostFound, before, app.config['FEED_PAGE_SIZE'])
+        return render_template('lost_found_list.html', posts=posts, next_cursor=next_cursor, is_admin=is_admin)
+    
+    list_html = page_cache.fragment(('lost_found', before, app.config['FEED_PAGE_SIZE'], is_admin),
+                                    [LostFound, LostFoundImage, User], render_posts, current_user.id)
+    return render_template('lost_found.html', list_html=list_html)
 
 @app.route('/post_lost_found', methods=['POST'])
 @login_required
@@ -414,9 +882,6 @@ def post_lost_found():
     # Handle file uploads
     uploaded_count = 0
     if files and files[0].filename:  # Check if files were uploaded
-        lost_found_upload_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'lost_found')
-        os.makedirs(lost_found_upload_dir, exist_ok=True)
-        
         for file in files[:3]:  # Limit to 3 files
             if file and file.filename and allowed_file(file.filename):
                 # Check file size (5MB max)
@@ -428,20 +893,23 @@ def post_lost_found():
                     flash(f'File {file.filename} is too large. Maximum size is 5MB.', 'warning')
                     continue
                 
-                # Generate secure filename
                 filename = secure_filename(file.filename)
-                unique_filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{post.id}_{filename}"
-                file_path = os.path.join(lost_found_upload_dir, unique_filename)
                 
                 try:
-                    file.save(file_path)
-                    
-                    # Create image record
-                    image = LostFoundImage(
-                        filename=unique_filename,
-                        lost_found_id=post.id
-                    )
-                    db.session.add(image)
+                    # A savepoint per file: a failure takes back the blob reference it may
+                    # already have added, while the post and the other images are kept
+                    with db.session.begin_nested():
+                        # Stored once per unique content, shared with any identical upload
+                        ref = store_upload(app.config['UPLOAD_FOLDER'], file)
+                        
+                        # Create image record
+                        image = LostFoundImage(
+                            filename=ref,
+                            lost_found_id=post.id
+                        )
+                        db.session.add(image)
+                        # Thumbnails and WebP variants are built in the background
+                        enqueue('image_derivatives', ref=ref)
                     uploaded_count += 1
                     
                 except Exception as e:
@@ -475,12 +943,9 @@ def delete_lost_found(post_id):
     post = LostFound.query.get_or_404(post_id)
     if current_user.role == 'admin' or post.posted_by == current_user.id:
         try:
-            # Delete associated images and files
-            lost_found_upload_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'lost_found')
+            # Release associated images; files go when no other post shares them
             for image in post.images:
-                file_path = os.path.join(lost_found_upload_dir, image.filename)
-                if os.path.exists(file_path):
-                    os.remove(file_path)
+                discard_upload(image.filename, 'lost_found')
             
             db.session.delete(post)
             db.session.commit()
@@ -492,16 +957,49 @@ def delete_lost_found(post_id):
         flash('You are not authorized to delete this post', 'danger')
     return redirect(url_for('lost_found'))
 
-@app.route('/uploads/lost_found/<filename>')
+@app.route('/uploads/lost_found/<path:filename>')
 @login_required
 def lost_found_image(filename):
-    return send_from_directory(os.path.join(app.config['UPLOAD_FOLDER'], 'lost_found'), filename)
+    size = request.args.get('size')
+    if size and is_blob_ref(filename):
+        # Serve the resized variant when it exists, WebP if the browser takes it
+        accept_webp = 'image/webp' in request.headers.get('Accept', '')
+        variant = pick_variant(derived_image_dir(), blob_hash(filename), size, accept_webp)
+        if variant:
+            response = send_stored_file(os.path.join(derived_image_dir(), variant), etag=variant, immutable=True)
+            response.vary.add('Accept')
+            return response
+        # Variants are still being generated; don't let the original stick to this URL
+        return send_upload(filename, ['lost_found'], immutable=False)
+    return send_upload(filename, ['lost_found'])
 
 @app.route('/complaints')
 @login_required
 def complaints():
-    complaints_list = Complaint.query.order_by(Complaint.posted_at.desc()).all()
-    return render_template('complaints.html', complaints=complaints_list)
+    before = request.args.get('before')
+    is_admin = current_user.role == 'admin'
+    
+    def render_complaints():
+        feed = Complaint.query.options(joinedload(Complaint.poster))
+        complaints_list, next_cursor = keyset_page(feed, Complaint, before, app.config['FEED_PAGE_SIZE'])
+        return render_template('complaints_list.html', complaints=complaints_list,
+                               next_cursor=next_cursor, is_admin=is_admin)
+    
+    def count_complaints():
+        # Totals for the statistics card, independent of the current page
+        counts = dict(db.session.query(Complaint.is_resolved, db.func.count(Complaint.id))
+                      .group_by(Complaint.is_resolved).all())
+        return {
+            'total': sum(counts.values()),
+            'pending': counts.get(False, 0),
+            'resolved': counts.get(True, 0)
+        }
+    
+    # Poster details are admin-only, so admins get their own copy of the list
+    list_html = page_cache.fragment(('complaints', before, app.config['FEED_PAGE_SIZE'], is_admin),
+                                    [Complaint, User], render_complaints, current_user.id)
+    complaint_stats = page_cache.value(('complaint_stats',), [Complaint], count_complaints)
+    return render_template('complaints.html', list_html=list_html, complaint_stats=complaint_stats)
 
 @app.route('/post_complaint', methods=['POST'])
 @login_required
@@ -559,8 +1057,86 @@ def delete_complaint(complaint_id):
 @app.route('/communication')
 @login_required
 def communication():
-    messages = Message.query.order_by(Message.posted_at.desc()).all()
-    return render_template('communication.html', messages=messages)
+    before = request.args.get('before')
+    is_admin = current_user.role == 'admin'
+    
+    def render_messages():
+        feed = Message.query.options(joinedload(Message.poster))
+        messages, next_cursor = keyset_page(feed, Message, before, app.config['FEED_PAGE_SIZE'])
+        return render_template('communication_list.html', messages=messages, next_cursor=next_cursor,
+                               is_admin=is_admin)
+    
+    list_html = page_cache.fragment(('communication', before, app.config['FEED_PAGE_SIZE'], is_admin),
+                                    [Message, User], render_messages, current_user.id)
+    return render_template('communication.html', list_html=list_html)
+
+def _live_after():
+    after = request.headers.get('Last-Event-ID') or request.args.get('after', '')
+    return int(after) if after.isdigit() else 0
+
+@app.route('/communication/stream')
+@login_required
+def communication_stream():
+    """Server-Sent Events with messages posted or deleted after ?after=<message id>"""
+    if live.feed.streams >= app.config['LIVE_MAX_STREAMS']:
+        return Response('Too many live connections', status=503, headers={'Retry-After': '30'})
+    
+    after = _live_after()
+    is_admin = current_user.role == 'admin'
+    viewer_id = current_user.id
+    position = live.feed.position()
+    backlog = live.catch_up(after)
+    live.ensure_watcher()
+    
+    def stream():
+        live.feed.opened()
+        try:
+            yield 'retry: 3000\n\n'
+            last_id = after
+            events = backlog
+            seq = position
+            deadline = time.monotonic() + app.config['LIVE_STREAM_SECONDS']
+            while True:
+                for event in events:
+                    if event.kind == 'message' and event.message_id <= last_id:
+                        continue  # Already sent in the catch-up
+                    if event.kind == 'message':
+                        last_id = event.message_id
+                    yield live.sse(live.encode(event, is_admin, viewer_id))
+                if time.monotonic() >= deadline:
+                    return
+                seq, events = live.feed.wait(seq, app.config['LIVE_HEARTBEAT_SECONDS'])
+                if not events:
+                    yield ': keep-alive\n\n'
+        finally:
+            live.feed.closed()
+    
+    # The generator runs after the request's database session is gone; it only reads the feed
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/communication/updates')
+@login_required
+def communication_updates():
+    """Long-poll fallback for the stream: waits for events after ?after= and ?since="""
+    after = _live_after()
+    position = live.feed.position(request.args.get('since'))
+    events = live.catch_up(after)
+    live.ensure_watcher()
+    if not events and live.feed.streams >= app.config['LIVE_MAX_STREAMS']:
+        # Waiting parks a request thread, so long polls count against the same cap as streams
+        return Response('Too many live connections', status=503, headers={'Retry-After': '30'})
+    if not events:
+        db.session.close()  # Do not hold a connection while waiting
+        live.feed.opened()
+        try:
+            position, events = live.feed.wait(position, app.config['LIVE_LONG_POLL_SECONDS'])
+        finally:
+            live.feed.closed()
+    is_admin = current_user.role == 'admin'
+    updates = [live.encode(event, is_admin, current_user.id) for event in events
+               if not (event.kind == 'message' and event.message_id <= after)]
+    return jsonify(events=updates, since=live.feed.cursor(position))
 
 @app.route('/post_message', methods=['POST'])
 @login_required
@@ -577,13 +1153,9 @@ def post_message():
     
     if file and file.filename:
         if allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            # Add timestamp to avoid filename conflicts
-            filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-            file_path = filename  # Store only filename, not full path
-            full_path = os.path.join(app.config['UPLOAD_FOLDER'], 'messages', filename)
-            file.save(full_path)
-            file_type = filename.rsplit('.', 1)[1].lower()
+            # Store the content once; file_path holds the "<hash>/<name>" reference
+            file_path = store_upload(app.config['UPLOAD_FOLDER'], file)
+            file_type = file_path.rsplit('.', 1)[1].lower()
         else:
             flash('File type not allowed', 'danger')
             return redirect(url_for('communication'))
@@ -596,6 +1168,7 @@ def post_message():
     )
     db.session.add(message)
     db.session.commit()
+    live.publish_message(message)
     
     flash('Message posted successfully', 'success')
     return redirect(url_for('communication'))
@@ -607,11 +1180,10 @@ def delete_message(message_id):
     if current_user.role == 'admin' or message.posted_by == current_user.id:
         try:
             if message.file_path:
-                full_path = os.path.join(app.config['UPLOAD_FOLDER'], 'messages', message.file_path)
-                if os.path.exists(full_path):
-                    os.remove(full_path)
+                discard_upload(message.file_path, 'messages')
             db.session.delete(message)
             db.session.commit()
+            live.publish_delete(message_id)
             flash('Message deleted successfully', 'success')
         except Exception as e:
             db.session.rollback()
@@ -623,10 +1195,23 @@ def delete_message(message_id):
 @app.route('/notes')
 @login_required
 def notes():
-    notes_list = Note.query.filter(
-        (Note.is_public == True) | (Note.posted_by == current_user.id)
-    ).order_by(Note.posted_at.desc()).all()
-    return render_template('notes.html', notes=notes_list)
+    before = request.args.get('before')
+    is_admin = current_user.role == 'admin'
+    # Everyone without private notes sees the same list; the rest get their own
+    has_private = db.session.query(Note.id).filter(Note.posted_by == current_user.id,
+                                                   Note.is_public == False).first() is not None
+    reader = current_user.id if has_private else None
+    
+    def render_notes():
+        visible_notes = Note.query.options(joinedload(Note.poster)).filter(
+            (Note.is_public == True) | (Note.posted_by == reader)
+        )
+        notes_list, next_cursor = keyset_page(visible_notes, Note, before, app.config['FEED_PAGE_SIZE'])
+        return render_template('notes_list.html', notes=notes_list, next_cursor=next_cursor, is_admin=is_admin)
+    
+    list_html = page_cache.fragment(('notes', before, app.config['FEED_PAGE_SIZE'], is_admin, reader),
+                                    [Note, User], render_notes, current_user.id)
+    return render_template('notes.html', list_html=list_html)
 
 @app.route('/post_note', methods=['POST'])
 @login_required
@@ -645,13 +1230,9 @@ def post_note():
     
     if file and file.filename:
         if allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            # Add timestamp to avoid filename conflicts
-            filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-            file_path = filename  # Store only filename, not full path
-            full_path = os.path.join(app.config['UPLOAD_FOLDER'], 'notes', filename)
-            file.save(full_path)
-            file_type = filename.rsplit('.', 1)[1].lower()
+            # Store the content once; file_path holds the "<hash>/<name>" reference
+            file_path = store_upload(app.config['UPLOAD_FOLDER'], file)
+            file_type = file_path.rsplit('.', 1)[1].lower()
         else:
             flash('File type not allowed', 'danger')
             return redirect(url_for('notes'))
@@ -676,11 +1257,9 @@ def delete_note(note_id):
     note = Note.query.get_or_404(note_id)
     if current_user.role == 'admin' or note.posted_by == current_user.id:
         try:
-            # Delete associated file if exists
+            # Release the attached file; it is removed once no other post references it
             if note.file_path:
-                full_path = os.path.join(app.config['UPLOAD_FOLDER'], 'notes', note.file_path)
-                if os.path.exists(full_path):
-                    os.remove(full_path)
+                discard_upload(note.file_path, 'notes')
             db.session.delete(note)
             db.session.commit()
             flash('Note deleted successfully', 'success')
@@ -694,8 +1273,14 @@ def delete_note(note_id):
 @app.route('/teachers')
 @login_required
 def teachers():
-    teachers_list = Teacher.query.order_by(Teacher.name).all()
-    return render_template('teachers.html', teachers=teachers_list)
+    is_admin = current_user.role == 'admin'
+    
+    def render_teachers():
+        teachers_list = Teacher.query.order_by(Teacher.name).all()
+        return render_template('teachers_list.html', teachers=teachers_list, is_admin=is_admin)
+    
+    list_html = page_cache.fragment(('teachers', is_admin), [Teacher], render_teachers, current_user.id)
+    return render_template('teachers.html', list_html=list_html)
 
 @app.route('/add_teacher', methods=['POST'])
 @login_required
@@ -776,363 +1361,45 @@ def chatbot():
         if not user_message:
             return jsonify({'response': 'Please enter a message.'})
         
-        response = get_enhanced_chatbot_response(user_message, current_user)
+        response = get_chatbot_response(user_message, current_user)
         return jsonify({'response': response})
     
     return render_template('chatbot.html')
 
-def get_enhanced_chatbot_response(message, current_user):
-    message = message.lower().strip()
-    
-    # Enhanced responses with file upload info
-    responses = {
-        'hello': f'Hello {current_user.name}! 👋 How can I assist you today in CollegeCompanion?',
-        'hi': f'Hi {current_user.name}! 😊 What can I help you with?',
-        'help': f'''🤖 **CollegeCompanion AI Assistant - Help Guide**
-
-📊 **ATTENDANCE SYSTEM**
-• Mark daily attendance (Teachers/Admin)
-• View attendance records by date
-• Add/edit students (Admin only)
-• Generate attendance reports
-
-🔍 **LOST & FOUND**
-• Post lost or found items with images
-• Upload up to 3 photos per post
-• Browse active posts with image galleries
-• Contact item owners
-• Mark items as resolved
-
-📝 **COMPLAINT BOX**
-• Submit anonymous complaints
-• Delete your own complaints
-• View all complaints (Admin sees posters)
-• Resolve complaints (Admin only)
-
-💬 **COMMUNICATION HUB**
-• Send messages to community
-• Share files (images, documents, videos)
-• Delete your messages
-
-📚 **NOTES SHARING**
-• Create public/private notes
-• Upload study materials (up to 50MB)
-• Download shared resources
-• Organize by subjects/topics
-
-👨‍🏫 **TEACHER DIRECTORY**
-• View faculty contacts
-• See department information
-• Contact teachers directly
-
-🎓 **STUDENT MANAGEMENT**
-• Student database (Admin)
-• Roll number tracking
-• Branch-wise organization
-
-**Quick Commands:** Try: "how to mark attendance", "post lost item with images", "share notes", "contact teachers"''',
-
-        'attendance': '''📊 **Attendance Management Guide:**
-
-**For Teachers/Admin:**
-✅ Mark attendance for specific dates
-✅ View attendance by student or date  
-✅ Generate monthly reports
-✅ Add new students to system
-
-**For Students:**
-✅ View your attendance record
-✅ Check attendance statistics
-
-**Commands to try:**
-• "Mark attendance for today"
-• "View attendance for December"
-• "Add new student"
-• "Check my attendance"''',
-
-        'lost found': '''🔍 **Lost & Found System:**
-
-**Posting Items:**
-✅ Report lost items with detailed descriptions
-✅ Post found items with contact information  
-✅ Upload up to 3 images per post (JPG, PNG, GIF)
-✅ Add location and date information
-✅ Maximum file size: 5MB per image
-
-**Finding Items:**
-✅ Browse all active posts with image galleries
-✅ Search by item type or location
-✅ Contact posters directly
-✅ Mark items as resolved when found
-
-**Image Upload Features:**
-📸 Take clear photos from multiple angles
-🏷️ Show distinctive features or damage
-📍 Include location context in images
-📱 Mobile-friendly upload interface
-
-**Commands to try:**
-• "I lost my calculator in the library"
-• "Show found electronics items" 
-• "How to upload images for lost items"
-• "Post found keys with photos"''',
-
-        'upload': '''📁 **File Upload Guide:**
-
-**Lost & Found Images:**
-✅ Supported: JPG, PNG, GIF
-✅ Maximum: 3 images per post
-✅ Size limit: 5MB per image
-✅ Automatic image optimization
-
-**Notes & Study Materials:**
-✅ Supported: PDF, DOC, PPT, TXT, images, videos
-✅ Maximum: 50MB per file
-✅ Public/private sharing options
-✅ Organized by subjects
-
-**Communication Files:**
-✅ All file types supported
-✅ 50MB size limit
-✅ Instant sharing with community
-✅ File type icons and previews
-
-**Best Practices:**
-• Use descriptive filenames
-• Compress large files when possible
-• Check file formats before uploading
-• Add clear descriptions with files''',
-
-        'complaint': '''📝 **Complaint System:**
-
-**Submitting Complaints:**
-✅ Anonymous submission (name hidden from others)
-✅ Categorized complaints
-✅ Priority tagging
-✅ Track resolution status
-
-**Managing Complaints:**
-✅ Delete your own complaints
-✅ View complaint status
-✅ Admin resolution tracking
-
-**For Admin:**
-✅ View all complaints with poster info
-✅ See who submitted each complaint
-✅ Mark as resolved/reopened
-✅ Delete any complaint
-
-**Commands to try:**
-• "Submit complaint about WiFi"
-• "View pending complaints"
-• "Resolve complaint #5"
-• "Delete my complaint"''',
-
-        'communication': '''💬 **Communication Center:**
-
-**Features:**
-✅ Group messaging for all users
-✅ File sharing (images, PDFs, videos)
-✅ Real-time updates
-✅ Message deletion (own messages)
-
-**File Support:**
-📷 Images: JPG, PNG, GIF
-📄 Documents: PDF, DOC, TXT
-🎬 Videos: MP4, AVI, MOV
-📊 Presentations: PPT, PPTX
-
-**Commands to try:**
-• "Send message to everyone"
-• "Share meeting notes"
-• "Upload class material"''',
-
-        'notes': '''📚 **Notes Sharing Platform:**
-
-**Creating Notes:**
-✅ Public notes (visible to all)
-✅ Private notes (only you)
-✅ File attachments (up to 50MB)
-✅ Rich text content
-
-**Supported Files:**
-📖 Study materials & textbooks
-🎥 Lecture recordings
-📝 Assignment solutions  
-📊 Project presentations
-
-**Commands to try:**
-• "Create private note"
-• "Share lecture slides"
-• "Download math notes"
-• "View public notes"''',
-
-        'teacher': '''👨‍🏫 **Teacher Directory:**
-
-**Information Available:**
-✅ Full contact details
-✅ Department/Branch
-✅ Email addresses
-✅ Designation/Role
-
-**Features:**
-✅ Quick contact access
-✅ Department filtering
-✅ Search functionality
-✅ Admin management
-
-**Commands to try:**
-• "Show CS department teachers"
-• "Contact Dr. Smith"
-• "Add new teacher"''',
-
-        'student': '''👨‍🎓 **Student Management:**
-
-**Admin Features:**
-✅ Add new students
-✅ Edit student information
-✅ Manage roll numbers
-✅ Track by branch/year
-
-**Student Profiles:**
-✅ Name, branch, year
-✅ Unique roll numbers
-✅ Attendance tracking
-✅ Academic organization
-
-**Commands to try:**
-• "Add student to CS branch"
-• "Edit student information"
-• "View all students"''',
-
-        'features': '''🚀 **CollegeCompanion Features:**
-
-**Core Modules:**
-1. **Attendance Tracking** - Digital attendance system
-2. **Lost & Found** - Campus item recovery with image uploads
-3. **Complaint Box** - Anonymous feedback system
-4. **Communication** - Campus-wide messaging
-5. **Notes Sharing** - Study material repository
-6. **Teacher Directory** - Faculty contact management
-7. **Student Management** - Student database
-
-**Advanced Features:**
-• File uploads (50MB limit)
-• Image galleries for Lost & Found
-• Role-based access control
-• Real-time notifications
-• Mobile-responsive design
-• Secure authentication''',
-
-        'commands': '''🎯 **Quick Commands List:**
-
-**Attendance:**
-"mark attendance", "view attendance", "add student"
-
-**Lost & Found:**  
-"post lost item with images", "browse found", "contact owner"
-
-**Complaints:**
-"submit complaint", "view complaints", "resolve issue", "delete complaint"
-
-**Communication:**
-"send message", "share file", "chat with everyone"
-
-**Notes:**
-"create note", "upload material", "download notes"
-
-**Teachers:**
-"show teachers", "contact faculty", "add teacher"
-
-**Students:**
-"add student", "edit profile", "view students"
-
-**General:**
-"help", "features", "what can you do"''',
-        
-        'admin': f'''👑 **Admin Privileges - {current_user.name}**
-
-**Full System Access:**
-✅ Student management (add/edit/delete)
-✅ Teacher directory management  
-✅ Attendance system control
-✅ Complaint resolution & deletion
-✅ Content moderation
-✅ User management
-
-**Special Capabilities:**
-• Delete any message/note/complaint
-• Resolve all complaints
-• Access all system data
-• Manage user accounts
-• System configuration
-
-**You have complete control over the CollegeCompanion platform!**''',
-
-        'profile': f'''👤 **Your Profile - {current_user.name}**
-
-**Role:** {current_user.role.title()}
-**Branch:** {current_user.branch or 'Not specified'}
-{"**Year:** " + str(current_user.year) if current_user.role == 'student' and current_user.year else ''}
-**Phone:** {current_user.phone}
-
-**Permissions:**
-{'✅ Full administrative access' if current_user.role == 'admin' else ''}
-{'✅ Attendance marking access' if current_user.role in ['admin', 'teacher'] else '✅ View attendance only'}
-{'✅ Teacher features enabled' if current_user.role == 'teacher' else ''}
-✅ Notes creation & sharing
-✅ Communication access
-✅ Lost & Found posting with image uploads
-✅ Complaint submission & deletion'''
-    }
+@app.route('/search')
+@login_required
+def search():
+    query = request.args.get('q', '').strip()
+    kind = request.args.get('kind')
+    kinds = [kind] if kind in SEARCH_SOURCES else None
+    results = search_posts(query, current_user, kinds) if query else {}
+    if query:
+        # Archived posts only fill in what the hot tables could not
+        found = {kind: len(items) for kind, items in results.items()}
+        for kind, items in archive.search(query, kinds, found).items():
+            results.setdefault(kind, []).extend(items)
+    return render_template('search.html', query=query, kind=kind, results=results)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Request, SQL and job queue metrics in Prometheus text format"""
+    token = app.config['METRICS_TOKEN']
+    authorization = request.headers.get('Authorization', '')
+    is_scraper = bool(token) and hmac.compare_digest(authorization, f'Bearer {token}')
+    is_admin = current_user.is_authenticated and current_user.role == 'admin'
+    if not (is_scraper or is_admin):
+        abort(403)
     
-    # Enhanced keyword matching with context
-    if any(word in message for word in ['present', 'absent', 'mark attendance', 'attendance today']):
-        return responses['attendance']
-    elif any(word in message for word in ['upload', 'file', 'image', 'photo', 'picture']):
-        return responses['upload']
-    elif any(word in message for word in ['lost', 'found', 'item', 'missing', 'recover']):
-        return responses['lost found']
-    elif any(word in message for word in ['complain', 'issue', 'problem', 'report', 'delete complaint']):
-        return responses['complaint']
-    elif any(word in message for word in ['message', 'chat', 'talk', 'communicate', 'announce']):
-        return responses['communication']
-    elif any(word in message for word in ['study', 'material', 'note', 'file', 'upload', 'attachment', 'share notes']):
-        return responses['notes']
-    elif any(word in message for word in ['faculty', 'professor', 'teacher', 'instructor', 'lecturer']):
-        return responses['teacher']
-    elif any(word in message for word in ['pupil', 'learner', 'student', 'roll number', 'add student']):
-        return responses['student']
-    elif any(word in message for word in ['feature', 'function', 'capability', 'what can']):
-        return responses['features']
-    elif any(word in message for word in ['command', 'quick', 'shortcut', 'how to']):
-        return responses['commands']
-    elif any(word in message for word in ['admin', 'privilege', 'control', 'manage']):
-        return responses['admin']
-    elif any(word in message for word in ['profile', 'my info', 'who am i', 'my account']):
-        return responses['profile']
-    elif any(word in message for word in ['thank', 'thanks', 'appreciate']):
-        return f"You're welcome, {current_user.name}! 😊 Is there anything else I can help you with?"
-    elif any(word in message for word in ['bye', 'goodbye', 'see you', 'exit']):
-        return f"Goodbye {current_user.name}! 👋 Have a great day at college!"
-    
-    # Check for partial matches in responses
-    for key in responses:
-        if key in message:
-            return responses[key]
-    
-    # Smart fallback response
-    return f"""I'm not sure I understand, {current_user.name}. 🤔
-
-Try asking about:
-• **Attendance** marking or viewing
-• **Lost & Found** items with image uploads
-• **Complaint** submission & deletion
-• **Communication** with others
-• **Notes** sharing
-• **Teacher** information
-
-Or type **'help'** for the complete guide!"""
+    queue = jobs.queue_stats()
+    gauges = [
+        ('job_queue_depth', 'Background jobs by status',
+         [(f'status="{status}"', queue[status]) for status in ('queued', 'running', 'dead')]),
+        ('job_oldest_queued_seconds', 'Age of the oldest queued job', [('', queue['oldest_queued_seconds'])]),
+        ('job_average_run_seconds', 'Mean run time of recent jobs', [('', queue['avg_run_seconds'])]),
+        ('password_hash_in_flight', 'Password hashes queued or running in this process',
+         [('', passwords.in_flight())]),
+    ]
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
 
 @app.route('/logout')
 @login_required
@@ -1151,10 +1418,10 @@ def internal_error(error):
     db.session.rollback()
     return render_template('500.html'), 500
 
-@app.route('/uploads/<filename>')
+@app.route('/uploads/<path:filename>')
 @login_required
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    return send_upload(filename, ['notes', 'messages'])
 
 if __name__ == '__main__':
     import os
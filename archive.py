@@ -0,0 +1,438 @@
+import os
+import re
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import Column, Date, Index, Integer, MetaData, String, Table, bindparam, delete, select, text
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlalchemy.dialects.sqlite import insert
+
+import attendance_store
+from models import db, User, Student, Attendance, AttendanceDay, AttendanceOverride, Message, Complaint, \
+    LostFound, LostFoundImage
+from search import SEARCH_SOURCES, build_match_query
+
+# Archival tier. Messages, resolved complaints, resolved lost & found posts
+# and attendance older than a cutoff move out of the hot database into one
+# SQLite file per academic year (archive_<start year>.db in ARCHIVE_DIR).
+# The file is ATTACHed to a connection of the main engine, so every batch is
+# an INSERT ... SELECT into the archive plus a DELETE from the hot table in one
+# transaction: an interrupted run leaves nothing half-moved and is simply run
+# again. Afterwards the hot database hands its free pages back to the file
+# system with an incremental vacuum. New databases are created in that mode;
+# older ones are switched once with 'flask archive --enable-incremental-vacuum'.
+#
+# Archives are read-only. Search falls back to them (newest year first) when
+# the hot tables have fewer matches than asked for, and the attendance and
+# complaint exports stream archived rows ahead of the hot ones. Attendance is
+# archived as export rows (student and marker names included), so it outlives
+# the students and the storage mode it was recorded with.
+
+SCHEMA = 'archive'  # Name the archive file is attached under
+ARCHIVE_FILE = re.compile(r'^archive_(\d{4})\.db$')
+
+# kind: (model, condition for rows that may leave the hot database)
+POSTS = {
+    'messages': (Message, None),
+    'complaints': (Complaint, Complaint.is_resolved.is_(True)),
+    'lost_found': (LostFound, LostFound.is_resolved.is_(True)),
+}
+KINDS = tuple(POSTS) + ('attendance',)
+
+ArchivedPost = namedtuple('ArchivedPost', 'id title posted_at poster archive')
+
+_settings = {'dir': os.path.join('instance', 'archive'), 'after_days': 730, 'batch_size': 1000, 'start_month': 7}
+
+
+def init_app(app):
+    _settings['dir'] = app.config['ARCHIVE_DIR']
+    _settings['after_days'] = app.config['ARCHIVE_AFTER_DAYS']
+    _settings['batch_size'] = app.config['ARCHIVE_BATCH_SIZE']
+    _settings['start_month'] = app.config['ACADEMIC_YEAR_START_MONTH']
+
+
+# Archive tables: the post tables column for column (without foreign keys,
+# the users stay in the hot database), attendance as denormalised export rows
+metadata = MetaData()
+
+
+def _copy_table(model):
+    table = model.__table__
+    return Table(table.name, metadata, *[Column(column.name, column.type, primary_key=column.primary_key)
+                                         for column in table.columns], schema=SCHEMA)
+
+
+TABLES = {model.__table__.name: _copy_table(model) for model in (Message, Complaint, LostFound, LostFoundImage)}
+TABLES['attendance'] = Table(
+    'attendance', metadata,
+    Column('date', Date, primary_key=True),
+    Column('roll_number', String(20), primary_key=True),
+    Column('name', String(100)),
+    Column('branch', String(50)),
+    Column('year', Integer),
+    Column('status', String(10)),
+    Column('marked_by', String(100)),  # The marker's name
+    schema=SCHEMA, sqlite_with_rowid=False,
+)
+for _name in ('message', 'complaint', 'lost_found'):
+    Index(f'ix_archive_{_name}_posted_at_id', TABLES[_name].c.posted_at, TABLES[_name].c.id)
+Index('ix_archive_lost_found_image_lost_found_id', TABLES['lost_found_image'].c.lost_found_id)
+
+
+def academic_year(day):
+    """Calendar year in which the academic year containing `day` starts"""
+    return day.year if day.month >= _settings['start_month'] else day.year - 1
+
+
+def year_bounds(start_year):
+    """[first day, first day of the next academic year)"""
+    month = _settings['start_month']
+    return date(start_year, month, 1), date(start_year + 1, month, 1)
+
+
+def label(start_year):
+    return f'{start_year}-{(start_year + 1) % 100:02d}'
+
+
+def default_cutoff():
+    return date.today() - timedelta(days=_settings['after_days'])
+
+
+def archive_path(start_year):
+    return os.path.join(_settings['dir'], f'archive_{start_year}.db')
+
+
+def archives():
+    """[(start year, path)] of the existing archive files, newest first"""
+    if not os.path.isdir(_settings['dir']):
+        return []
+    found = []
+    for name in os.listdir(_settings['dir']):
+        match = ARCHIVE_FILE.match(name)
+        if match:
+            found.append((int(match.group(1)), os.path.join(_settings['dir'], name)))
+    return sorted(found, reverse=True)
+
+
+@contextmanager
+def attached(path):
+    """A connection of the main engine with the archive file at `path` attached as SCHEMA"""
+    with db.engine.connect() as connection:
+        # ATTACH is refused inside a transaction; nothing has been run on this connection yet
+        connection.exec_driver_sql(f'ATTACH DATABASE ? AS {SCHEMA}', (os.path.abspath(path),))
+        try:
+            yield connection
+        finally:
+            connection.rollback()
+            connection.exec_driver_sql(f'DETACH DATABASE {SCHEMA}')
+
+
+def _create_schema(connection, schema=SCHEMA):
+    """Create the archive tables in the file attached as `schema`"""
+    options = {'schema_translate_map': {SCHEMA: schema}}
+    for table in metadata.sorted_tables:
+        connection.execute(CreateTable(table, if_not_exists=True), execution_options=options)
+        for index in table.indexes:
+            connection.execute(CreateIndex(index, if_not_exists=True), execution_options=options)
+    for kind, (model, _) in POSTS.items():
+        table = model.__table__.name
+        columns = ', '.join(SEARCH_SOURCES[kind][1])
+        # Same index as the hot table (see search.py); rows are added to it as they are archived
+        connection.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {schema}.{table}_fts USING fts5({columns}, content='{table}', "
+            f"content_rowid='id', tokenize='porter unicode61', prefix='2 3')")
+
+
+# Moving records
+
+def _post_filter(model, condition, start, end):
+    clauses = [model.posted_at >= datetime.combine(start, time()), model.posted_at < datetime.combine(end, time())]
+    if condition is not None:
+        clauses.append(condition)
+    return clauses
+
+
+def _pending_posts(kind, cutoff):
+    """{academic year: rows} of a post kind waiting to be archived"""
+    model, condition = POSTS[kind]
+    pending = {}
+    oldest = db.session.query(db.func.min(model.posted_at)).filter(*_post_filter(model, condition, date.min, cutoff)) \
+        .scalar()
+    if oldest is None:
+        return pending
+    for start_year in range(academic_year(oldest.date()), academic_year(cutoff - timedelta(days=1)) + 1):
+        start, end = year_bounds(start_year)
+        count = db.session.query(model).filter(*_post_filter(model, condition, start, min(end, cutoff))).count()
+        if count:
+            pending[start_year] = count
+    return pending
+
+
+def _move_posts(connection, kind, start, end, batch_size):
+    model, condition = POSTS[kind]
+    source = model.__table__
+    archived = TABLES[source.name]
+    fts = f'{SCHEMA}.{source.name}_fts'
+    fts_columns = ', '.join(SEARCH_SOURCES[kind][1])
+    ids_param = bindparam('ids', expanding=True)
+    moved = 0
+    while True:
+        ids = connection.execute(
+            select(model.id).where(*_post_filter(model, condition, start, end))
+            .order_by(model.posted_at, model.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return moved
+        # Rows already in the archive (from a run that also committed there) are not indexed twice
+        connection.execute(text(
+            f'INSERT INTO {fts}(rowid, {fts_columns}) SELECT id, {fts_columns} FROM main.{source.name} '
+            f'WHERE id IN :ids AND id NOT IN (SELECT id FROM {SCHEMA}.{source.name})'
+        ).bindparams(ids_param), {'ids': ids})
+        connection.execute(insert(archived).from_select(list(source.columns.keys()),
+                                                        select(source).where(model.id.in_(ids)))
+                           .on_conflict_do_nothing())
+        if model is LostFound:
+            images = LostFoundImage.__table__
+            connection.execute(insert(TABLES['lost_found_image']).from_select(
+                list(images.columns.keys()), select(images).where(LostFoundImage.lost_found_id.in_(ids))
+            ).on_conflict_do_nothing())
+            connection.execute(delete(LostFoundImage).where(LostFoundImage.lost_found_id.in_(ids)))
+        # Uploaded files stay in the blob store: the archived rows still reference them
+        connection.execute(delete(model).where(model.id.in_(ids)))
+        connection.commit()
+        moved += len(ids)
+
+
+def _attendance_dates(start, end):
+    model = AttendanceDay if attendance_store.storage() == 'bitmap' else Attendance
+    return [day for (day,) in db.session.query(model.date).filter(model.date >= start, model.date < end)
+            .distinct().order_by(model.date)]
+
+
+def _pending_attendance(cutoff):
+    pending = {}
+    for day in _attendance_dates(date.min, cutoff):
+        pending[academic_year(day)] = pending.get(academic_year(day), 0) + 1
+    return pending
+
+
+def _attendance_upsert():
+    upsert = insert(TABLES['attendance'])
+    # A date marked again after it was archived replaces the archived marks
+    return upsert.on_conflict_do_update(index_elements=['date', 'roll_number'], set_={
+        column: upsert.excluded[column] for column in ('name', 'branch', 'year', 'status', 'marked_by')})
+
+
+def _row_marks(*conditions):
+    """Marks in row storage as archive rows, for an INSERT ... SELECT"""
+    return select(Attendance.date, Student.roll_number, Student.name, Student.branch, Student.year,
+                  Attendance.status, User.name) \
+        .join(Student, Attendance.student_id == Student.id) \
+        .outerjoin(User, Attendance.marked_by == User.id) \
+        .where(*conditions)
+
+
+def _bitmap_rows(execute, marks):
+    """Archive rows for (date, SeatStudent, status, marked_by) marks from bitmap storage"""
+    names = dict(execute(select(User.id, User.name).where(User.id.in_({marked_by for *_, marked_by in marks}))).all())
+    return [{'date': day, 'roll_number': student.roll_number, 'name': student.name, 'branch': student.branch,
+             'year': student.year, 'status': status, 'marked_by': names.get(marked_by)}
+            for day, student, status, marked_by in marks]
+
+
+def _move_attendance(connection, start, end):
+    """Archive attendance one date per transaction; returns the marks moved"""
+    upsert = _attendance_upsert()
+    moved = 0
+    for day in _attendance_dates(start, end):
+        if attendance_store.storage() == 'bitmap':
+            rows = _bitmap_rows(connection.execute, list(attendance_store.iter_marks(day, day)))
+            if rows:
+                connection.execute(upsert, rows)
+            connection.execute(delete(AttendanceOverride).where(AttendanceOverride.date == day))
+            connection.execute(delete(AttendanceDay).where(AttendanceDay.date == day))
+            moved += len(rows)
+        else:
+            moved += connection.execute(upsert.from_select(list(TABLES['attendance'].columns.keys()),
+                                                           _row_marks(Attendance.date == day))).rowcount
+            connection.execute(delete(Attendance).where(Attendance.date == day))
+        connection.commit()
+    return moved
+
+
+def archive_student_marks(students):
+    """Copy the hot marks of `students` (a select of ids) into the yearly archives; returns the marks copied.
+
+    The copy joins the session's transaction, so it is committed or rolled
+    back with whatever the caller does next (deleting those marks, say). Call
+    it before that transaction has written anything: the archives are ATTACHed
+    to the session's connection, which is taken out of the pool so that they
+    go away with it.
+    """
+    if attendance_store.storage() == 'bitmap':
+        rows = _bitmap_rows(db.session.execute, list(attendance_store.iter_marks(None, None, students=students)))
+        years = {academic_year(row['date']) for row in rows}
+    else:
+        rows = None
+        years = {academic_year(day) for (day,) in db.session.query(Attendance.date)
+                 .filter(Attendance.student_id.in_(students)).distinct()}
+    if not years:
+        return 0
+
+    os.makedirs(_settings['dir'], exist_ok=True)
+    connection = db.session.connection()
+    connection.detach()
+    for start_year in sorted(years):
+        connection.exec_driver_sql(f'ATTACH DATABASE ? AS {SCHEMA}_{start_year}',
+                                   (os.path.abspath(archive_path(start_year)),))
+    copied = 0
+    for start_year in sorted(years):
+        schema = f'{SCHEMA}_{start_year}'
+        options = {'schema_translate_map': {SCHEMA: schema}}
+        _create_schema(connection, schema)
+        start, end = year_bounds(start_year)
+        if rows is None:
+            copied += db.session.execute(_attendance_upsert().from_select(
+                list(TABLES['attendance'].columns.keys()),
+                _row_marks(Attendance.student_id.in_(students), Attendance.date >= start, Attendance.date < end)
+            ), execution_options=options).rowcount
+        else:
+            year_rows = [row for row in rows if start <= row['date'] < end]
+            db.session.execute(_attendance_upsert(), year_rows, execution_options=options)
+            copied += len(year_rows)
+    return copied
+
+
+def pending(cutoff=None, kinds=KINDS):
+    """{kind: {academic year: rows (dates for attendance)}} older than the cutoff"""
+    cutoff = cutoff or default_cutoff()
+    return {kind: _pending_attendance(cutoff) if kind == 'attendance' else _pending_posts(kind, cutoff)
+            for kind in kinds}
+
+
+def archive(cutoff=None, kinds=KINDS, log=print):
+    """Move everything older than the cutoff into the yearly archives; returns {kind: {academic year: moved}}"""
+    cutoff = cutoff or default_cutoff()
+    os.makedirs(_settings['dir'], exist_ok=True)
+    moved = {}
+    for kind, years in pending(cutoff, kinds).items():
+        moved[kind] = {}
+        for start_year in sorted(years):
+            start, end = year_bounds(start_year)
+            with attached(archive_path(start_year)) as connection:
+                _create_schema(connection)
+                connection.commit()
+                if kind == 'attendance':
+                    count = _move_attendance(connection, start, min(end, cutoff))
+                else:
+                    count = _move_posts(connection, kind, start, min(end, cutoff), _settings['batch_size'])
+            moved[kind][start_year] = count
+            log(f"{kind} {label(start_year)}: archived {count}")
+    return moved
+
+
+def enable_incremental_vacuum():
+    """Switch the hot database to incremental auto_vacuum; returns False if it already was
+
+    This is a full VACUUM: the whole file is rewritten under an exclusive lock
+    and needs about the database's size in free disk, so run it off-hours.
+    """
+    if db.session.execute(text('PRAGMA auto_vacuum')).scalar() == 2:
+        return False
+    db.session.commit()
+    db.session.execute(text('PRAGMA auto_vacuum = INCREMENTAL'))
+    db.session.execute(text('VACUUM'))
+    return True
+
+
+def vacuum(step=1000):
+    """Release the hot database's free pages, `step` pages per transaction; returns the pages released"""
+    if db.session.execute(text('PRAGMA auto_vacuum')).scalar() != 2:
+        return None  # Not in incremental mode yet (see enable_incremental_vacuum)
+    db.session.commit()
+    released, previous = 0, None
+    while True:
+        free = db.session.execute(text('PRAGMA freelist_count')).scalar()
+        db.session.commit()
+        if not free or free == previous:
+            return released
+        previous = free
+        connection = db.engine.raw_connection()
+        try:
+            # executescript steps the pragma to completion; a plain execute() frees a single page
+            connection.executescript(f'PRAGMA incremental_vacuum({int(step)})')
+        finally:
+            connection.close()
+        released += min(free, step)
+
+
+# Reading archived records
+
+def search(query, kinds=None, found=None, limit=20):
+    """Archived matches as {kind: [(ArchivedPost, snippet), ...]}, newest archive first.
+
+    `found` is {kind: matches the hot search already has}; only the rest of
+    `limit` is looked for, and kinds that are full are not searched at all.
+    """
+    match = build_match_query(query)
+    wanted = {kind: limit - (found or {}).get(kind, 0) for kind in POSTS if not kinds or kind in kinds}
+    wanted = {kind: count for kind, count in wanted.items() if count > 0}
+    if not match or not wanted:
+        return {}
+
+    matches = {}
+    for start_year, path in archives():
+        with attached(path) as connection:
+            for kind, count in wanted.items():
+                if count <= 0:
+                    continue
+                table = POSTS[kind][0].__table__.name
+                fts = f'{table}_fts'
+                title = 'src.title' if 'title' in TABLES[table].c else 'NULL'
+                rows = connection.execute(text(
+                    f"SELECT src.id, {title} AS title, src.posted_at, src.posted_by, "
+                    f"snippet({fts}, -1, '', '', '…', 12) AS snippet FROM {SCHEMA}.{fts} "
+                    f"JOIN {SCHEMA}.{table} AS src ON src.id = {fts}.rowid "
+                    f"WHERE {fts} MATCH :match ORDER BY bm25({fts}) LIMIT :limit"
+                ).columns(posted_at=db.DateTime), {'match': match, 'limit': count}).all()
+                matches.setdefault(kind, []).extend((row, label(start_year)) for row in rows)
+                wanted[kind] -= len(rows)
+
+    posters = {row.posted_by for rows in matches.values() for row, _ in rows}
+    users = {user.id: user for user in User.query.filter(User.id.in_(posters))} if posters else {}
+    return {kind: [(ArchivedPost(row.id, row.title, row.posted_at, users.get(row.posted_by), year), row.snippet)
+                   for row, year in rows]
+            for kind, rows in matches.items() if rows}
+
+
+def _overlapping(start, end):
+    """Archives whose academic year overlaps [start, end], oldest first"""
+    return [(start_year, path) for start_year, path in reversed(archives())
+            if year_bounds(start_year)[0] <= end and start < year_bounds(start_year)[1]]
+
+
+def attendance_rows(start, end, branch=None, year=None):
+    """Archived attendance in [start, end] as export rows, in date order"""
+    archived = TABLES['attendance']
+    statement = select(archived).where(archived.c.date.between(start, end))
+    if branch:
+        statement = statement.where(archived.c.branch == branch)
+    if year:
+        statement = statement.where(archived.c.year == year)
+    statement = statement.order_by(archived.c.date, archived.c.roll_number)
+    for _, path in _overlapping(start, end):
+        with attached(path) as connection:
+            yield from connection.execute(statement, execution_options={'yield_per': 2000})
+
+
+def complaint_rows():
+    """Archived complaints as export rows, oldest first"""
+    archived = TABLES['complaint']
+    statement = select(archived.c.id, archived.c.posted_at, archived.c.title, archived.c.message, User.name,
+                       User.phone, archived.c.is_resolved) \
+        .outerjoin(User, archived.c.posted_by == User.id) \
+        .order_by(archived.c.posted_at, archived.c.id)
+    for _, path in reversed(archives()):
+        with attached(path) as connection:
+            yield from connection.execute(statement, execution_options={'yield_per': 2000})
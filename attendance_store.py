@@ -0,0 +1,447 @@
+from collections import defaultdict, namedtuple
+
+from sqlalchemy import and_, bindparam
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import joinedload
+
+from models import db, Attendance, AttendanceDay, AttendanceOverride, AttendanceSeat, Student, User
+
+ATTENDANCE_STATUSES = ('Present', 'Absent', 'Late')
+ATTENDED_STATUSES = ('Present', 'Late')  # Late arrivals still count as attended
+
+# Attendance storage. 'rows' keeps one attendance row per student per day.
+# 'bitmap' keeps one attendance_day row per class (branch + year) per date with
+# two packed bitmaps, marked and attended, indexed by the student's seat in that
+# class (attendance_seat). Statuses are Present/Absent from the bits; Late marks
+# and marks by anyone other than the day's first marker are kept in the sparse
+# attendance_override table. Range counts are popcounts over the bitmaps, and
+# per-student totals add whole bitmaps into bit-sliced counters, so a report
+# touches one row per class per day instead of one per student per day.
+#
+# Seats are handed out in order. A student who changes class gets a new seat
+# there; marks stay with the class the student was in on the day. Deleting a
+# student clears their bits first, so a seat freed at the top can be reused.
+#
+# Switch with ATTENDANCE_STORAGE and move existing marks across with
+# 'flask convert-attendance'. Routes, reports and exports only use the helpers
+# below, which give the same answers in both modes.
+
+Mark = namedtuple('Mark', 'date student status marked_by marker')
+SeatStudent = namedtuple('SeatStudent', 'id name roll_number branch year')
+
+_settings = {'storage': 'rows'}
+
+
+def init_app(app):
+    storage = app.config['ATTENDANCE_STORAGE']
+    if storage not in ('rows', 'bitmap'):
+        raise ValueError(f"ATTENDANCE_STORAGE must be rows or bitmap, not {storage!r}")
+    _settings['storage'] = storage
+
+
+def storage():
+    return _settings['storage']
+
+
+def _bits(blob):
+    return int.from_bytes(blob, 'little')
+
+
+def _blob(bits):
+    return bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+
+
+def _seats(bits):
+    """Seat numbers of the set bits, lowest first"""
+    seats = []
+    for index, byte in enumerate(_blob(bits)):
+        while byte:
+            low = byte & -byte
+            seats.append(index * 8 + low.bit_length() - 1)
+            byte ^= low
+    return seats
+
+
+def upsert_attendance(statuses, attendance_date, marked_by):
+    """Write a {student_id: status} mapping for one date.
+
+    Re-marking a student overwrites the earlier mark. The caller owns the
+    transaction and must commit.
+    """
+    if not statuses:
+        return 0
+    if storage() == 'bitmap':
+        return _upsert_bitmap(statuses, attendance_date, marked_by)
+    return _upsert_rows(statuses, attendance_date, marked_by)
+
+
+def _upsert_rows(statuses, attendance_date, marked_by):
+    # INSERT ... ON CONFLICT(student_id, date) DO UPDATE, so nothing races a check-then-insert
+    rows = [
+        {'student_id': student_id, 'date': attendance_date, 'status': status, 'marked_by': marked_by}
+        for student_id, status in statuses.items()
+    ]
+    stmt = insert(Attendance.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['student_id', 'date'],
+        set_={'status': stmt.excluded.status, 'marked_by': stmt.excluded.marked_by}
+    )
+    db.session.execute(stmt, rows)
+    return len(rows)
+
+
+def _assign_seats(branch, year, student_ids):
+    """{student_id: seat} in a class, giving new seats to students that have none yet"""
+    seats = dict(db.session.query(AttendanceSeat.student_id, AttendanceSeat.seat).filter(
+        AttendanceSeat.branch == branch, AttendanceSeat.year == year, AttendanceSeat.student_id.in_(student_ids)
+    ).all())
+    missing = sorted(set(student_ids) - set(seats))
+    if missing:
+        next_seat = (db.session.query(db.func.max(AttendanceSeat.seat))
+                     .filter_by(branch=branch, year=year).scalar() or -1) + 1
+        for offset, student_id in enumerate(missing):
+            seats[student_id] = next_seat + offset
+        db.session.execute(insert(AttendanceSeat.__table__), [
+            {'branch': branch, 'year': year, 'seat': seats[student_id], 'student_id': student_id}
+            for student_id in missing
+        ])
+    return seats
+
+
+def _upsert_bitmap(statuses, attendance_date, marked_by):
+    classes = defaultdict(list)
+    for student_id, branch, year in db.session.query(Student.id, Student.branch, Student.year) \
+            .filter(Student.id.in_(statuses)).all():
+        classes[(branch, year)].append(student_id)
+
+    days = AttendanceDay.__table__
+    overrides = AttendanceOverride.__table__
+    written = 0
+    for (branch, year), student_ids in classes.items():
+        # Creating the day row first takes the write lock, so the read-modify-write below cannot interleave
+        db.session.execute(insert(days).values(
+            branch=branch, year=year, date=attendance_date, marked=b'', attended=b'', marked_count=0,
+            marked_by=marked_by
+        ).on_conflict_do_nothing())
+        day = db.session.execute(days.select().where(
+            days.c.branch == branch, days.c.year == year, days.c.date == attendance_date
+        )).one()
+        seats = _assign_seats(branch, year, student_ids)
+
+        marked, attended = _bits(day.marked), _bits(day.attended)
+        special, plain = [], []
+        for student_id in student_ids:
+            seat, status = seats[student_id], statuses[student_id]
+            marked |= 1 << seat
+            if status in ATTENDED_STATUSES:
+                attended |= 1 << seat
+            else:
+                attended &= ~(1 << seat)
+            if status == 'Late' or marked_by != day.marked_by:
+                special.append({'branch': branch, 'year': year, 'date': attendance_date, 'seat': seat,
+                                'status': status, 'marked_by': marked_by})
+            else:
+                plain.append(seat)
+
+        db.session.execute(days.update().where(
+            days.c.branch == branch, days.c.year == year, days.c.date == attendance_date
+        ).values(marked=_blob(marked), attended=_blob(attended), marked_count=marked.bit_count()))
+        if special:
+            stmt = insert(overrides)
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=['branch', 'year', 'date', 'seat'],
+                set_={'status': stmt.excluded.status, 'marked_by': stmt.excluded.marked_by}
+            ), special)
+        if plain:
+            db.session.execute(overrides.delete().where(
+                overrides.c.branch == branch, overrides.c.year == year, overrides.c.date == attendance_date,
+                overrides.c.seat.in_(plain)
+            ))
+        written += len(student_ids)
+    return written
+
+
+def _seat_students(classes, branch=None, year=None, students=None):
+    """{(branch, year, seat): SeatStudent} for a set of (branch, year) classes (None: all matching classes)"""
+    query = db.session.query(AttendanceSeat.branch, AttendanceSeat.year, AttendanceSeat.seat, Student.id,
+                             Student.name, Student.roll_number, Student.branch, Student.year) \
+        .join(Student, Student.id == AttendanceSeat.student_id)
+    if classes is not None:
+        if not classes:
+            return {}
+        query = query.filter(db.or_(*(and_(AttendanceSeat.branch == class_branch, AttendanceSeat.year == class_year)
+                                      for class_branch, class_year in classes)))
+    if branch:
+        query = query.filter(AttendanceSeat.branch == branch)
+    if year:
+        query = query.filter(AttendanceSeat.year == year)
+    if students is not None:
+        query = query.filter(AttendanceSeat.student_id.in_(students))
+    return {tuple(row[:3]): SeatStudent(*row[3:]) for row in query.all()}
+
+
+def _overrides(days):
+    """{(branch, year, date, seat): (status, marked_by)} for the given day rows"""
+    if not days:
+        return {}
+    rows = db.session.query(AttendanceOverride).filter(
+        db.or_(*(and_(AttendanceOverride.branch == day.branch, AttendanceOverride.year == day.year,
+                      AttendanceOverride.date == day.date) for day in days))
+    ).all()
+    return {(row.branch, row.year, row.date, row.seat): (row.status, row.marked_by) for row in rows}
+
+
+def _day_marks(day, seat_students, overrides):
+    """(seat, student, status, marked_by) for every mark in one day row"""
+    attended = _bits(day.attended)
+    for seat in _seats(_bits(day.marked)):
+        override = overrides.get((day.branch, day.year, day.date, seat))
+        if override:
+            status, marked_by = override
+        else:
+            status, marked_by = ('Present' if attended >> seat & 1 else 'Absent'), day.marked_by
+        student = seat_students.get((day.branch, day.year, seat))
+        if student is not None:
+            yield seat, student, status, marked_by
+
+
+def marks_on(attendance_date):
+    """Every mark for one date as Mark tuples, with student and marker loaded"""
+    if storage() == 'rows':
+        records = Attendance.query.options(
+            joinedload(Attendance.student), joinedload(Attendance.marker)
+        ).filter_by(date=attendance_date).all()
+        return [Mark(record.date, record.student, record.status, record.marked_by, record.marker)
+                for record in records]
+
+    days = AttendanceDay.query.filter_by(date=attendance_date).all()
+    seat_students = _seat_students({(day.branch, day.year) for day in days})
+    overrides = _overrides(days)
+    marks = [(student, status, marked_by) for day in days
+             for _, student, status, marked_by in _day_marks(day, seat_students, overrides)]
+    marker_ids = {marked_by for _, _, marked_by in marks}
+    markers = {user.id: user for user in User.query.filter(User.id.in_(marker_ids)).all()} if marker_ids else {}
+    return [Mark(attendance_date, student, status, marked_by, markers.get(marked_by))
+            for student, status, marked_by in marks]
+
+
+def statuses_on(attendance_date, students):
+    """{student_id: status} on one date for the given Student objects"""
+    if not students:
+        return {}
+    if storage() == 'rows':
+        return dict(db.session.query(Attendance.student_id, Attendance.status).filter(
+            Attendance.date == attendance_date,
+            Attendance.student_id.in_([student.id for student in students])
+        ).all())
+
+    wanted = {student.id for student in students}
+    days = AttendanceDay.query.filter(
+        AttendanceDay.date == attendance_date,
+        db.or_(*(and_(AttendanceDay.branch == branch, AttendanceDay.year == year)
+                 for branch, year in {(student.branch, student.year) for student in students}))
+    ).all()
+    seat_students = _seat_students({(day.branch, day.year) for day in days})
+    overrides = _overrides(days)
+    return {student.id: status for day in days
+            for _, student, status, _ in _day_marks(day, seat_students, overrides) if student.id in wanted}
+
+
+def marked_dates(since):
+    """Dates on or after `since` that have any marks, newest first"""
+    model = Attendance if storage() == 'rows' else AttendanceDay
+    return [row[0] for row in db.session.query(model.date).filter(model.date >= since)
+            .distinct().order_by(model.date.desc()).all()]
+
+
+def delete_student_marks(student_id):
+    """Remove every mark of a student (before deleting the student)"""
+    delete_students_marks([student_id])
+
+
+def _class_seats(students):
+    """{(branch, year): [seat, ...]} for students given as ids or a select of ids"""
+    class_seats = defaultdict(list)
+    for branch, year, seat in db.session.query(AttendanceSeat.branch, AttendanceSeat.year, AttendanceSeat.seat) \
+            .filter(AttendanceSeat.student_id.in_(students)):
+        class_seats[(branch, year)].append(seat)
+    return class_seats
+
+
+def count_students_marks(students):
+    """How many marks delete_students_marks would remove, found with reads only"""
+    counted = Attendance.query.filter(Attendance.student_id.in_(students)).count()
+    for (branch, year), seats in _class_seats(students).items():
+        mask = sum(1 << seat for seat in seats)
+        for (marked,) in db.session.query(AttendanceDay.marked).filter_by(branch=branch, year=year):
+            counted += (_bits(marked) & mask).bit_count()
+    return counted
+
+
+def delete_students_marks(students):
+    """Remove every mark of many students (ids or a select of ids); returns the marks removed.
+
+    Rows go in one DELETE. For bitmaps, the students' seats are combined into
+    one mask per class and each affected day row is rewritten by a single
+    executemany UPDATE.
+    """
+    removed = Attendance.query.filter(Attendance.student_id.in_(students)).delete(synchronize_session=False)
+    class_seats = _class_seats(students)
+
+    days = AttendanceDay.__table__
+    rewrite = days.update().where(
+        days.c.branch == bindparam('day_branch'), days.c.year == bindparam('day_year'),
+        days.c.date == bindparam('day_date')
+    ).values(marked=bindparam('new_marked'), attended=bindparam('new_attended'),
+             marked_count=bindparam('new_count'))
+    for (branch, year), seats in class_seats.items():
+        mask = sum(1 << seat for seat in seats)
+        updates = []
+        for day in db.session.execute(days.select().where(days.c.branch == branch, days.c.year == year)):
+            marked = _bits(day.marked)
+            if marked & mask:
+                removed += (marked & mask).bit_count()
+                marked &= ~mask
+                updates.append({'day_branch': branch, 'day_year': year, 'day_date': day.date,
+                                'new_marked': _blob(marked), 'new_attended': _blob(_bits(day.attended) & ~mask),
+                                'new_count': marked.bit_count()})
+        if updates:
+            db.session.execute(rewrite, updates)
+        AttendanceOverride.query.filter(AttendanceOverride.branch == branch, AttendanceOverride.year == year,
+                                        AttendanceOverride.seat.in_(seats)).delete(synchronize_session=False)
+    AttendanceSeat.query.filter(AttendanceSeat.student_id.in_(students)).delete(synchronize_session=False)
+    return removed
+
+
+def _day_query(start, end, branch=None, year=None):
+    query = AttendanceDay.query
+    if start:
+        query = query.filter(AttendanceDay.date >= start)
+    if end:
+        query = query.filter(AttendanceDay.date <= end)
+    if branch:
+        query = query.filter(AttendanceDay.branch == branch)
+    if year:
+        query = query.filter(AttendanceDay.year == year)
+    return query
+
+
+def class_totals(start=None, end=None, branch=None, year=None):
+    """{(branch, year): (students with marks, attended, total)} by popcount over the class bitmaps"""
+    totals = {}
+    for day in _day_query(start, end, branch, year).yield_per(1000):
+        students, attended, total = totals.get((day.branch, day.year), (0, 0, 0))
+        totals[(day.branch, day.year)] = (students | _bits(day.marked), attended + _bits(day.attended).bit_count(),
+                                          total + day.marked_count)
+    return {key: (students.bit_count(), attended, total) for key, (students, attended, total) in totals.items()}
+
+
+def _add(planes, bits):
+    """Add a one-bit-per-seat bitmap into bit-sliced counters (planes[k] is bit k of every seat's count)"""
+    for k, plane in enumerate(planes):
+        planes[k] = plane ^ bits
+        bits &= plane
+        if not bits:
+            return
+    if bits:
+        planes.append(bits)
+
+
+def _counts(planes):
+    """{seat: count} from bit-sliced counters, for seats with a count above zero"""
+    counts = defaultdict(int)
+    for k, plane in enumerate(planes):
+        for seat in _seats(plane):
+            counts[seat] += 1 << k
+    return counts
+
+
+def student_totals(start=None, end=None, branch=None, year=None, period=None):
+    """{student_id: (attended, total)} over [start, end] for students of the matching classes.
+
+    With `period` (a function of the date, e.g. its month) the result is
+    {(student_id, period): (attended, total)} instead.
+    """
+    counters = defaultdict(lambda: ([], []))  # (branch, year, period) -> attended planes, marked planes
+    for day in _day_query(start, end, branch, year).yield_per(1000):
+        attended, marked = counters[(day.branch, day.year, period(day.date) if period else None)]
+        _add(attended, _bits(day.attended))
+        _add(marked, _bits(day.marked))
+
+    seat_students = _seat_students({(class_branch, class_year) for class_branch, class_year, _ in counters})
+    totals = {}
+    for (class_branch, class_year, key), (attended, marked) in counters.items():
+        attended = _counts(attended)
+        for seat, total in _counts(marked).items():
+            student = seat_students.get((class_branch, class_year, seat))
+            if student is not None:
+                # A student who changed class has a seat in each; add them up
+                total_key = (student.id, key) if period else student.id
+                earlier_attended, earlier_total = totals.get(total_key, (0, 0))
+                totals[total_key] = (earlier_attended + attended.get(seat, 0), earlier_total + total)
+    return totals
+
+
+def iter_marks(start, end, branch=None, year=None, students=None):
+    """(date, SeatStudent, status, marked_by) for every mark in [start, end], in date order.
+
+    `students` (ids or a select of ids) keeps only the marks of those students.
+    """
+    seat_students = _seat_students(None, branch, year, students)
+    days = _day_query(start, end, branch, year)
+    if students is not None:
+        classes = {(seat_branch, seat_year) for seat_branch, seat_year, _ in seat_students}
+        if not classes:
+            return
+        days = days.filter(db.or_(*(and_(AttendanceDay.branch == class_branch, AttendanceDay.year == class_year)
+                                    for class_branch, class_year in classes)))
+    days = days.order_by(AttendanceDay.date, AttendanceDay.branch, AttendanceDay.year)
+    batch = []
+    for day in days.yield_per(500):
+        if batch and day.date != batch[0].date:
+            yield from _batch_marks(batch, seat_students)
+            batch = []
+        batch.append(day)
+    yield from _batch_marks(batch, seat_students)
+
+
+def _batch_marks(days, seat_students):
+    overrides = _overrides(days)
+    for day in days:
+        for _, student, status, marked_by in _day_marks(day, seat_students, overrides):
+            yield day.date, student, status, marked_by
+
+
+def convert(target, log=print):
+    """Move every mark into `target` storage ('rows' or 'bitmap'); returns (dates, marks) moved.
+
+    Each date is moved and removed from the other storage in its own
+    transaction, so an interrupted conversion can simply be run again.
+    Marks of students that no longer exist are dropped.
+    """
+    source = Attendance if target == 'bitmap' else AttendanceDay
+    dates = [row[0] for row in db.session.query(source.date).distinct().order_by(source.date).all()]
+    seat_students = _seat_students(None) if target == 'rows' else None
+    moved = 0
+    for index, day in enumerate(dates, start=1):
+        by_marker = defaultdict(dict)
+        if target == 'bitmap':
+            for student_id, status, marked_by in db.session.query(
+                    Attendance.student_id, Attendance.status, Attendance.marked_by).filter_by(date=day):
+                by_marker[marked_by][student_id] = status
+            # The most frequent marker becomes the day's default marker, which keeps overrides to a minimum
+            for marked_by, statuses in sorted(by_marker.items(), key=lambda item: -len(item[1])):
+                moved += _upsert_bitmap(statuses, day, marked_by)
+            Attendance.query.filter_by(date=day).delete()
+        else:
+            for _, student, status, marked_by in _batch_marks(AttendanceDay.query.filter_by(date=day).all(),
+                                                              seat_students):
+                by_marker[marked_by][student.id] = status
+            for marked_by, statuses in by_marker.items():
+                moved += _upsert_rows(statuses, day, marked_by)
+            AttendanceOverride.query.filter_by(date=day).delete()
+            AttendanceDay.query.filter_by(date=day).delete()
+        db.session.commit()
+        if index % 50 == 0:
+            log(f"{index}/{len(dates)} dates converted")
+    return len(dates), moved
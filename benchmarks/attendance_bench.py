@@ -0,0 +1,170 @@
+"""Attendance storage benchmark: one row per mark against per-class bitmaps.
+
+Copies the seeded benchmark database (see seed_data.py), times the attendance
+helpers behind the attendance, roster, report and export pages with row
+storage, converts the copy to bitmap storage with 'flask convert-attendance'
+logic and times them again. Every helper must give the same answer in both
+modes. Also reports the on-disk size of each representation (tables and
+indexes, from dbstat) and the conversion time.
+
+    python benchmarks/attendance_bench.py [--seed-scale 0.2 --attendance-days 180] [--repeat 5]
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+import seed_data  # noqa: E402
+
+TABLES = {
+    'rows': ('attendance',),
+    'bitmap': ('attendance_day', 'attendance_seat', 'attendance_override'),
+}
+
+
+def _copy(source, target):
+    for path in (target, target + '-wal', target + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+    with sqlite3.connect(source) as src, sqlite3.connect(target) as dst:
+        src.backup(dst)
+
+
+def _storage_bytes(database, tables):
+    """Bytes of the pages holding the given tables and their indexes"""
+    with sqlite3.connect(database) as connection:
+        return connection.execute(
+            f"SELECT COALESCE(SUM(s.pgsize), 0) FROM dbstat s JOIN sqlite_master m ON m.name = s.name "
+            f"WHERE m.tbl_name IN ({', '.join('?' * len(tables))})", tables
+        ).fetchone()[0]
+
+
+def _operations(ctx):
+    """(name, callable) pairs; results are normalised so both modes can be compared"""
+    import attendance_store
+    import exports
+    import reports
+
+    first, last, branch, year = ctx['first'], ctx['last'], ctx['branch'], ctx['year']
+
+    def marks_on():
+        return sorted((mark.student.id, mark.status, mark.marked_by) for mark in attendance_store.marks_on(last))
+
+    def export_csv():
+        return sorted(b''.join(exports.write_csv(exports.attendance(first, last))).splitlines())
+
+    return [
+        ('marks on a day', marks_on),
+        ('roster prefill', lambda: attendance_store.statuses_on(last, ctx['class_students'])),
+        ('class rollup', lambda: reports.branch_year_rollup(first, last)),
+        ('class percentages', lambda: reports.student_percentages(first, last, branch, year)),
+        ('below 75% (college)', lambda: reports.students_below_threshold(75, first, last)),
+        ('monthly matrix', lambda: reports.monthly_matrix(first, last, branch, year)),
+        ('export csv (all days)', export_csv),
+    ]
+
+
+def _time(fn, repeat):
+    timings, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), result
+
+
+def run(database, repeat=5, log=print):
+    import attendance_store
+    from app import app, db
+    from models import Attendance, Student, User
+
+    results = {}
+    with app.app_context():
+        first, last = db.session.query(db.func.min(Attendance.date), db.func.max(Attendance.date)).one()
+        if first is None:
+            raise SystemExit('The benchmark database has no attendance; seed it with --attendance-days')
+        branch, year = db.session.query(Student.branch, Student.year).first()
+        ctx = {
+            'first': first, 'last': last, 'branch': branch, 'year': year,
+            'class_students': Student.query.filter_by(branch=branch, year=year).all(),
+        }
+        admin_id = db.session.query(User.id).filter_by(role='admin').scalar()
+        roster = {student.id: 'Present' for student in ctx['class_students']}
+        write_day = [last]
+
+        def mark_class():
+            # A class roster for a date nobody has marked yet, as a teacher saves it
+            write_day[0] += timedelta(days=1)
+            attendance_store.upsert_attendance(roster, write_day[0], admin_id)
+            db.session.commit()
+
+        for mode in ('rows', 'bitmap'):
+            if mode == 'bitmap':
+                started = time.perf_counter()
+                dates, marks = attendance_store.convert('bitmap', log=lambda message: None)
+                log(f"converted {marks} marks on {dates} dates in {time.perf_counter() - started:.1f}s")
+            app.config['ATTENDANCE_STORAGE'] = mode
+            attendance_store.init_app(app)
+            db.session.execute(db.text('ANALYZE'))
+
+            size = _storage_bytes(database, TABLES[mode])
+            log(f"\n{mode} storage: {size / 1024:.0f} KB in {', '.join(TABLES[mode])} and their indexes")
+            results[mode] = {'bytes': size, 'operations': {}}
+            for name, fn in _operations(ctx):
+                seconds, result = _time(fn, repeat)
+                results[mode]['operations'][name] = (seconds, result)
+                log(f"  {name:<24} {seconds * 1000:>10.2f} ms")
+            seconds, _ = _time(mark_class, repeat)
+            results[mode]['operations']['mark a class'] = (seconds, None)
+            log(f"  {'mark a class':<24} {seconds * 1000:>10.2f} ms")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', default=os.path.join(BENCH_DIR, 'bench.db'))
+    parser.add_argument('--uploads', default=os.path.join(BENCH_DIR, 'bench_uploads'))
+    parser.add_argument('--seed-scale', type=float, help='reseed the benchmark database at this scale first')
+    parser.add_argument('--attendance-days', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.seed_scale is None and not os.path.exists(args.database):
+        parser.error(f'{args.database} does not exist; pass --seed-scale or run seed_data.py first')
+    if args.seed_scale is not None:
+        # Seed in a child process: the app must only be imported here once it points at the copy
+        subprocess.run([sys.executable, os.path.join(BENCH_DIR, 'seed_data.py'), '--scale', str(args.seed_scale),
+                        '--attendance-days', str(args.attendance_days), '--database', args.database,
+                        '--uploads', args.uploads], check=True)
+
+    # Work on a copy: the benchmark converts the attendance and marks extra days
+    copy = args.database + '-attendance'
+    _copy(args.database, copy)
+    seed_data.configure(copy, args.uploads)
+    results = run(copy, args.repeat)
+
+    rows, bitmap = results['rows'], results['bitmap']
+    mismatches = [name for name, (_, result) in rows['operations'].items()
+                  if result != bitmap['operations'][name][1]]
+    print(f"\n{'operation':<24} {'rows':>10} {'bitmap':>10} {'speedup':>8}")
+    for name, (seconds, _) in rows['operations'].items():
+        bitmap_seconds = bitmap['operations'][name][0]
+        print(f"{name:<24} {seconds * 1000:>8.2f}ms {bitmap_seconds * 1000:>8.2f}ms "
+              f"{seconds / bitmap_seconds:>7.2f}x")
+    print(f"{'storage':<24} {rows['bytes'] / 1024:>8.0f}KB {bitmap['bytes'] / 1024:>8.0f}KB "
+          f"{rows['bytes'] / bitmap['bytes']:>7.2f}x")
+    os.remove(copy)
+    if mismatches:
+        print(f"Results differ between the two storages: {', '.join(mismatches)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,420 @@
+"""Chatbot matcher benchmark.
+
+Replays a corpus of messages through the pre-compiled engine in chatbot.py and
+through a verbatim copy of the original per-call implementation, checks that
+every answer is identical, and reports per-message timings.
+
+    python benchmarks/chatbot_bench.py [--iterations N]
+"""
+import argparse
+import os
+import sys
+import timeit
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatbot import get_chatbot_response  # noqa: E402
+
+MESSAGES = [
+    'hello', 'hi there', 'help', 'How do I mark attendance today?', 'I lost my calculator in the library',
+    'post found keys with photos', 'Submit complaint about WiFi', 'send message to everyone',
+    'share notes for maths', 'contact Dr. Smith the professor', 'add student to CS branch',
+    'what can you do', 'quick commands please', 'admin privileges', 'show my profile', 'who am i',
+    'thanks a lot!', 'goodbye', 'asdfgh', 'Tell me about the weather', 'features', 'communication',
+    'This is a much longer message that rambles on for a while before asking about the notes section',
+    'zzzz qqqq', 'my account settings', 'exit',
+]
+
+USERS = [
+    SimpleNamespace(name='Admin', role='admin', branch=None, year=None, phone='0000000000'),
+    SimpleNamespace(name='Asha', role='student', branch='CS', year=2, phone='9876543210'),
+    SimpleNamespace(name='Ravi', role='teacher', branch='EC', year=None, phone='9123456780'),
+]
+
+
+def legacy_chatbot_response(message, current_user):
+    message = message.lower().strip()
+    
+    # Enhanced responses with file upload info
+    responses = {
+        'hello': f'Hello {current_user.name}! 👋 How can I assist you today in CollegeCompanion?',
+        'hi': f'Hi {current_user.name}! 😊 What can I help you with?',
+        'help': f'''🤖 **CollegeCompanion AI Assistant - Help Guide**
+
+📊 **ATTENDANCE SYSTEM**
+• Mark daily attendance (Teachers/Admin)
+• View attendance records by date
+• Add/edit students (Admin only)
+• Generate attendance reports
+
+🔍 **LOST & FOUND**
+• Post lost or found items with images
+• Upload up to 3 photos per post
+• Browse active posts with image galleries
+• Contact item owners
+• Mark items as resolved
+
+📝 **COMPLAINT BOX**
+• Submit anonymous complaints
+• Delete your own complaints
+• View all complaints (Admin sees posters)
+• Resolve complaints (Admin only)
+
+💬 **COMMUNICATION HUB**
+• Send messages to community
+• Share files (images, documents, videos)
+• Delete your messages
+
+📚 **NOTES SHARING**
+• Create public/private notes
+• Upload study materials (up to 50MB)
+• Download shared resources
+• Organize by subjects/topics
+
+👨‍🏫 **TEACHER DIRECTORY**
+• View faculty contacts
+• See department information
+• Contact teachers directly
+
+🎓 **STUDENT MANAGEMENT**
+• Student database (Admin)
+• Roll number tracking
+• Branch-wise organization
+
+**Quick Commands:** Try: "how to mark attendance", "post lost item with images", "share notes", "contact teachers"''',
+
+        'attendance': '''📊 **Attendance Management Guide:**
+
+**For Teachers/Admin:**
+✅ Mark attendance for specific dates
+✅ View attendance by student or date  
+✅ Generate monthly reports
+✅ Add new students to system
+
+**For Students:**
+✅ View your attendance record
+✅ Check attendance statistics
+
+**Commands to try:**
+• "Mark attendance for today"
+• "View attendance for December"
+• "Add new student"
+• "Check my attendance"''',
+
+        'lost found': '''🔍 **Lost & Found System:**
+
+**Posting Items:**
+✅ Report lost items with detailed descriptions
+✅ Post found items with contact information  
+✅ Upload up to 3 images per post (JPG, PNG, GIF)
+✅ Add location and date information
+✅ Maximum file size: 5MB per image
+
+**Finding Items:**
+✅ Browse all active posts with image galleries
+✅ Search by item type or location
+✅ Contact posters directly
+✅ Mark items as resolved when found
+
+**Image Upload Features:**
+📸 Take clear photos from multiple angles
+🏷️ Show distinctive features or damage
+📍 Include location context in images
+📱 Mobile-friendly upload interface
+
+**Commands to try:**
+• "I lost my calculator in the library"
+• "Show found electronics items" 
+• "How to upload images for lost items"
+• "Post found keys with photos"''',
+
+        'upload': '''📁 **File Upload Guide:**
+
+**Lost & Found Images:**
+✅ Supported: JPG, PNG, GIF
+✅ Maximum: 3 images per post
+✅ Size limit: 5MB per image
+✅ Automatic image optimization
+
+**Notes & Study Materials:**
+✅ Supported: PDF, DOC, PPT, TXT, images, videos
+✅ Maximum: 50MB per file
+✅ Public/private sharing options
+✅ Organized by subjects
+
+**Communication Files:**
+✅ All file types supported
+✅ 50MB size limit
+✅ Instant sharing with community
+✅ File type icons and previews
+
+**Best Practices:**
+• Use descriptive filenames
+• Compress large files when possible
+• Check file formats before uploading
+• Add clear descriptions with files''',
+
+        'complaint': '''📝 **Complaint System:**
+
+**Submitting Complaints:**
+✅ Anonymous submission (name hidden from others)
+✅ Categorized complaints
+✅ Priority tagging
+✅ Track resolution status
+
+**Managing Complaints:**
+✅ Delete your own complaints
+✅ View complaint status
+✅ Admin resolution tracking
+
+**For Admin:**
+✅ View all complaints with poster info
+✅ See who submitted each complaint
+✅ Mark as resolved/reopened
+✅ Delete any complaint
+
+**Commands to try:**
+• "Submit complaint about WiFi"
+• "View pending complaints"
+• "Resolve complaint #5"
+• "Delete my complaint"''',
+
+        'communication': '''💬 **Communication Center:**
+
+**Features:**
+✅ Group messaging for all users
+✅ File sharing (images, PDFs, videos)
+✅ Real-time updates
+✅ Message deletion (own messages)
+
+**File Support:**
+📷 Images: JPG, PNG, GIF
+📄 Documents: PDF, DOC, TXT
+🎬 Videos: MP4, AVI, MOV
+📊 Presentations: PPT, PPTX
+
+**Commands to try:**
+• "Send message to everyone"
+• "Share meeting notes"
+• "Upload class material"''',
+
+        'notes': '''📚 **Notes Sharing Platform:**
+
+**Creating Notes:**
+✅ Public notes (visible to all)
+✅ Private notes (only you)
+✅ File attachments (up to 50MB)
+✅ Rich text content
+
+**Supported Files:**
+📖 Study materials & textbooks
+🎥 Lecture recordings
+📝 Assignment solutions  
+📊 Project presentations
+
+**Commands to try:**
+• "Create private note"
+• "Share lecture slides"
+• "Download math notes"
+• "View public notes"''',
+
+        'teacher': '''👨‍🏫 **Teacher Directory:**
+
+**Information Available:**
+✅ Full contact details
+✅ Department/Branch
+✅ Email addresses
+✅ Designation/Role
+
+**Features:**
+✅ Quick contact access
+✅ Department filtering
+✅ Search functionality
+✅ Admin management
+
+**Commands to try:**
+• "Show CS department teachers"
+• "Contact Dr. Smith"
+• "Add new teacher"''',
+
+        'student': '''👨‍🎓 **Student Management:**
+
+**Admin Features:**
+✅ Add new students
+✅ Edit student information
+✅ Manage roll numbers
+✅ Track by branch/year
+
+**Student Profiles:**
+✅ Name, branch, year
+✅ Unique roll numbers
+✅ Attendance tracking
+✅ Academic organization
+
+**Commands to try:**
+• "Add student to CS branch"
+• "Edit student information"
+• "View all students"''',
+
+        'features': '''🚀 **CollegeCompanion Features:**
+
+**Core Modules:**
+1. **Attendance Tracking** - Digital attendance system
+2. **Lost & Found** - Campus item recovery with image uploads
+3. **Complaint Box** - Anonymous feedback system
+4. **Communication** - Campus-wide messaging
+5. **Notes Sharing** - Study material repository
+6. **Teacher Directory** - Faculty contact management
+7. **Student Management** - Student database
+
+**Advanced Features:**
+• File uploads (50MB limit)
+• Image galleries for Lost & Found
+• Role-based access control
+• Real-time notifications
+• Mobile-responsive design
+• Secure authentication''',
+
+        'commands': '''🎯 **Quick Commands List:**
+
+**Attendance:**
+"mark attendance", "view attendance", "add student"
+
+**Lost & Found:**  
+"post lost item with images", "browse found", "contact owner"
+
+**Complaints:**
+"submit complaint", "view complaints", "resolve issue", "delete complaint"
+
+**Communication:**
+"send message", "share file", "chat with everyone"
+
+**Notes:**
+"create note", "upload material", "download notes"
+
+**Teachers:**
+"show teachers", "contact faculty", "add teacher"
+
+**Students:**
+"add student", "edit profile", "view students"
+
+**General:**
+"help", "features", "what can you do"''',
+        
+        'admin': f'''👑 **Admin Privileges - {current_user.name}**
+
+**Full System Access:**
+✅ Student management (add/edit/delete)
+✅ Teacher directory management  
+✅ Attendance system control
+✅ Complaint resolution & deletion
+✅ Content moderation
+✅ User management
+
+**Special Capabilities:**
+• Delete any message/note/complaint
+• Resolve all complaints
+• Access all system data
+• Manage user accounts
+• System configuration
+
+**You have complete control over the CollegeCompanion platform!**''',
+
+        'profile': f'''👤 **Your Profile - {current_user.name}**
+
+**Role:** {current_user.role.title()}
+**Branch:** {current_user.branch or 'Not specified'}
+{"**Year:** " + str(current_user.year) if current_user.role == 'student' and current_user.year else ''}
+**Phone:** {current_user.phone}
+
+**Permissions:**
+{'✅ Full administrative access' if current_user.role == 'admin' else ''}
+{'✅ Attendance marking access' if current_user.role in ['admin', 'teacher'] else '✅ View attendance only'}
+{'✅ Teacher features enabled' if current_user.role == 'teacher' else ''}
+✅ Notes creation & sharing
+✅ Communication access
+✅ Lost & Found posting with image uploads
+✅ Complaint submission & deletion'''
+    }
+    
+    # Enhanced keyword matching with context
+    if any(word in message for word in ['present', 'absent', 'mark attendance', 'attendance today']):
+        return responses['attendance']
+    elif any(word in message for word in ['upload', 'file', 'image', 'photo', 'picture']):
+        return responses['upload']
+    elif any(word in message for word in ['lost', 'found', 'item', 'missing', 'recover']):
+        return responses['lost found']
+    elif any(word in message for word in ['complain', 'issue', 'problem', 'report', 'delete complaint']):
+        return responses['complaint']
+    elif any(word in message for word in ['message', 'chat', 'talk', 'communicate', 'announce']):
+        return responses['communication']
+    elif any(word in message for word in ['study', 'material', 'note', 'file', 'upload', 'attachment', 'share notes']):
+        return responses['notes']
+    elif any(word in message for word in ['faculty', 'professor', 'teacher', 'instructor', 'lecturer']):
+        return responses['teacher']
+    elif any(word in message for word in ['pupil', 'learner', 'student', 'roll number', 'add student']):
+        return responses['student']
+    elif any(word in message for word in ['feature', 'function', 'capability', 'what can']):
+        return responses['features']
+    elif any(word in message for word in ['command', 'quick', 'shortcut', 'how to']):
+        return responses['commands']
+    elif any(word in message for word in ['admin', 'privilege', 'control', 'manage']):
+        return responses['admin']
+    elif any(word in message for word in ['profile', 'my info', 'who am i', 'my account']):
+        return responses['profile']
+    elif any(word in message for word in ['thank', 'thanks', 'appreciate']):
+        return f"You're welcome, {current_user.name}! 😊 Is there anything else I can help you with?"
+    elif any(word in message for word in ['bye', 'goodbye', 'see you', 'exit']):
+        return f"Goodbye {current_user.name}! 👋 Have a great day at college!"
+    
+    # Check for partial matches in responses
+    for key in responses:
+        if key in message:
+            return responses[key]
+    
+    # Smart fallback response
+    return f"""I'm not sure I understand, {current_user.name}. 🤔
+
+Try asking about:
+• **Attendance** marking or viewing
+• **Lost & Found** items with image uploads
+• **Complaint** submission & deletion
+• **Communication** with others
+• **Notes** sharing
+• **Teacher** information
+
+Or type **'help'** for the complete guide!"""
+
+
+def run_corpus(fn):
+    for user in USERS:
+        for message in MESSAGES:
+            fn(message, user)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    mismatches = [
+        (user.role, message)
+        for user in USERS
+        for message in MESSAGES
+        if get_chatbot_response(message, user) != legacy_chatbot_response(message, user)
+    ]
+    if mismatches:
+        print(f'{len(mismatches)} responses differ from the original implementation: {mismatches}')
+        sys.exit(1)
+
+    calls = args.iterations * len(USERS) * len(MESSAGES)
+    legacy = timeit.timeit(lambda: run_corpus(legacy_chatbot_response), number=args.iterations)
+    engine = timeit.timeit(lambda: run_corpus(get_chatbot_response), number=args.iterations)
+    print(f'original: {legacy / calls * 1e6:.2f} us/message')
+    print(f'compiled: {engine / calls * 1e6:.2f} us/message')
+    print(f'speedup:  {legacy / engine:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+"""Per-route latency benchmark.
+
+Drives every route in app.py through the Flask test client against a seeded
+benchmark database (see seed_data.py) and reports p50/p95/p99 latency,
+throughput and SQL queries per request. Results are written as JSON so runs
+can be compared across commits. Write routes really write: delete scenarios
+consume the newest rows, so reseed before comparing long series of runs.
+
+    python benchmarks/route_bench.py [--seed-scale 0.1] [--iterations 30] [--compare old.json]
+"""
+import argparse
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import date, datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+import seed_data  # noqa: E402
+
+# Endpoints with no scenario, and why
+SKIPPED = {
+    'communication_stream': 'an SSE stream stays open for LIVE_STREAM_SECONDS; its catch-up is timed via the long poll',
+}
+
+
+def _scenarios(ctx):
+    """(name, method, path, form) builders; form may be a callable taking the iteration"""
+    today = date.today().isoformat()
+    month_start = date.today().replace(day=1).isoformat()
+    roster = {f'status_{student_id}': 'Present' for student_id in ctx['class_ids']}
+    stamp = ctx['stamp']
+
+    def pooled(table, endpoint):
+        # Newest rows at the time the scenario starts, which includes the ones the add scenario created
+        ids = []
+
+        def path(i):
+            if not ids:
+                ids.extend(ctx['newest_ids'](table))
+            return f'/{endpoint}/{ids[i % len(ids)]}'
+        return path
+
+    return [
+        ('index', 'GET', '/', None),
+        ('login page', 'GET', '/login', None),
+        ('login', 'POST', '/login', {'role': 'admin', 'phone': '0000000000', 'password': 'admin123'}),
+        ('register page', 'GET', '/register', None),
+        ('register', 'POST', '/register', lambda i: {
+            'name': 'Bench User', 'branch': 'CSE', 'year': '1', 'phone': f'7{stamp % 10**5:05d}{i:04d}',
+            'password': 'password', 'role': 'student'}),
+        ('dashboard', 'GET', '/dashboard', None),
+        ('attendance', 'GET', '/attendance', None),
+        ('mark attendance', 'POST', '/attendance', {'student_id': ctx['student_id'], 'status': 'Late', 'date': today}),
+        ('attendance by date', 'GET', f'/attendance/date/{today}', None),
+        ('roster', 'GET', f'/attendance/roster?branch={ctx["branch"]}&year={ctx["year"]}&date={today}', None),
+        ('mark roster', 'POST', '/attendance/roster', dict(roster, branch=ctx['branch'], year=ctx['year'], date=today)),
+        ('reports', 'GET', '/attendance/reports', None),
+        ('class reports', 'GET', f'/attendance/reports?branch={ctx["branch"]}&year={ctx["year"]}', None),
+        ('export attendance', 'GET', f'/export/attendance?start={month_start}&end={today}', None),
+        ('export students xlsx', 'GET', '/export/students?format=xlsx', None),
+        ('add student', 'POST', '/add_student', lambda i: {
+            'name': 'Bench Student', 'branch': 'CSE', 'year': '1', 'roll_number': f'B{stamp}{i:05d}'}),
+        ('import students', 'POST', '/import_students', lambda i: {'file': (io.BytesIO(''.join(
+            ['name,branch,year,roll_number\n'] +
+            [f'Imported {n},CSE,{n % 4 + 1},I{stamp}{i:03d}{n:03d}\n' for n in range(100)]).encode()), 'students.csv')}),
+        # Only the read-only preview: the POST would promote the whole seeded college each iteration
+        ('rollover preview', 'GET', '/students/rollover', None),
+        ('edit student page', 'GET', f'/edit_student/{ctx["student_id"]}', None),
+        ('edit student', 'POST', f'/edit_student/{ctx["student_id"]}', ctx['student_form']),
+        ('delete student', 'GET', pooled('student', 'delete_student'), None),
+        ('lost & found', 'GET', '/lost_found', None),
+        ('lost & found page 2', 'GET', f'/lost_found?before={ctx["cursor"]}', None),
+        ('post lost & found', 'POST', '/post_lost_found', lambda i: {
+            'title': 'Bench item', 'description': 'Blue bottle near the library', 'type': 'lost',
+            'contact_info': '9000000000', 'location': 'library', 'date_occurred': today,
+            'item_images': (io.BytesIO(ctx['jpeg']), 'bottle.jpg')}),
+        ('mark resolved', 'GET', f'/mark_resolved/{ctx["lost_found_id"]}', None),
+        ('delete lost & found', 'GET', pooled('lost_found', 'delete_lost_found'), None),
+        ('lost & found thumbnail', 'GET', f'/uploads/lost_found/{ctx["image_ref"]}?size=thumb', None),
+        ('lost & found image', 'GET', f'/uploads/lost_found/{ctx["image_ref"]}', None),
+        ('complaints', 'GET', '/complaints', None),
+        ('post complaint', 'POST', '/post_complaint', {'title': 'Bench complaint', 'message': 'Fan not working'}),
+        ('resolve complaint', 'GET', f'/mark_complaint_resolved/{ctx["complaint_id"]}', None),
+        ('delete complaint', 'GET', pooled('complaint', 'delete_complaint'), None),
+        ('communication', 'GET', '/communication', None),
+        # after=0 answers at once with the catch-up; without new messages the long poll would just wait
+        ('communication updates', 'GET', '/communication/updates?after=0', None),
+        ('post message', 'POST', '/post_message', {'content': 'Seminar moved to hall B'}),
+        ('delete message', 'GET', pooled('message', 'delete_message'), None),
+        ('notes', 'GET', '/notes', None),
+        ('post note', 'POST', '/post_note', lambda i: {
+            'title': 'Bench notes', 'content': 'Unit 3 summary', 'is_public': 'on',
+            'file': (io.BytesIO(ctx['attachment']), 'unit3.pdf')}),
+        ('delete note', 'GET', pooled('note', 'delete_note'), None),
+        ('download note', 'GET', f'/uploads/{ctx["note_ref"]}', None),
+        ('download note range', 'GET', f'/uploads/{ctx["note_ref"]}', None, {'Range': 'bytes=0-1023,4096-8191'}),
+        ('teachers', 'GET', '/teachers', None),
+        ('add teacher', 'POST', '/add_teacher', lambda i: {
+            'name': 'Bench Teacher', 'phone': f'6{stamp % 10**5:05d}{i:04d}', 'branch': 'CSE',
+            'email': 'bench@college.edu', 'designation': 'Professor'}),
+        ('edit teacher page', 'GET', f'/edit_teacher/{ctx["teacher_id"]}', None),
+        ('edit teacher', 'POST', f'/edit_teacher/{ctx["teacher_id"]}', ctx['teacher_form']),
+        ('delete teacher', 'GET', pooled('teacher', 'delete_teacher'), None),
+        ('chatbot page', 'GET', '/chatbot', None),
+        ('chatbot', 'POST', '/chatbot', {'message': 'how do I share notes?'}),
+        ('search', 'GET', '/search?q=library+exam', None),
+        ('metrics', 'GET', '/metrics', None),
+        ('logout', 'GET', '/logout', None),
+    ]
+
+
+def _context(app, db, needed):
+    from models import Complaint, LostFound, LostFoundImage, Note, Student, Teacher
+    from pagination import encode_cursor
+
+    def newest_ids(table):
+        with app.app_context():
+            return [row[0] for row in db.session.execute(
+                db.text(f'SELECT id FROM "{table}" ORDER BY id DESC LIMIT :needed'), {'needed': needed})]
+
+    with app.app_context():
+        student = Student.query.order_by(Student.id).first()
+        teacher = Teacher.query.order_by(Teacher.id).first()
+        class_ids = [row[0] for row in db.session.query(Student.id).filter_by(
+            branch=student.branch, year=student.year).order_by(Student.roll_number)]
+        with open(seed_data.__file__, 'rb') as f:
+            attachment = f.read()
+        return {
+            'stamp': int(time.time()),
+            'student_id': student.id,
+            'branch': student.branch,
+            'year': student.year,
+            'class_ids': class_ids,
+            'student_form': {'name': student.name, 'branch': student.branch, 'year': student.year,
+                             'roll_number': student.roll_number},
+            'teacher_id': teacher.id,
+            'teacher_form': {'name': teacher.name, 'phone': teacher.phone, 'branch': teacher.branch,
+                             'email': teacher.email, 'designation': teacher.designation},
+            'lost_found_id': LostFound.query.order_by(LostFound.id).first().id,
+            'complaint_id': Complaint.query.order_by(Complaint.id).first().id,
+            'image_ref': LostFoundImage.query.order_by(LostFoundImage.id).first().filename,
+            'note_ref': Note.query.filter(Note.file_path.isnot(None)).order_by(Note.id).first().file_path,
+            'cursor': encode_cursor(datetime.utcnow().replace(month=1, day=1), 2 ** 31),
+            'jpeg': seed_data.make_jpeg(random.Random(1)),
+            'attachment': attachment,
+            'newest_ids': newest_ids,
+        }
+
+
+def _percentile(sorted_values, fraction):
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def run(iterations=30, warmup=3, only=None, log=print):
+    from sqlalchemy import event
+
+    from app import app, db
+
+    # Failing requests are counted in the results instead of logged
+    app.logger.disabled = True
+    ctx = _context(app, db, iterations + warmup)
+    with app.app_context():
+        engine = db.engine
+        admin_id = db.session.execute(db.text("SELECT id FROM user WHERE role = 'admin' ORDER BY id")).scalar()
+
+    queries = [0]
+
+    def count(*args):
+        queries[0] += 1
+
+    client = app.test_client()
+    adapter = app.url_map.bind('localhost')
+    covered = set()
+    results = {}
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        for scenario in _scenarios(ctx):
+            name, method, path, form = scenario[:4]
+            headers = scenario[4] if len(scenario) > 4 else None
+            if only and only not in name:
+                continue
+            latencies, query_counts, errors = [], [], 0
+            for i in range(warmup + iterations):
+                with client.session_transaction() as session:
+                    session['_user_id'] = str(admin_id)
+                    session['_fresh'] = True
+                url = path(i) if callable(path) else path
+                data = form(i) if callable(form) else form
+                queries[0] = 0
+                started = time.perf_counter()
+                response = client.open(url, method=method, data=data, headers=headers)
+                response.get_data()
+                elapsed = time.perf_counter() - started
+                response.close()
+                if i < warmup:
+                    continue
+                latencies.append(elapsed)
+                query_counts.append(queries[0])
+                errors += response.status_code >= 400
+            covered.add(adapter.match(url.split('?')[0], method=method)[0])
+
+            latencies.sort()
+            results[name] = {
+                'method': method,
+                'path': path if isinstance(path, str) else url,
+                'p50_ms': round(_percentile(latencies, 0.50) * 1000, 3),
+                'p95_ms': round(_percentile(latencies, 0.95) * 1000, 3),
+                'p99_ms': round(_percentile(latencies, 0.99) * 1000, 3),
+                'throughput_rps': round(len(latencies) / sum(latencies), 1),
+                'queries': round(sum(query_counts) / len(query_counts), 2),
+                'errors': errors,
+            }
+            row = results[name]
+            log(f"{name:<24} p50 {row['p50_ms']:>8.2f}ms  p95 {row['p95_ms']:>8.2f}ms  "
+                f"p99 {row['p99_ms']:>8.2f}ms  {row['throughput_rps']:>8.1f} req/s  "
+                f"{row['queries']:>6.1f} queries" + (f"  {errors} errors" if errors else ''))
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+
+    missing = sorted({rule.endpoint for rule in app.url_map.iter_rules() if rule.endpoint != 'static'}
+                     - covered - set(SKIPPED))
+    if not only:
+        for endpoint, reason in SKIPPED.items():
+            log(f'Skipped {endpoint}: {reason}')
+        if missing:
+            log(f"Routes without a benchmark scenario: {', '.join(missing)}")
+    return results
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=BENCH_DIR, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(previous, current):
+    print(f"\n{'route':<24} {'p50 before':>11} {'p50 now':>10} {'change':>8}")
+    for name, row in current['routes'].items():
+        before = previous['routes'].get(name)
+        if before:
+            change = (row['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0
+            print(f"{name:<24} {before['p50_ms']:>9.2f}ms {row['p50_ms']:>8.2f}ms {change:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', default=os.path.join(BENCH_DIR, 'bench.db'))
+    parser.add_argument('--uploads', default=os.path.join(BENCH_DIR, 'bench_uploads'))
+    parser.add_argument('--seed-scale', type=float, help='reseed the benchmark database at this scale first')
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--only', help='run only scenarios whose name contains this text')
+    parser.add_argument('--output', help='where to write the JSON results')
+    parser.add_argument('--compare', help='earlier results file to compare p50 latency against')
+    args = parser.parse_args()
+
+    if args.seed_scale is None and not os.path.exists(args.database):
+        parser.error(f'{args.database} does not exist; pass --seed-scale or run seed_data.py first')
+    if args.seed_scale is not None:
+        seed_data.prepare(args.database, args.uploads)
+        seed_data.seed(args.seed_scale)
+    else:
+        seed_data.configure(args.database, args.uploads)
+
+    commit = _commit()
+    report = {
+        'commit': commit,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'database': os.path.abspath(args.database),
+        'iterations': args.iterations,
+        'routes': run(args.iterations, args.warmup, args.only),
+    }
+    output = args.output or os.path.join(BENCH_DIR, 'results',
+                                         f"{commit}-{datetime.now().strftime('%Y%m%d%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nResults written to {output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
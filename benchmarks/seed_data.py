@@ -0,0 +1,240 @@
+"""Synthetic campus data generator.
+
+Creates a fresh SQLite database (and upload folder) at benchmark scale with
+bulk inserts: students, users, teachers, a daily attendance history, messages,
+notes with deduplicated attachments, complaints and lost & found posts with
+images. Triggers are dropped while loading and reinstalled afterwards, then the
+dashboard counters and search index are rebuilt in one pass each.
+
+    python benchmarks/seed_data.py [--scale 0.1] [--database benchmarks/bench.db]
+
+--scale 1 gives 50k students, 5M attendance rows, 200k messages and 20k notes.
+"""
+import argparse
+import hashlib
+import io
+import os
+import random
+import shutil
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+BATCH_SIZE = 50000
+BRANCHES = ['CSE', 'ECE', 'ME', 'CE', 'EEE', 'IT']
+STATUSES = ['Present'] * 8 + ['Absent'] + ['Late']
+WORDS = ('exam lab assignment library canteen hostel bus timetable semester project seminar workshop '
+         'maths physics chemistry programming database network circuits thermodynamics notes syllabus '
+         'calculator laptop charger wallet keys bottle umbrella id card wifi fan projector marks result '
+         'holiday fest sports placement internship deadline submission viva quiz tutorial').split()
+
+# Full-scale row counts; every one is multiplied by --scale
+FULL_SCALE = {
+    'students': 50000,
+    'users': 5000,
+    'teachers': 500,
+    'messages': 200000,
+    'notes': 20000,
+    'complaints': 20000,
+    'lost_found': 10000,
+}
+ATTACHMENT_FILES = 200
+IMAGE_FILES = 20
+
+
+def configure(database, upload_folder):
+    """Point the app at the benchmark database and upload folder; call before importing app"""
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(database)}'
+    os.environ['UPLOAD_FOLDER'] = os.path.abspath(upload_folder)
+    os.environ['JOB_WORKERS'] = '0'
+
+
+def prepare(database, upload_folder):
+    """Delete any previous benchmark database and uploads, then configure the app for them"""
+    for path in (database, database + '-wal', database + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+    shutil.rmtree(upload_folder, ignore_errors=True)
+    os.makedirs(os.path.dirname(os.path.abspath(database)), exist_ok=True)
+    configure(database, upload_folder)
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def _timestamp(rng, days_back=365):
+    moment = datetime.utcnow() - timedelta(seconds=rng.randrange(days_back * 86400 + 1))
+    return moment.isoformat(' ', 'microseconds')
+
+
+def _insert(cursor, sql, rows):
+    """executemany in fixed-size batches from any iterable; returns the row count"""
+    total = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            cursor.executemany(sql, batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        cursor.executemany(sql, batch)
+        total += len(batch)
+    return total
+
+
+def _write_blobs(upload_folder, contents):
+    """Store raw file contents in the blob store; returns their sha256 digests"""
+    from storage import blob_path
+
+    digests = []
+    for data in contents:
+        digest = hashlib.sha256(data).hexdigest()
+        path = blob_path(upload_folder, digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        digests.append(digest)
+    return digests
+
+
+def make_jpeg(rng):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    colour = tuple(rng.randrange(256) for _ in range(3))
+    Image.new('RGB', (1600, 1200), colour).save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def seed(scale=0.1, attendance_days=100, seed_value=42, log=print):
+    """Load a fresh database; the app must already be configured and importable"""
+    from werkzeug.security import generate_password_hash
+
+    from app import app, db
+    from images import generate_derivatives
+    from migrations import migrate
+    from search import rebuild_search_index
+    from stats import counter_trigger_ddl, rebuild_counters
+
+    rng = random.Random(seed_value)
+    counts = {name: max(int(full * scale), 1) for name, full in FULL_SCALE.items()}
+    upload_folder = app.config['UPLOAD_FOLDER']
+    started = time.perf_counter()
+
+    with app.app_context():
+        migrate()
+        connection = db.engine.raw_connection()
+        cursor = connection.cursor()
+        cursor.execute('PRAGMA synchronous = OFF')
+        triggers = [row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")]
+        for name in triggers:
+            cursor.execute(f'DROP TRIGGER {name}')
+
+        def step(label, sql, rows):
+            t = time.perf_counter()
+            total = _insert(cursor, sql, rows)
+            connection.commit()
+            log(f'{label}: {total} rows in {time.perf_counter() - t:.1f}s')
+            return total
+
+        # One hash for everyone: the real one is deliberately slow to compute
+        password_hash = generate_password_hash('password')
+        admin_hash = generate_password_hash('admin123')
+        user_rows = [('Admin', None, None, '0000000000', admin_hash, 'admin', _timestamp(rng, 0))]
+        for i in range(1, counts['users']):
+            role = 'teacher' if i % 10 == 0 else 'student'
+            user_rows.append((f'User {i}', rng.choice(BRANCHES), None if role == 'teacher' else rng.randint(1, 4),
+                              f'9{i:09d}', password_hash, role, _timestamp(rng)))
+        step('users', 'INSERT INTO user (name, branch, year, phone, password_hash, role, created_at) '
+                      'VALUES (?, ?, ?, ?, ?, ?, ?)', user_rows)
+        user_ids = range(1, counts['users'] + 1)
+
+        step('teachers', 'INSERT INTO teacher (name, phone, branch, email, designation) VALUES (?, ?, ?, ?, ?)',
+             ((f'Teacher {i}', f'8{i:09d}', rng.choice(BRANCHES), f'teacher{i}@college.edu',
+               rng.choice(['Professor', 'Associate Professor', 'Assistant Professor'])) for i in range(counts['teachers'])))
+
+        step('students', 'INSERT INTO student (name, branch, year, roll_number) VALUES (?, ?, ?, ?)',
+             ((f'Student {i}', BRANCHES[i % len(BRANCHES)], i // len(BRANCHES) % 4 + 1, f'R{i:07d}')
+              for i in range(counts['students'])))
+
+        first_day = date.today() - timedelta(days=attendance_days - 1)
+        step('attendance', 'INSERT INTO attendance (student_id, date, status, marked_by) VALUES (?, ?, ?, ?)',
+             ((student_id, (first_day + timedelta(days=day)).isoformat(), rng.choice(STATUSES), 1)
+              for day in range(attendance_days) for student_id in range(1, counts['students'] + 1)))
+
+        step('messages', 'INSERT INTO message (content, posted_by, posted_at) VALUES (?, ?, ?)',
+             ((_text(rng, rng.randint(5, 40)), rng.choice(user_ids), _timestamp(rng))
+              for _ in range(counts['messages'])))
+
+        # A few hundred distinct files shared by all notes, as the blob store would hold them
+        attachments = _write_blobs(upload_folder, (rng.randbytes(rng.randint(4, 64) * 1024)
+                                                   for _ in range(ATTACHMENT_FILES)))
+        note_refs = [rng.choice(attachments) for _ in range(counts['notes'])]
+        step('notes', 'INSERT INTO note (title, content, posted_by, posted_at, file_path, file_type, is_public) '
+                      'VALUES (?, ?, ?, ?, ?, ?, ?)',
+             ((_text(rng, 4), _text(rng, rng.randint(20, 80)), rng.choice(user_ids), _timestamp(rng),
+               f'{digest}/notes_{index}.pdf', 'pdf', int(rng.random() < 0.8))
+              for index, digest in enumerate(note_refs)))
+
+        step('complaints', 'INSERT INTO complaint (title, message, posted_by, posted_at, is_resolved) '
+                           'VALUES (?, ?, ?, ?, ?)',
+             ((_text(rng, 4), _text(rng, rng.randint(10, 60)), rng.choice(user_ids), _timestamp(rng),
+               int(rng.random() < 0.6)) for _ in range(counts['complaints'])))
+
+        step('lost & found', 'INSERT INTO lost_found (title, description, item_type, posted_by, posted_at, '
+                             'contact_info, is_resolved, location, date_occurred) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+             ((_text(rng, 3), _text(rng, rng.randint(10, 40)), rng.choice(['lost', 'found']), rng.choice(user_ids),
+               _timestamp(rng), '9000000000', int(rng.random() < 0.3), rng.choice(WORDS), _timestamp(rng))
+              for _ in range(counts['lost_found'])))
+
+        images = _write_blobs(upload_folder, (make_jpeg(rng) for _ in range(IMAGE_FILES)))
+        image_refs = [(post_id, rng.choice(images)) for post_id in range(1, counts['lost_found'] + 1)
+                      for _ in range(rng.randint(0, 3))]
+        step('lost & found images', 'INSERT INTO lost_found_image (filename, lost_found_id, uploaded_at) '
+                                    'VALUES (?, ?, ?)',
+             ((f'{digest}/photo.jpg', post_id, _timestamp(rng)) for post_id, digest in image_refs))
+        for digest in images:
+            generate_derivatives(os.path.join(upload_folder, 'blobs', digest[:2], digest),
+                                 os.path.join(upload_folder, 'derived'), digest)
+
+        references = {}
+        for digest in note_refs + [digest for _, digest in image_refs]:
+            references[digest] = references.get(digest, 0) + 1
+        sizes = {digest: os.path.getsize(os.path.join(upload_folder, 'blobs', digest[:2], digest))
+                 for digest in attachments + images}
+        step('upload blobs', 'INSERT INTO upload_blob (sha256, size, ref_count) VALUES (?, ?, ?)',
+             ((digest, sizes[digest], count) for digest, count in references.items()))
+        connection.close()
+
+        t = time.perf_counter()
+        for table in db.metadata.sorted_tables:
+            for statement in counter_trigger_ddl(table):
+                db.session.execute(db.text(statement))
+        rebuild_counters()
+        rebuild_search_index()
+        log(f'counters and search index: {time.perf_counter() - t:.1f}s')
+
+    log(f'seeded in {time.perf_counter() - started:.1f}s')
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=float, default=0.1, help='fraction of the full-size campus')
+    parser.add_argument('--attendance-days', type=int, default=100)
+    parser.add_argument('--database', default=os.path.join(BENCH_DIR, 'bench.db'))
+    parser.add_argument('--uploads', default=os.path.join(BENCH_DIR, 'bench_uploads'))
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    prepare(args.database, args.uploads)
+    seed(args.scale, args.attendance_days, args.seed)
+
+
+if __name__ == '__main__':
+    main()
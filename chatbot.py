@@ -0,0 +1,442 @@
+import re
+
+# Chatbot engine. The keyword table is compiled once at import into a single
+# trie-shaped regex, static answers are module constants, and only the
+# greeting, admin and profile answers are rendered per user.
+
+STATIC_RESPONSES = {
+    'help': '''🤖 **CollegeCompanion AI Assistant - Help Guide**
+
+📊 **ATTENDANCE SYSTEM**
+• Mark daily attendance (Teachers/Admin)
+• View attendance records by date
+• Add/edit students (Admin only)
+• Generate attendance reports
+
+🔍 **LOST & FOUND**
+• Post lost or found items with images
+• Upload up to 3 photos per post
+• Browse active posts with image galleries
+• Contact item owners
+• Mark items as resolved
+
+📝 **COMPLAINT BOX**
+• Submit anonymous complaints
+• Delete your own complaints
+• View all complaints (Admin sees posters)
+• Resolve complaints (Admin only)
+
+💬 **COMMUNICATION HUB**
+• Send messages to community
+• Share files (images, documents, videos)
+• Delete your messages
+
+📚 **NOTES SHARING**
+• Create public/private notes
+• Upload study materials (up to 50MB)
+• Download shared resources
+• Organize by subjects/topics
+
+👨‍🏫 **TEACHER DIRECTORY**
+• View faculty contacts
+• See department information
+• Contact teachers directly
+
+🎓 **STUDENT MANAGEMENT**
+• Student database (Admin)
+• Roll number tracking
+• Branch-wise organization
+
+**Quick Commands:** Try: "how to mark attendance", "post lost item with images", "share notes", "contact teachers"''',
+
+    'attendance': '''📊 **Attendance Management Guide:**
+
+**For Teachers/Admin:**
+✅ Mark attendance for specific dates
+✅ View attendance by student or date  
+✅ Generate monthly reports
+✅ Add new students to system
+
+**For Students:**
+✅ View your attendance record
+✅ Check attendance statistics
+
+**Commands to try:**
+• "Mark attendance for today"
+• "View attendance for December"
+• "Add new student"
+• "Check my attendance"''',
+
+    'lost found': '''🔍 **Lost & Found System:**
+
+**Posting Items:**
+✅ Report lost items with detailed descriptions
+✅ Post found items with contact information  
+✅ Upload up to 3 images per post (JPG, PNG, GIF)
+✅ Add location and date information
+✅ Maximum file size: 5MB per image
+
+**Finding Items:**
+✅ Browse all active posts with image galleries
+✅ Search by item type or location
+✅ Contact posters directly
+✅ Mark items as resolved when found
+
+**Image Upload Features:**
+📸 Take clear photos from multiple angles
+🏷️ Show distinctive features or damage
+📍 Include location context in images
+📱 Mobile-friendly upload interface
+
+**Commands to try:**
+• "I lost my calculator in the library"
+• "Show found electronics items" 
+• "How to upload images for lost items"
+• "Post found keys with photos"''',
+
+    'upload': '''📁 **File Upload Guide:**
+
+**Lost & Found Images:**
+✅ Supported: JPG, PNG, GIF
+✅ Maximum: 3 images per post
+✅ Size limit: 5MB per image
+✅ Automatic image optimization
+
+**Notes & Study Materials:**
+✅ Supported: PDF, DOC, PPT, TXT, images, videos
+✅ Maximum: 50MB per file
+✅ Public/private sharing options
+✅ Organized by subjects
+
+**Communication Files:**
+✅ All file types supported
+✅ 50MB size limit
+✅ Instant sharing with community
+✅ File type icons and previews
+
+**Best Practices:**
+• Use descriptive filenames
+• Compress large files when possible
+• Check file formats before uploading
+• Add clear descriptions with files''',
+
+    'complaint': '''📝 **Complaint System:**
+
+**Submitting Complaints:**
+✅ Anonymous submission (name hidden from others)
+✅ Categorized complaints
+✅ Priority tagging
+✅ Track resolution status
+
+**Managing Complaints:**
+✅ Delete your own complaints
+✅ View complaint status
+✅ Admin resolution tracking
+
+**For Admin:**
+✅ View all complaints with poster info
+✅ See who submitted each complaint
+✅ Mark as resolved/reopened
+✅ Delete any complaint
+
+**Commands to try:**
+• "Submit complaint about WiFi"
+• "View pending complaints"
+• "Resolve complaint #5"
+• "Delete my complaint"''',
+
+    'communication': '''💬 **Communication Center:**
+
+**Features:**
+✅ Group messaging for all users
+✅ File sharing (images, PDFs, videos)
+✅ Real-time updates
+✅ Message deletion (own messages)
+
+**File Support:**
+📷 Images: JPG, PNG, GIF
+📄 Documents: PDF, DOC, TXT
+🎬 Videos: MP4, AVI, MOV
+📊 Presentations: PPT, PPTX
+
+**Commands to try:**
+• "Send message to everyone"
+• "Share meeting notes"
+• "Upload class material"''',
+
+    'notes': '''📚 **Notes Sharing Platform:**
+
+**Creating Notes:**
+✅ Public notes (visible to all)
+✅ Private notes (only you)
+✅ File attachments (up to 50MB)
+✅ Rich text content
+
+**Supported Files:**
+📖 Study materials & textbooks
+🎥 Lecture recordings
+📝 Assignment solutions  
+📊 Project presentations
+
+**Commands to try:**
+• "Create private note"
+• "Share lecture slides"
+• "Download math notes"
+• "View public notes"''',
+
+    'teacher': '''👨‍🏫 **Teacher Directory:**
+
+**Information Available:**
+✅ Full contact details
+✅ Department/Branch
+✅ Email addresses
+✅ Designation/Role
+
+**Features:**
+✅ Quick contact access
+✅ Department filtering
+✅ Search functionality
+✅ Admin management
+
+**Commands to try:**
+• "Show CS department teachers"
+• "Contact Dr. Smith"
+• "Add new teacher"''',
+
+    'student': '''👨‍🎓 **Student Management:**
+
+**Admin Features:**
+✅ Add new students
+✅ Edit student information
+✅ Manage roll numbers
+✅ Track by branch/year
+
+**Student Profiles:**
+✅ Name, branch, year
+✅ Unique roll numbers
+✅ Attendance tracking
+✅ Academic organization
+
+**Commands to try:**
+• "Add student to CS branch"
+• "Edit student information"
+• "View all students"''',
+
+    'features': '''🚀 **CollegeCompanion Features:**
+
+**Core Modules:**
+1. **Attendance Tracking** - Digital attendance system
+2. **Lost & Found** - Campus item recovery with image uploads
+3. **Complaint Box** - Anonymous feedback system
+4. **Communication** - Campus-wide messaging
+5. **Notes Sharing** - Study material repository
+6. **Teacher Directory** - Faculty contact management
+7. **Student Management** - Student database
+
+**Advanced Features:**
+• File uploads (50MB limit)
+• Image galleries for Lost & Found
+• Role-based access control
+• Real-time notifications
+• Mobile-responsive design
+• Secure authentication''',
+
+    'commands': '''🎯 **Quick Commands List:**
+
+**Attendance:**
+"mark attendance", "view attendance", "add student"
+
+**Lost & Found:**  
+"post lost item with images", "browse found", "contact owner"
+
+**Complaints:**
+"submit complaint", "view complaints", "resolve issue", "delete complaint"
+
+**Communication:**
+"send message", "share file", "chat with everyone"
+
+**Notes:**
+"create note", "upload material", "download notes"
+
+**Teachers:**
+"show teachers", "contact faculty", "add teacher"
+
+**Students:**
+"add student", "edit profile", "view students"
+
+**General:**
+"help", "features", "what can you do"'''
+}
+
+
+def _hello(user):
+    return f'Hello {user.name}! 👋 How can I assist you today in CollegeCompanion?'
+
+
+def _hi(user):
+    return f'Hi {user.name}! 😊 What can I help you with?'
+
+
+def _admin(user):
+    return f'''👑 **Admin Privileges - {user.name}**
+
+**Full System Access:**
+✅ Student management (add/edit/delete)
+✅ Teacher directory management  
+✅ Attendance system control
+✅ Complaint resolution & deletion
+✅ Content moderation
+✅ User management
+
+**Special Capabilities:**
+• Delete any message/note/complaint
+• Resolve all complaints
+• Access all system data
+• Manage user accounts
+• System configuration
+
+**You have complete control over the CollegeCompanion platform!**'''
+
+
+def _profile(user):
+    return f'''👤 **Your Profile - {user.name}**
+
+**Role:** {user.role.title()}
+**Branch:** {user.branch or 'Not specified'}
+{"**Year:** " + str(user.year) if user.role == 'student' and user.year else ''}
+**Phone:** {user.phone}
+
+**Permissions:**
+{'✅ Full administrative access' if user.role == 'admin' else ''}
+{'✅ Attendance marking access' if user.role in ['admin', 'teacher'] else '✅ View attendance only'}
+{'✅ Teacher features enabled' if user.role == 'teacher' else ''}
+✅ Notes creation & sharing
+✅ Communication access
+✅ Lost & Found posting with image uploads
+✅ Complaint submission & deletion'''
+
+
+def _thanks(user):
+    return f"You're welcome, {user.name}! 😊 Is there anything else I can help you with?"
+
+
+def _bye(user):
+    return f"Goodbye {user.name}! 👋 Have a great day at college!"
+
+
+def _fallback(user):
+    return f"""I'm not sure I understand, {user.name}. 🤔
+
+Try asking about:
+• **Attendance** marking or viewing
+• **Lost & Found** items with image uploads
+• **Complaint** submission & deletion
+• **Communication** with others
+• **Notes** sharing
+• **Teacher** information
+
+Or type **'help'** for the complete guide!"""
+
+
+USER_RESPONSES = {
+    'hello': _hello,
+    'hi': _hi,
+    'admin': _admin,
+    'profile': _profile,
+    'thanks': _thanks,
+    'bye': _bye,
+}
+
+# Keyword groups in priority order: the first group with any keyword
+# anywhere in the message wins.
+INTENT_KEYWORDS = [
+    ('attendance', ['present', 'absent', 'mark attendance', 'attendance today']),
+    ('upload', ['upload', 'file', 'image', 'photo', 'picture']),
+    ('lost found', ['lost', 'found', 'item', 'missing', 'recover']),
+    ('complaint', ['complain', 'issue', 'problem', 'report', 'delete complaint']),
+    ('communication', ['message', 'chat', 'talk', 'communicate', 'announce']),
+    ('notes', ['study', 'material', 'note', 'file', 'upload', 'attachment', 'share notes']),
+    ('teacher', ['faculty', 'professor', 'teacher', 'instructor', 'lecturer']),
+    ('student', ['pupil', 'learner', 'student', 'roll number', 'add student']),
+    ('features', ['feature', 'function', 'capability', 'what can']),
+    ('commands', ['command', 'quick', 'shortcut', 'how to']),
+    ('admin', ['admin', 'privilege', 'control', 'manage']),
+    ('profile', ['profile', 'my info', 'who am i', 'my account']),
+    ('thanks', ['thank', 'thanks', 'appreciate']),
+    ('bye', ['bye', 'goodbye', 'see you', 'exit']),
+]
+
+# Last resort: the response names themselves, in their original order
+FALLBACK_KEYS = [
+    'hello', 'hi', 'help', 'attendance', 'lost found', 'upload', 'complaint', 'communication',
+    'notes', 'teacher', 'student', 'features', 'commands', 'admin', 'profile',
+]
+
+
+def _trie_pattern(keywords):
+    """Regex source for a character trie of `keywords`.
+
+    At any position the text picks at most one branch per character, and
+    optional tails are greedy, so the match is the longest keyword starting there.
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def emit(node):
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return '(?:' + body + ')?' if '' in node else body
+
+    return emit(trie)
+
+
+def _compile(groups):
+    """Build one matcher for every keyword plus the priority each match implies.
+
+    The pattern is a zero-width lookahead so matches may overlap ('file' inside
+    'profile' still counts). The longest keyword found at a position implies that
+    all of its prefixes that are keywords matched there too, so each keyword is
+    mapped to the best priority among its keyword prefixes. The lowest priority
+    seen over the whole message is then the same answer the original chain of
+    `any(word in message ...)` checks gave.
+    """
+    priorities = {}
+    for priority, (_, keywords) in enumerate(groups):
+        for keyword in keywords:
+            priorities.setdefault(keyword, priority)
+    best = {
+        keyword: min(priority for prefix, priority in priorities.items() if keyword.startswith(prefix))
+        for keyword in priorities
+    }
+    return re.compile('(?=(' + _trie_pattern(priorities) + '))'), best
+
+
+_GROUPS = INTENT_KEYWORDS + [(key, [key]) for key in FALLBACK_KEYS]
+_MATCHER, _PRIORITIES = _compile(_GROUPS)
+
+
+def match_intent(message):
+    """Return the response key for an already-lowercased message, or None"""
+    best = None
+    for match in _MATCHER.finditer(message):
+        priority = _PRIORITIES[match.group(1)]
+        if best is None or priority < best:
+            best = priority
+            if best == 0:
+                break
+    return _GROUPS[best][0] if best is not None else None
+
+
+def get_chatbot_response(message, user):
+    intent = match_intent(message.lower().strip())
+    if intent is None:
+        return _fallback(user)
+    if intent in USER_RESPONSES:
+        return USER_RESPONSES[intent](user)
+    return STATIC_RESPONSES[intent]
@@ -0,0 +1,251 @@
+import csv
+import hashlib
+import io
+import itertools
+import re
+import zipfile
+from collections import namedtuple
+from xml.sax.saxutils import escape
+
+from sqlalchemy import select
+
+import archive
+import attendance_store
+import page_cache
+from models import db, User, Student, Attendance, Complaint, Teacher, StatCounter
+
+# Spreadsheet exports. Rows come from a server-side cursor (yield_per) and are
+# encoded into chunks as they arrive, so the first bytes go out straight away
+# and memory stays flat however many rows there are. XLSX is written by hand as
+# a streamed zip with inline strings; openpyxl would have to finish the whole
+# file before any of it could be sent.
+#
+# Each export carries an ETag built from the stat_counter versions of the
+# tables it reads (attendance per date, see stats.py), so repeating an export
+# of unchanged data is answered with 304 Not Modified without running the query.
+# Archiving deletes from those tables too, so it also changes the ETag.
+#
+# Attendance and complaint exports include the yearly archives (archive.py);
+# archived rows are older, so they are streamed first.
+
+YIELD_PER = 2000
+CHUNK_BYTES = 64 * 1024
+SHEET_ROWS = 1048575  # Excel's row limit minus the header row; longer exports continue on a new sheet
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Who may download each export
+ROLES = {
+    'attendance': ('admin', 'teacher'),
+    'students': ('admin', 'teacher'),
+    'teachers': ('admin',),
+    'complaints': ('admin',),
+}
+
+Export = namedtuple('Export', 'filename columns rows version')  # rows() returns an iterable of row tuples
+
+
+def _bitmap_attendance_rows(start, end, branch, year):
+    marker_names = {}
+    for day, student, status, marked_by in attendance_store.iter_marks(start, end, branch, year):
+        if marked_by not in marker_names:
+            marker_names[marked_by] = db.session.query(User.name).filter_by(id=marked_by).scalar()
+        yield day, student.roll_number, student.name, student.branch, student.year, status, marker_names[marked_by]
+
+
+def attendance(start, end, branch=None, year=None):
+    statement = select(Attendance.date, Student.roll_number, Student.name, Student.branch, Student.year,
+                       Attendance.status, User.name) \
+        .join(Student, Attendance.student_id == Student.id) \
+        .outerjoin(User, Attendance.marked_by == User.id) \
+        .where(Attendance.date.between(start, end))
+    if branch:
+        statement = statement.where(Student.branch == branch)
+    if year:
+        statement = statement.where(Student.year == year)
+    # Date order follows ix_attendance_date_student_status, so a whole-college export streams without a sort
+    statement = statement.order_by(Attendance.date, Attendance.student_id)
+    changed = db.session.query(db.func.coalesce(db.func.sum(StatCounter.value), 0)).filter(
+        StatCounter.name.between(f'cache:version:attendance:{start}', f'cache:version:attendance:{end}')
+    ).scalar()
+    if attendance_store.storage() == 'bitmap':
+        hot = lambda: _bitmap_attendance_rows(start, end, branch, year)
+    else:
+        hot = lambda: _rows(statement)
+    rows = lambda: itertools.chain(archive.attendance_rows(start, end, branch, year), hot())
+    return Export(f"attendance_{start}_{end}{'_' + branch if branch else ''}{'_year' + str(year) if year else ''}",
+                  ('Date', 'Roll Number', 'Name', 'Branch', 'Year', 'Status', 'Marked By'), rows,
+                  f'{page_cache.versions([Student, User])}.{changed}')
+
+
+def students(branch=None, year=None):
+    statement = select(Student.roll_number, Student.name, Student.branch, Student.year)
+    if branch:
+        statement = statement.where(Student.branch == branch)
+    if year:
+        statement = statement.where(Student.year == year)
+    statement = statement.order_by(Student.branch, Student.year, Student.roll_number)
+    return Export('students', ('Roll Number', 'Name', 'Branch', 'Year'), lambda: _rows(statement),
+                  page_cache.versions([Student]))
+
+
+def teachers():
+    statement = select(Teacher.name, Teacher.phone, Teacher.branch, Teacher.email, Teacher.designation) \
+        .order_by(Teacher.name)
+    return Export('teachers', ('Name', 'Phone', 'Branch', 'Email', 'Designation'), lambda: _rows(statement),
+                  page_cache.versions([Teacher]))
+
+
+def complaints():
+    statement = select(Complaint.id, Complaint.posted_at, Complaint.title, Complaint.message, User.name,
+                       User.phone, Complaint.is_resolved) \
+        .outerjoin(User, Complaint.posted_by == User.id) \
+        .order_by(Complaint.posted_at, Complaint.id)
+    return Export('complaints', ('ID', 'Posted At', 'Title', 'Message', 'Posted By', 'Phone', 'Resolved'),
+                  lambda: itertools.chain(archive.complaint_rows(), _rows(statement)),
+                  page_cache.versions([Complaint, User]))
+
+
+def etag(kind, export, fmt):
+    # The filename already spells out every filter the rows depend on
+    return hashlib.sha1(f'{kind}|{fmt}|{export.filename}|{export.version}'.encode()).hexdigest()
+
+
+def _rows(statement):
+    return db.session.execute(statement, execution_options={'yield_per': YIELD_PER})
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'Yes' if value else 'No'
+    return value.isoformat(sep=' ', timespec='seconds') if hasattr(value, 'hour') else str(value)
+
+
+def _csv_cell(value):
+    value = _text(value)
+    # Keep user-written text from being run as a spreadsheet formula; phone numbers stay as they are
+    if value[:1] in ('=', '+', '-', '@') and not value[1:].replace(' ', '').isdigit():
+        return "'" + value
+    return value
+
+
+def write_csv(export):
+    """CSV chunks for an export, with a BOM so spreadsheet programs read it as UTF-8"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(export.columns)
+    for row in export.rows():
+        writer.writerow([_csv_cell(value) for value in row])
+        if buffer.tell() >= CHUNK_BYTES:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+class _Chunks:
+    """Write-only file that zipfile streams into; drain() hands over what it has written"""
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts, self.size = [], 0
+        return data
+
+
+_XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+_XML_HEAD = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_PACKAGE_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+_SHEET_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml'
+
+
+def _xlsx_row(values):
+    cells = []
+    for value in values:
+        if isinstance(value, int) and not isinstance(value, bool):
+            cells.append(f'<c><v>{value}</v></c>')
+        else:
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">'
+                         f'{escape(_XML_INVALID.sub("", _text(value)))}</t></is></c>')
+    return f'<row>{"".join(cells)}</row>'
+
+
+def _xlsx_package(sheet_count):
+    """The workbook parts that list the sheets, written once they are all done"""
+    sheets = range(1, sheet_count + 1)
+    return {
+        '[Content_Types].xml': _XML_HEAD + (
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            + ''.join(f'<Override PartName="/xl/worksheets/sheet{n}.xml" ContentType="{_SHEET_TYPE}"/>'
+                      for n in sheets) +
+            '</Types>'),
+        '_rels/.rels': _XML_HEAD + (
+            f'<Relationships xmlns="{_PACKAGE_REL_NS}">'
+            f'<Relationship Id="rId1" Type="{_REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'),
+        'xl/workbook.xml': _XML_HEAD + (
+            f'<workbook xmlns="{_MAIN_NS}" xmlns:r="{_REL_NS}"><sheets>'
+            + ''.join(f'<sheet name="Sheet{n}" sheetId="{n}" r:id="rId{n}"/>' for n in sheets) +
+            '</sheets></workbook>'),
+        'xl/_rels/workbook.xml.rels': _XML_HEAD + (
+            f'<Relationships xmlns="{_PACKAGE_REL_NS}">'
+            + ''.join(f'<Relationship Id="rId{n}" Type="{_REL_NS}/worksheet" Target="worksheets/sheet{n}.xml"/>'
+                      for n in sheets) +
+            '</Relationships>'),
+    }
+
+
+def write_xlsx(export):
+    """XLSX chunks for an export; a new sheet is started every SHEET_ROWS rows"""
+    out = _Chunks()
+    header = _xlsx_row(export.columns).encode()
+    rows = iter(export.rows())
+    sheet_count = 0
+    # A zip without seeking: entries end with data descriptors, ZIP64 since their size is unknown up front
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as workbook:
+        done = False
+        while not done:
+            sheet_count += 1
+            with workbook.open(f'xl/worksheets/sheet{sheet_count}.xml', 'w', force_zip64=True) as sheet:
+                sheet.write(f'{_XML_HEAD}<worksheet xmlns="{_MAIN_NS}"><sheetData>'.encode())
+                sheet.write(header)
+                written = 0
+                for row in rows:
+                    sheet.write(_xlsx_row(row).encode())
+                    written += 1
+                    if out.size >= CHUNK_BYTES:
+                        yield out.drain()
+                    if written == SHEET_ROWS:
+                        break
+                else:
+                    done = True
+                sheet.write(b'</sheetData></worksheet>')
+        for name, content in _xlsx_package(sheet_count).items():
+            workbook.writestr(name, content)
+    yield out.drain()
+
+
+WRITERS = {'csv': write_csv, 'xlsx': write_xlsx}
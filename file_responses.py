@@ -0,0 +1,142 @@
+import secrets
+
+from flask import request, send_file
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from werkzeug.http import is_resource_modified
+from werkzeug.wrappers import Response
+
+# Responses for stored uploads. Werkzeug already answers conditional GETs and
+# single byte ranges; it rejects multi-range requests with a 416, so those are
+# built here as multipart/byteranges responses.
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+MAX_RANGES = 16
+CHUNK_SIZE = 64 * 1024
+
+_COPIED_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control', 'Expires', 'Content-Disposition')
+
+
+def send_stored_file(path, etag=True, download_name=None, immutable=False):
+    """send_file with a private cache policy and Range support (single and multi-range).
+
+    Pass the content hash as `etag` for a strong validator; `immutable` files
+    are cached for a year without revalidation.
+    """
+    response = send_file(path, download_name=download_name, etag=etag, conditional=False,
+                         max_age=IMMUTABLE_MAX_AGE if immutable else None)
+    # Uploads sit behind a login, so shared caches must not keep them
+    response.cache_control.public = False
+    response.cache_control.private = True
+    if immutable:
+        response.cache_control.immutable = True
+    response.accept_ranges = 'bytes'
+
+    size = response.content_length
+    header = request.headers.get('Range')
+    environ = dict(request.environ)
+    if header and not is_resource_modified(environ, response.headers.get('ETag'), None,
+                                           response.headers.get('Last-Modified')):
+        # If-None-Match and If-Modified-Since are answered before Range: a client
+        # that already has the file gets a 304 whichever parts it asked for
+        environ.pop('HTTP_RANGE', None)
+        return response.make_conditional(environ, accept_ranges=True, complete_length=size)
+    if not header or ',' not in header or not size or request.method not in ('GET', 'HEAD'):
+        return response.make_conditional(environ, accept_ranges=True, complete_length=size)
+
+    spans = _parse_ranges(header, size)
+    if spans is None or _if_range_failed(response):
+        # Unusable or stale Range header: answer as if it were absent
+        environ.pop('HTTP_RANGE', None)
+        return response.make_conditional(environ, accept_ranges=True, complete_length=size)
+    if not spans:
+        response.close()
+        raise RequestedRangeNotSatisfiable(length=size)
+
+    response.close()
+    return _range_response(response, path, spans, size)
+
+
+def _parse_ranges(header, size):
+    """Satisfiable (start, stop) spans, sorted and merged; None if the header is invalid or too long"""
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes':
+        return None
+    parts = spec.split(',')
+    if len(parts) > MAX_RANGES:
+        return None
+
+    spans = []
+    for part in parts:
+        first, sep, last = part.strip().partition('-')
+        if not sep or (first and not first.isdigit()) or (last and not last.isdigit()) or not (first or last):
+            return None
+        if not first:
+            start, stop = max(size - int(last), 0), size
+        else:
+            start = int(first)
+            if last and int(last) < start:
+                return None
+            stop = min(int(last) + 1, size) if last else size
+        if start < stop:
+            spans.append((start, stop))
+
+    merged = []
+    for start, stop in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    return merged
+
+
+def _if_range_failed(response):
+    if 'If-Range' not in request.headers:
+        return False
+    return is_resource_modified(request.environ, response.headers.get('ETag'), None,
+                                response.headers.get('Last-Modified'), ignore_if_range=False)
+
+
+def _range_response(source, path, spans, size):
+    if len(spans) == 1:
+        start, stop = spans[0]
+        response = Response(_read_spans(path, [b''], spans), 206, content_type=source.content_type,
+                            direct_passthrough=True)
+        response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+        response.content_length = stop - start
+    else:
+        boundary = secrets.token_hex(16)
+        heads = [
+            (b'\r\n' if index else b'') +
+            (f'--{boundary}\r\nContent-Type: {source.content_type}\r\n'
+             f'Content-Range: bytes {start}-{stop - 1}/{size}\r\n\r\n').encode()
+            for index, (start, stop) in enumerate(spans)
+        ]
+        tail = f'\r\n--{boundary}--\r\n'.encode()
+        response = Response(_read_spans(path, heads, spans, tail), 206,
+                            content_type=f'multipart/byteranges; boundary={boundary}',
+                            direct_passthrough=True)
+        response.content_length = (sum(len(head) for head in heads) + len(tail) +
+                                   sum(stop - start for start, stop in spans))
+
+    for name in _COPIED_HEADERS:
+        if name in source.headers:
+            response.headers[name] = source.headers[name]
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def _read_spans(path, heads, spans, tail=b''):
+    with open(path, 'rb') as f:
+        for head, (start, stop) in zip(heads, spans):
+            if head:
+                yield head
+            f.seek(start)
+            remaining = stop - start
+            while remaining:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+    if tail:
+        yield tail
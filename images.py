@@ -0,0 +1,78 @@
+import os
+
+from PIL import Image, ImageOps
+
+# Resized variants generated for every lost & found upload. Each size is
+# written as WebP and as JPEG for clients that cannot decode WebP.
+IMAGE_SIZES = {
+    'thumb': (480, 480),
+    'medium': (1280, 1280),
+}
+IMAGE_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+def derivative_name(key, size, ext):
+    return f"{key}.{size}.{ext}"
+
+
+def derivative_paths(derived_dir, key):
+    return [
+        os.path.join(derived_dir, derivative_name(key, size, ext))
+        for size in IMAGE_SIZES
+        for ext in IMAGE_FORMATS
+    ]
+
+
+def generate_derivatives(source_path, derived_dir, key):
+    """Write every size/format variant of one image, named after `key`.
+
+    EXIF orientation is applied to the pixels and no metadata is carried into
+    the variants, so GPS tags and camera details never leave the server.
+    """
+    os.makedirs(derived_dir, exist_ok=True)
+
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if image.mode == 'LA' or 'transparency' in image.info else 'RGB')
+
+        for size, bounds in IMAGE_SIZES.items():
+            resized = image.copy()
+            resized.thumbnail(bounds, Image.LANCZOS)
+            for ext, (pil_format, options) in IMAGE_FORMATS.items():
+                variant = resized
+                if pil_format == 'JPEG' and variant.mode != 'RGB':
+                    variant = _flatten(variant)
+                target = os.path.join(derived_dir, derivative_name(key, size, ext))
+                # Write then rename so a half-written file is never served
+                variant.save(target + '.tmp', pil_format, **options)
+                os.replace(target + '.tmp', target)
+
+
+def _flatten(image):
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+    return background
+
+
+def has_derivatives(derived_dir, key):
+    return all(os.path.exists(path) for path in derivative_paths(derived_dir, key))
+
+
+def remove_derivatives(derived_dir, key):
+    for path in derivative_paths(derived_dir, key):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def pick_variant(derived_dir, key, size, accept_webp):
+    """Filename (relative to derived_dir) of the best existing variant, or None"""
+    if size not in IMAGE_SIZES:
+        return None
+    for ext in (['webp'] if accept_webp else []) + ['jpg']:
+        name = derivative_name(key, size, ext)
+        if os.path.exists(os.path.join(derived_dir, name)):
+            return name
+    return None
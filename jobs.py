@@ -0,0 +1,179 @@
+import json
+import threading
+import traceback
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func, select, update
+from sqlalchemy.orm import Session
+
+from models import db, Job
+
+# Persistent background jobs. enqueue() adds a row to the caller's transaction,
+# so a job exists only if the change that needed it was committed, and queued
+# work survives restarts. Worker threads inside the app process claim jobs one
+# at a time, retry failures with exponential backoff and move a job to 'dead'
+# once it runs out of attempts.
+#
+# A handler runs in an app context and must not commit: its database changes
+# are committed together with the job's completion, so a retry never repeats
+# work that already landed. Work that must happen after that commit (removing
+# files, say) belongs in a follow-up job enqueued by the handler.
+
+HANDLERS = {}
+
+POLL_INTERVAL = 1.0
+LEASE = timedelta(minutes=10)          # a 'running' job older than this is assumed lost
+KEEP_FINISHED = timedelta(days=1)
+PURGE_INTERVAL = timedelta(minutes=10)
+
+_wakeup = threading.Event()
+_start_lock = threading.Lock()
+_workers = []
+
+
+def job_handler(kind, max_attempts=5):
+    def register(func):
+        HANDLERS[kind] = (func, max_attempts)
+        return func
+    return register
+
+
+def enqueue(kind, delay=0, **payload):
+    """Add a job to the current transaction; workers see it once the caller commits"""
+    _, max_attempts = HANDLERS[kind]
+    job = Job(kind=kind, payload=json.dumps(payload), max_attempts=max_attempts,
+              run_after=datetime.utcnow() + timedelta(seconds=delay))
+    db.session.add(job)
+    db.session.info['jobs_enqueued'] = True
+    return job
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_workers(session):
+    if session.info.pop('jobs_enqueued', False):
+        _wakeup.set()
+
+
+def claim_next():
+    """Atomically mark the next due job as running and return it (or None)"""
+    now = datetime.utcnow()
+    due = select(Job.id).where(
+        ((Job.status == 'queued') & (Job.run_after <= now)) |
+        ((Job.status == 'running') & (Job.started_at < now - LEASE))
+    ).order_by(Job.run_after, Job.id).limit(1).scalar_subquery()
+    job_id = db.session.execute(
+        update(Job).where(Job.id == due)
+        .values(status='running', attempts=Job.attempts + 1, started_at=now)
+        .returning(Job.id)
+    ).scalar()
+    db.session.commit()
+    return db.session.get(Job, job_id) if job_id else None
+
+
+def run_job(job):
+    job_id = job.id
+    handler, _ = HANDLERS.get(job.kind, (None, None))
+    try:
+        if handler is None:
+            raise LookupError(f'No handler registered for job kind {job.kind!r}')
+        handler(**json.loads(job.payload))
+        job.status = 'done'
+        job.last_error = None
+    except Exception:
+        error = traceback.format_exc(limit=5)
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        job.last_error = error
+        if job.attempts >= job.max_attempts:
+            job.status = 'dead'
+        else:
+            job.status = 'queued'
+            job.run_after = datetime.utcnow() + timedelta(seconds=2 ** job.attempts)
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return job.status
+
+
+def run_pending(limit=None):
+    """Run due jobs in the current app context until none are left; returns the count"""
+    count = 0
+    while limit is None or count < limit:
+        job = claim_next()
+        if job is None:
+            break
+        run_job(job)
+        count += 1
+    return count
+
+
+def purge_finished():
+    cutoff = datetime.utcnow() - KEEP_FINISHED
+    Job.query.filter(Job.status == 'done', Job.finished_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def _work(app):
+    last_purge = datetime.min
+    while True:
+        with app.app_context():
+            try:
+                if datetime.utcnow() - last_purge > PURGE_INTERVAL:
+                    purge_finished()
+                    last_purge = datetime.utcnow()
+                job = claim_next()
+                if job is not None:
+                    run_job(job)
+                    continue
+            except Exception as e:
+                # Usually a locked database; the job is retried after its lease
+                db.session.rollback()
+                print(f"Job worker error: {e}")
+        _wakeup.wait(POLL_INTERVAL)
+        _wakeup.clear()
+
+
+def start_workers(app):
+    with _start_lock:
+        if _workers:
+            return
+        for index in range(app.config['JOB_WORKERS']):
+            thread = threading.Thread(target=_work, args=(app,), name=f'job-worker-{index}', daemon=True)
+            thread.start()
+            _workers.append(thread)
+
+
+def init_app(app):
+    """Start the worker threads with the first request (not for CLI commands)"""
+    app.config.setdefault('JOB_WORKERS', 2)
+
+    @app.before_request
+    def _ensure_workers():
+        if not _workers:
+            start_workers(app)
+
+
+def queue_stats(sample=100):
+    """Queue depth per status plus wait/run latency over the most recent finished jobs"""
+    counts = dict(db.session.query(Job.status, func.count(Job.id)).group_by(Job.status).all())
+    oldest = db.session.query(func.min(Job.run_after)).filter(Job.status == 'queued').scalar()
+    recent = Job.query.filter(Job.status == 'done').order_by(Job.finished_at.desc()).limit(sample).all()
+
+    now = datetime.utcnow()
+    waits = [(job.started_at - job.created_at).total_seconds() for job in recent]
+    runs = [(job.finished_at - job.started_at).total_seconds() for job in recent]
+    return {
+        'queued': counts.get('queued', 0),
+        'running': counts.get('running', 0),
+        'done': counts.get('done', 0),
+        'dead': counts.get('dead', 0),
+        'oldest_queued_seconds': max((now - oldest).total_seconds(), 0) if oldest else 0,
+        'avg_wait_seconds': sum(waits) / len(waits) if waits else 0,
+        'avg_run_seconds': sum(runs) / len(runs) if runs else 0,
+    }
+
+
+def retry_dead():
+    count = Job.query.filter_by(status='dead').update(
+        {'status': 'queued', 'attempts': 0, 'run_after': datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
+    return count
@@ -0,0 +1,179 @@
+import json
+import os
+import threading
+import time
+from collections import deque, namedtuple
+
+from flask import has_request_context, render_template
+from sqlalchemy.orm import joinedload
+
+from models import db, Message
+from page_cache import for_viewer
+
+# Live updates for the communication wall. A single in-process feed keeps the
+# last FEED_SIZE events (new message with its rendered card, or deletion) and
+# one Condition that every waiting client shares: an idle stream is a
+# generator parked on that condition, with no queue or thread of its own
+# (under a gevent/eventlet worker it is just a greenlet). post_message() and
+# delete_message() publish straight after their commit; a watcher thread picks
+# up messages posted or deleted by other worker processes from the database.
+#
+# Clients resume with the id of the newest message they have, which is also
+# the SSE event id, so a reconnect to any process first catches up from the
+# database. `since` ("<process>.<sequence>") additionally lets a long-poll
+# client on the same process receive deletions it missed between polls.
+
+FEED_SIZE = 200
+CATCH_UP_LIMIT = 50
+
+Event = namedtuple('Event', 'seq kind message_id html_admin html_member')
+
+
+class Feed:
+    def __init__(self, size=FEED_SIZE):
+        self.token = f'{os.getpid()}-{int(time.time())}'
+        self.events = deque(maxlen=size)
+        self.seq = 0
+        self.condition = threading.Condition()
+        self.recent_ids = deque(maxlen=size)  # Live message ids, checked for deletion by the watcher
+        self.watermark = None  # Highest message id the watcher has read from the database
+        self.streams = 0  # Clients currently waiting: open streams and long polls
+
+    def publish(self, kind, message_id, html_admin=None, html_member=None, only_if_live=False):
+        with self.condition:
+            if kind == 'message':
+                if message_id in self.recent_ids:
+                    return
+                self.recent_ids.append(message_id)
+            elif message_id in self.recent_ids:
+                self.recent_ids.remove(message_id)
+            elif only_if_live:
+                return  # Already announced
+            self.seq += 1
+            self.events.append(Event(self.seq, kind, message_id, html_admin, html_member))
+            self.condition.notify_all()
+
+    def position(self, since=None):
+        """The sequence number to wait from: `since` if it is ours and still buffered, else now"""
+        with self.condition:
+            token, _, seq = (since or '').partition('.')
+            oldest = self.events[0].seq if self.events else self.seq + 1
+            if token == self.token and seq.isdigit() and oldest - 1 <= int(seq) <= self.seq:
+                return int(seq)
+            return self.seq
+
+    def wait(self, after_seq, timeout):
+        """Block up to `timeout` for events after `after_seq`; returns (new position, events)"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.seq > after_seq, timeout)
+            return self.seq, [event for event in self.events if event.seq > after_seq]
+
+    def opened(self):
+        with self.condition:
+            self.streams += 1
+
+    def closed(self):
+        with self.condition:
+            self.streams -= 1
+
+    def cursor(self, seq):
+        return f'{self.token}.{seq}'
+
+
+feed = Feed()
+_watcher = []
+_settings = {'poll': 2}
+
+
+def init_app(app):
+    _settings['poll'] = app.config['LIVE_POLL_SECONDS']
+    _settings['app'] = app
+    _settings['urls'] = app.url_map.bind('localhost', script_name=app.config['APPLICATION_ROOT'])
+
+
+def _path_for(endpoint, **values):
+    return _settings['urls'].build(endpoint, values)
+
+
+def render_card(message):
+    """The message card for admins and, with owner markers, for everyone else"""
+    # The watcher renders outside any request, where url_for has no server to
+    # build against; the card only needs site-relative paths
+    urls = {} if has_request_context() else {'url_for': _path_for}
+    return (render_template('communication_message.html', message=message, is_admin=True, **urls),
+            render_template('communication_message.html', message=message, is_admin=False, **urls))
+
+
+def publish_message(message):
+    feed.publish('message', message.id, *render_card(message))
+
+
+def publish_delete(message_id, only_if_live=False):
+    feed.publish('delete', message_id, only_if_live=only_if_live)
+
+
+def catch_up(after_id):
+    """Messages newer than `after_id`, oldest first, rendered for the stream"""
+    messages = Message.query.options(joinedload(Message.poster)).filter(Message.id > after_id) \
+        .order_by(Message.id.desc()).limit(CATCH_UP_LIMIT).all()
+    return [Event(None, 'message', message.id, *render_card(message)) for message in reversed(messages)]
+
+
+def encode(event, is_admin, viewer_id):
+    """SSE/long-poll payload for one event as seen by the viewer"""
+    if event.kind == 'delete':
+        return {'event': 'delete', 'id': event.message_id}
+    html = event.html_admin if is_admin else str(for_viewer(event.html_member, viewer_id))
+    return {'event': 'message', 'id': event.message_id, 'html': html}
+
+
+def sse(payload):
+    lines = [f"event: {payload['event']}"]
+    if payload['event'] == 'message':
+        lines.append(f"id: {payload['id']}")
+    lines.append(f'data: {json.dumps(payload)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def _watch_once():
+    """Publish messages other processes posted or deleted since the last look"""
+    if feed.watermark is None:
+        feed.watermark = db.session.query(db.func.max(Message.id)).scalar() or 0
+        return
+    # SQLite commits writes in id order, so nothing can appear below the watermark later
+    for message in Message.query.options(joinedload(Message.poster)).filter(Message.id > feed.watermark) \
+            .order_by(Message.id).all():
+        publish_message(message)
+        feed.watermark = message.id
+    recent = list(feed.recent_ids)
+    if recent:
+        alive = {row[0] for row in db.session.query(Message.id).filter(Message.id.in_(recent))}
+        for message_id in recent:
+            if message_id not in alive:
+                publish_delete(message_id, only_if_live=True)
+
+
+def _watch_forever(app):
+    while True:
+        if feed.streams:
+            with app.app_context():
+                try:
+                    _watch_once()
+                except Exception as e:
+                    print(f"Live feed watcher error: {e}")
+                finally:
+                    db.session.remove()
+        else:
+            feed.watermark = None  # Nobody listening; start again from the current end
+        time.sleep(_settings['poll'])
+
+
+def ensure_watcher():
+    if _watcher or not _settings['poll']:
+        return
+    with feed.condition:
+        if not _watcher:
+            thread = threading.Thread(target=_watch_forever, args=(_settings['app'],), name='live-watcher',
+                                      daemon=True)
+            thread.start()
+            _watcher.append(thread)
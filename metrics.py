@@ -0,0 +1,204 @@
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event, text
+
+from models import db
+
+# Per-endpoint request and SQL instrumentation. Each process adds to in-memory
+# deltas under a lock (a few dict updates per request) and a background thread
+# folds them into the metric_value table every FLUSH_INTERVAL seconds, so
+# /metrics reports the sum over every worker process. Series are stored with
+# their Prometheus label text already rendered.
+
+FLUSH_INTERVAL = 10
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+METRICS = {
+    'http_requests_total': ('counter', 'Requests handled, by endpoint, method and status'),
+    'http_request_duration_seconds': ('histogram', 'Request latency'),
+    'http_request_bytes_total': ('counter', 'Request body bytes received'),
+    'http_response_bytes_total': ('counter', 'Response body bytes sent'),
+    'db_queries_total': ('counter', 'SQL statements executed'),
+    'db_query_seconds_total': ('counter', 'Time spent executing SQL statements'),
+    'password_hashes_total': ('counter', 'Password hashes computed or turned away, by operation and outcome'),
+    'password_hash_seconds_total': ('counter', 'Time from submitting a password hash to its result'),
+    'login_throttled_total': ('counter', 'Login and registration attempts refused by the rate limiter'),
+    'user_cache_lookups_total': ('counter', 'Logged-in user lookups, by cache hit or miss'),
+    'page_cache_lookups_total': ('counter', 'Cached list fragment lookups, by hit or miss'),
+}
+
+_lock = threading.Lock()
+_pending = {}
+_flusher = []
+
+
+def _add(name, labels, value):
+    key = (name, labels)
+    _pending[key] = _pending.get(key, 0) + value
+
+
+def count(name, labels, value=1):
+    """Add to a counter whose family is listed in METRICS"""
+    with _lock:
+        _add(name, labels, value)
+
+
+def record_request(endpoint, method, status, seconds, queries, query_seconds, bytes_in, bytes_out):
+    labels = f'endpoint="{endpoint}",method="{method}"'
+    with _lock:
+        _add('http_requests_total', f'{labels},status="{status}"', 1)
+        for bound in LATENCY_BUCKETS:
+            if seconds <= bound:
+                _add('http_request_duration_seconds_bucket', f'{labels},le="{bound}"', 1)
+        _add('http_request_duration_seconds_bucket', f'{labels},le="+Inf"', 1)
+        _add('http_request_duration_seconds_sum', labels, seconds)
+        _add('http_request_duration_seconds_count', labels, 1)
+        _add('http_request_bytes_total', labels, bytes_in)
+        _add('http_response_bytes_total', labels, bytes_out)
+        _add('db_queries_total', f'endpoint="{endpoint}"', queries)
+        _add('db_query_seconds_total', f'endpoint="{endpoint}"', query_seconds)
+
+
+def flush():
+    """Write this process's pending deltas to the database; they are kept if that fails"""
+    global _pending
+    with _lock:
+        batch, _pending = _pending, {}
+    if not batch:
+        return
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO metric_value (name, labels, value) VALUES (:name, :labels, :value) "
+                "ON CONFLICT(name, labels) DO UPDATE SET value = value + excluded.value"
+            ), [{'name': name, 'labels': labels, 'value': value} for (name, labels), value in batch.items()])
+    except Exception:
+        with _lock:
+            for (name, labels), value in batch.items():
+                _add(name, labels, value)
+        raise
+
+
+def _flush_forever(app):
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        with app.app_context():
+            try:
+                flush()
+            except Exception as e:
+                print(f"Could not flush metrics: {e}")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    # so the next statement on this connection is not timed against it
+    if context.connection is not None:
+        context.connection.info.pop('query_started', None)
+
+
+def _counted_body(body, chunks, labels):
+    """Pass a streamed body through, adding its size once it has been sent"""
+    sent = 0
+    try:
+        for chunk in chunks:
+            sent += len(chunk)
+            yield chunk
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+        count('http_response_bytes_total', labels, sent)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    if has_request_context():
+        g.metrics_queries = g.get('metrics_queries', 0) + 1
+        g.metrics_query_seconds = g.get('metrics_query_seconds', 0) + elapsed
+    else:
+        with _lock:
+            _add('db_queries_total', 'endpoint="background"', 1)
+            _add('db_query_seconds_total', 'endpoint="background"', elapsed)
+
+
+def init_app(app):
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+        if not _flusher:
+            with _lock:
+                if not _flusher:
+                    thread = threading.Thread(target=_flush_forever, args=(app,), name='metrics-flush', daemon=True)
+                    thread.start()
+                    _flusher.append(thread)
+
+    @app.after_request
+    def _capture_response(response):
+        g.metrics_status = response.status_code
+        g.metrics_bytes_out = response.content_length or 0
+        if response.content_length is None and response.is_streamed and request.method != 'HEAD':
+            # Exports and the live stream are sent after this request has been recorded
+            labels = f'endpoint="{request.endpoint or "unmatched"}",method="{request.method}"'
+            response.response = _counted_body(response.response, response.iter_encoded(), labels)
+        return response
+
+    @app.teardown_request
+    def _record(exc):
+        started = g.get('metrics_started')
+        if started is None:
+            return
+        record_request(
+            request.endpoint or 'unmatched', request.method,
+            g.get('metrics_status', 500),
+            time.perf_counter() - started,
+            g.get('metrics_queries', 0), g.get('metrics_query_seconds', 0),
+            request.content_length or 0, g.get('metrics_bytes_out', 0),
+        )
+
+
+def _format(value):
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+def _series_order(row):
+    # Histogram buckets sort by their numeric bound, with +Inf last
+    name, labels, _ = row
+    head, _, bound = labels.partition('le="')
+    return name, head, float(bound.rstrip('"')) if bound else 0
+
+
+def render(extra_gauges=()):
+    """Prometheus text exposition of every stored series plus `extra_gauges`.
+
+    `extra_gauges` is an iterable of (name, help, [(labels, value)]) read at scrape time.
+    """
+    flush()
+    rows = db.session.execute(text('SELECT name, labels, value FROM metric_value')).all()
+    series = {}
+    for name, labels, value in sorted(rows, key=_series_order):
+        family = next((base for base in METRICS if name == base or name.startswith(base + '_')), name)
+        series.setdefault(family, []).append((name, labels, value))
+
+    lines = []
+    for family, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {family} {help_text}')
+        lines.append(f'# TYPE {family} {kind}')
+        for name, labels, value in series.get(family, []):
+            lines.append(f'{name}{{{labels}}} {_format(value)}')
+    for name, help_text, samples in extra_gauges:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} gauge')
+        for labels, value in samples:
+            lines.append(f'{name}{{{labels}}} {_format(value)}' if labels else f'{name} {_format(value)}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,152 @@
+from sqlalchemy import inspect, text
+
+from models import db
+from search import rebuild_search_index
+from stats import counter_trigger_ddl, rebuild_counters
+
+# Versioned schema migrations. The applied version lives in SQLite's
+# PRAGMA user_version, so checking for pending work at boot is a single header
+# read. A new database is created from the models and stamped with the latest
+# version; an existing one runs only the steps it has not seen.
+#
+# Steps must be idempotent (IF NOT EXISTS, checkfirst, ...): the version is
+# bumped after each step, and a step interrupted halfway is simply run again.
+# Append new steps to MIGRATIONS; never reorder or remove old ones.
+
+
+def schema_version():
+    return db.session.execute(text('PRAGMA user_version')).scalar()
+
+
+def set_schema_version(version):
+    db.session.execute(text(f'PRAGMA user_version = {int(version)}'))
+    db.session.commit()
+
+
+def has_unique_index(table, columns):
+    for index in db.session.execute(text(f'PRAGMA index_list("{table}")')).all():
+        if index[2]:
+            indexed = [row[2] for row in db.session.execute(text(f'PRAGMA index_info("{index[1]}")'))]
+            if indexed == list(columns):
+                return True
+    return False
+
+
+def create_model_indexes():
+    """Create every index declared on the models that the database does not have yet"""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+
+def backfill(table, assignments, condition, batch_size=5000):
+    """UPDATE a large table in rowid batches, committing after each one.
+
+    Each batch holds the write lock only briefly, so requests keep going while
+    it runs. `condition` must stop matching a row once it has been updated,
+    which is also what makes the backfill resumable after an interruption.
+    """
+    total = 0
+    while True:
+        count = db.session.execute(text(
+            f'UPDATE "{table}" SET {assignments} WHERE rowid IN '
+            f'(SELECT rowid FROM "{table}" WHERE {condition} LIMIT :batch_size)'
+        ), {'batch_size': batch_size}).rowcount
+        db.session.commit()
+        total += count
+        if count < batch_size:
+            return total
+
+
+def _create_missing_tables():
+    db.create_all()
+
+
+def _unique_attendance_per_day():
+    if has_unique_index('attendance', ['student_id', 'date']):
+        return
+    # Keep the latest mark where a student was recorded twice on the same day
+    db.session.execute(text(
+        'DELETE FROM attendance WHERE id NOT IN (SELECT MAX(id) FROM attendance GROUP BY student_id, date)'
+    ))
+    db.session.execute(text(
+        'CREATE UNIQUE INDEX IF NOT EXISTS uq_attendance_student_date ON attendance (student_id, date)'
+    ))
+
+
+def _incremental_vacuum():
+    # Switching an existing database takes a full VACUUM: an exclusive lock for
+    # as long as it rewrites the file and about its size in free disk, which is
+    # no job for a boot. It is left to 'flask archive --enable-incremental-vacuum';
+    # new databases are created in incremental mode.
+    if db.session.execute(text('PRAGMA auto_vacuum')).scalar() != 2:
+        print("Run 'flask archive --enable-incremental-vacuum' to let archiving shrink the database")
+
+
+def _counter_triggers():
+    for table in db.metadata.sorted_tables:
+        for statement in counter_trigger_ddl(table):
+            db.session.execute(text(statement))
+
+
+def _dashboard_counters():
+    _counter_triggers()
+    rebuild_counters()
+
+
+def _index_suite():
+    create_model_indexes()
+    # Counters are now counted with is_resolved = 0 (no COALESCE), so recount
+    rebuild_counters()
+
+
+def _page_cache_versions():
+    create_model_indexes()
+    _counter_triggers()
+
+
+def _null_flags():
+    backfill('lost_found', 'is_resolved = 0', 'is_resolved IS NULL')
+    backfill('complaint', 'is_resolved = 0', 'is_resolved IS NULL')
+    backfill('note', 'is_public = 0', 'is_public IS NULL')
+
+
+MIGRATIONS = [
+    ('create missing tables', _create_missing_tables),
+    ('one attendance mark per student per day', _unique_attendance_per_day),
+    ('feed and report indexes', create_model_indexes),
+    ('dashboard counter triggers', _dashboard_counters),
+    ('full-text search tables', rebuild_search_index),
+    ('backfill NULL resolved/public flags', _null_flags),
+    ('index suite for lists, rosters and open items', _index_suite),
+    ('metrics table', _create_missing_tables),
+    ('user cache invalidation log', _create_missing_tables),
+    ('page cache version triggers', _page_cache_versions),
+    ('student and per-date attendance version triggers', _counter_triggers),
+    ('bitmap attendance storage tables', _create_missing_tables),
+    ('incremental vacuum for archiving', _incremental_vacuum),
+]
+
+
+def migrate():
+    """Bring the database up to the latest schema version; returns the steps applied"""
+    current = schema_version()
+    latest = len(MIGRATIONS)
+    if current >= latest:
+        return []
+
+    if current == 0 and not inspect(db.engine).has_table('user'):
+        # Brand new database: the models already describe the latest schema
+        db.session.execute(text('PRAGMA auto_vacuum = INCREMENTAL'))  # Must precede the first table
+        db.create_all()
+        set_schema_version(latest)
+        return ['create schema']
+
+    applied = []
+    for version, (name, step) in enumerate(MIGRATIONS[current:], start=current + 1):
+        print(f"Applying migration {version}: {name}")
+        step()
+        db.session.commit()
+        set_schema_version(version)
+        applied.append(name)
+    return applied
@@ -22,6 +22,11 @@ class User(UserMixin, db.Model):
         return check_password_hash(self.password_hash, password)
 
 class Student(db.Model):
+    __table_args__ = (
+        db.Index('ix_student_name', 'name'),  # Alphabetical student lists
+        db.Index('ix_student_branch_year_roll', 'branch', 'year', 'roll_number'),  # Class rosters and branch lists
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     branch = db.Column(db.String(50), nullable=False)
@@ -29,6 +34,11 @@ class Student(db.Model):
     roll_number = db.Column(db.String(20), unique=True, nullable=False)  # Added nullable=False
 
 class Attendance(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'date', name='uq_attendance_student_date'),  # One mark per student per day
+        db.Index('ix_attendance_date_student_status', 'date', 'student_id', 'status'),  # Covers date-range reports
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
     date = db.Column(db.Date, nullable=False)
@@ -38,7 +48,50 @@ class Attendance(db.Model):
     student = db.relationship('Student', backref='attendance_records')
     marker = db.relationship('User', backref='marked_attendance')  # Added relationship
 
+class AttendanceSeat(db.Model):
+    # A student's bit position in their class's attendance bitmaps; see attendance_store.py
+    __table_args__ = (
+        db.UniqueConstraint('branch', 'year', 'student_id', name='uq_attendance_seat_student'),
+        {'sqlite_with_rowid': False},  # Small rows; the primary key is the table
+    )
+
+    branch = db.Column(db.String(50), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    seat = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
+
+class AttendanceDay(db.Model):
+    # One class's marks for one date, packed one bit per seat
+    __table_args__ = (
+        db.Index('ix_attendance_day_date', 'date'),  # Whole-college days and date ranges
+    )
+
+    branch = db.Column(db.String(50), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    marked = db.Column(db.LargeBinary, nullable=False)  # Seat has a mark that day
+    attended = db.Column(db.LargeBinary, nullable=False)  # Seat was Present or Late
+    marked_count = db.Column(db.Integer, nullable=False, default=0)  # Bits set in marked, for the counter triggers
+    marked_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)  # Who marked the class first
+
+class AttendanceOverride(db.Model):
+    # Marks the bitmaps cannot express: Late, or marked by someone else than the day's marker
+    __table_args__ = (
+        {'sqlite_with_rowid': False},
+    )
+
+    branch = db.Column(db.String(50), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    seat = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    status = db.Column(db.String(10), nullable=False)
+    marked_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+
 class LostFoundImage(db.Model):
+    __table_args__ = (
+        db.Index('ix_lost_found_image_lost_found_id', 'lost_found_id'),  # Images of a page of posts
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(255), nullable=False)
     lost_found_id = db.Column(db.Integer, db.ForeignKey('lost_found.id'), nullable=False)
@@ -47,6 +100,11 @@ class LostFoundImage(db.Model):
     lost_found = db.relationship('LostFound', backref=db.backref('images', lazy=True, cascade='all, delete-orphan'))
 
 class LostFound(db.Model):
+    __table_args__ = (
+        db.Index('ix_lost_found_posted_at_id', 'posted_at', 'id'),  # Keyset pagination on the feed
+        db.Index('ix_lost_found_open', 'posted_at', 'id', sqlite_where=db.text('is_resolved = 0')),  # Open items only
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=False)
@@ -61,6 +119,11 @@ class LostFound(db.Model):
     poster = db.relationship('User', backref='lost_found_posts')
 
 class Complaint(db.Model):
+    __table_args__ = (
+        db.Index('ix_complaint_posted_at_id', 'posted_at', 'id'),  # Keyset pagination on the feed
+        db.Index('ix_complaint_is_resolved', 'is_resolved'),  # Pending/resolved totals
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     message = db.Column(db.Text, nullable=False)
@@ -71,6 +134,10 @@ class Complaint(db.Model):
     poster = db.relationship('User', backref='complaints')
 
 class Message(db.Model):
+    __table_args__ = (
+        db.Index('ix_message_posted_at_id', 'posted_at', 'id'),  # Keyset pagination on the feed
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text)
     file_path = db.Column(db.String(300))
@@ -81,6 +148,11 @@ class Message(db.Model):
     poster = db.relationship('User', backref='messages')
 
 class Note(db.Model):
+    __table_args__ = (
+        db.Index('ix_note_posted_at_id', 'posted_at', 'id'),  # Keyset pagination on the feed
+        db.Index('ix_note_private_posted_by', 'posted_by', sqlite_where=db.text('is_public = 0')),  # Who has private notes
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     content = db.Column(db.Text, nullable=False)
@@ -93,6 +165,10 @@ class Note(db.Model):
     poster = db.relationship('User', backref='notes')
 
 class Teacher(db.Model):
+    __table_args__ = (
+        db.Index('ix_teacher_name', 'name'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     phone = db.Column(db.String(15), unique=True, nullable=False)  # Added unique constraint
@@ -106,4 +182,46 @@ class Teacher(db.Model):
         self.branch = branch
         self.email = email
         self.designation = designation
-        db.session.commit()
\ No newline at end of file
+        db.session.commit()
+
+class StatCounter(db.Model):
+    # Running totals for the dashboard, kept current by triggers installed in stats.py
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+class UploadBlob(db.Model):
+    # One row per unique uploaded file; see storage.py for the reference counting
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
+
+class Job(db.Model):
+    # Background work queue; see jobs.py
+    __table_args__ = (
+        db.Index('ix_job_status_run_after', 'status', 'run_after'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, dead
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    last_error = db.Column(db.Text)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+class MetricValue(db.Model):
+    # Cumulative request/SQL metrics summed over every worker process; see metrics.py
+    name = db.Column(db.String(100), primary_key=True)
+    labels = db.Column(db.String(300), primary_key=True)
+    value = db.Column(db.Float, nullable=False, default=0)
+
+class UserCacheInvalidation(db.Model):
+    # Ids of users changed since other processes cached them; see user_cache.py
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
\ No newline at end of file
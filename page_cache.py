@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+
+from markupsafe import Markup
+from sqlalchemy import text
+
+import metrics
+from models import db, StatCounter
+
+# Rendered-fragment cache for the list pages. Triggers in stats.py move a
+# per-table version counter (stat_counter "cache:version:<table>") on every
+# insert, update or delete, and each cache key embeds the current versions of
+# the tables a fragment was built from. A write therefore never has to find and
+# delete stale entries: the next read simply misses and the old entry ages out
+# of the size-bounded backend. "cache:epoch" is a random number per database,
+# so a recreated database cannot pick up entries from the one it replaced.
+#
+# Fragments are rendered without current_user. Role-dependent sections are
+# switched on an is_admin flag that is part of the key, and controls meant only
+# for an item's owner are wrapped in {% call owner_only(owner_id) %}; those
+# blocks are cut out per viewer after the shared fragment is fetched.
+
+_OWNER_BLOCK = re.compile(r'<!--owner:(\d+)-->(.*?)<!--/owner-->', re.S)
+
+
+class MemoryBackend:
+    """Per-process LRU bounded by the total length of the cached strings"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self.entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes and self.entries:
+                self.size -= len(self.entries.popitem(last=False)[1])
+
+
+class DiskBackend:
+    """One file per entry, shared by every process on the host.
+
+    Files are written atomically; hits touch the file, and once roughly a tenth
+    of max_bytes has been written the least recently used files are deleted
+    until the directory is back under 90% of max_bytes.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.written = 0
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                value = f.read()
+            os.utime(path)
+            return value
+        except OSError:
+            return None
+
+    def set(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(handle, 'w', encoding='utf-8') as f:
+            f.write(value)
+        os.replace(temp_path, path)
+        with self.lock:
+            self.written += len(value)
+            if self.written < self.max_bytes // 10:
+                return
+            self.written = 0
+        self.evict()
+
+    def evict(self):
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+_backend = [None]
+
+
+def init_app(app):
+    kind = app.config['PAGE_CACHE_BACKEND']
+    if kind == 'memory':
+        _backend[0] = MemoryBackend(app.config['PAGE_CACHE_MAX_BYTES'])
+    elif kind == 'disk':
+        _backend[0] = DiskBackend(app.config['PAGE_CACHE_DIR'], app.config['PAGE_CACHE_MAX_BYTES'])
+    elif kind != 'none':
+        raise ValueError(f"PAGE_CACHE_BACKEND must be memory, disk or none, not {kind!r}")
+    app.jinja_env.globals['owner_only'] = owner_only
+
+
+def owner_only(owner_id, also=False, caller=None):
+    """Call block for controls shown only to `owner_id` (or to everyone when `also` is true)"""
+    content = caller()
+    if also:
+        return content
+    return Markup(f'<!--owner:{int(owner_id)}-->{content}<!--/owner-->')
+
+
+def for_viewer(html, viewer_id):
+    """Keep the owner blocks that belong to `viewer_id` and drop the rest"""
+    return Markup(_OWNER_BLOCK.sub(lambda m: m.group(2) if int(m.group(1)) == viewer_id else '', html))
+
+
+def versions(tables):
+    """Version string for the given model classes; changes whenever one of their rows does"""
+    names = ['cache:epoch'] + [f'cache:version:{table.__tablename__}' for table in tables]
+    values = dict(db.session.query(StatCounter.name, StatCounter.value).filter(StatCounter.name.in_(names)).all())
+    if 'cache:epoch' not in values:
+        with db.engine.begin() as conn:
+            conn.execute(text("INSERT OR IGNORE INTO stat_counter (name, value) VALUES ('cache:epoch', :epoch)"),
+                         {'epoch': random.randrange(1, 2 ** 31)})
+        values['cache:epoch'] = db.session.query(StatCounter.value).filter_by(name='cache:epoch').scalar()
+    return '.'.join(str(values.get(name, 0)) for name in names)
+
+
+def _cached(key, tables, render):
+    backend = _backend[0]
+    if backend is None:
+        return render()
+    key = f"{'|'.join(str(part) for part in key)}|{versions(tables)}"
+    value = backend.get(key)
+    metrics.count('page_cache_lookups_total', f'result="{"miss" if value is None else "hit"}"')
+    if value is None:
+        value = render()
+        backend.set(key, value)
+    return value
+
+
+def fragment(key, tables, render, viewer_id):
+    """HTML from `render()`, reused until one of `tables` changes, trimmed for `viewer_id`.
+
+    `key` is a tuple naming the fragment and everything else its output depends
+    on (page cursor, is_admin, ...). Model classes in `tables` are the ones the
+    fragment reads.
+    """
+    return for_viewer(_cached(key, tables, render), viewer_id)
+
+
+def value(key, tables, compute):
+    """Like fragment() for a JSON-serialisable value"""
+    return json.loads(_cached(key, tables, lambda: json.dumps(compute())))
@@ -0,0 +1,41 @@
+import base64
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+
+def encode_cursor(posted_at, item_id):
+    raw = f"{posted_at.isoformat()}|{item_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Turn a cursor string back into (posted_at, id), or None if it is malformed"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        posted_at, item_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(posted_at), int(item_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def keyset_page(query, model, cursor=None, per_page=25):
+    """Return one page of `query` ordered newest first, plus the cursor for the next page.
+
+    Seeks on (posted_at, id) instead of using OFFSET, so every page costs the same
+    no matter how deep into the feed the user has scrolled.
+    """
+    key = decode_cursor(cursor)
+    if key:
+        query = query.filter(tuple_(model.posted_at, model.id) < key)
+
+    items = query.order_by(model.posted_at.desc(), model.id.desc()).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        last = items[-1]
+        next_cursor = encode_cursor(last.posted_at, last.id)
+    return items, next_cursor
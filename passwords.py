@@ -0,0 +1,158 @@
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+import metrics
+
+# Password hashing off the request threads. PBKDF2 at a high iteration count is
+# pure CPU, so a login rush used to stall every other route. Hashes now run in
+# a small process pool; at most PASSWORD_HASH_QUEUE of them may be queued or
+# running at once and anything beyond that is turned away (HashingBusy) instead
+# of piling up. Login attempts are throttled per phone and per client IP with
+# token buckets before any hashing happens; the buckets live in each process.
+
+
+class HashingBusy(Exception):
+    """The hashing pool is full or did not answer in time"""
+
+
+class TokenBucket:
+    """`capacity` attempts per key, refilled at one token every `refill_seconds`"""
+
+    def __init__(self, capacity, refill_seconds, max_keys=100000):
+        self.capacity = capacity
+        self.refill_seconds = refill_seconds
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def allow(self, key):
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) / self.refill_seconds)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+            return allowed
+
+
+_settings = {}
+_limiters = {}
+_lock = threading.Lock()
+_pool = None
+_slots = None
+_in_flight = 0
+
+
+def init_app(app):
+    global _slots
+    _settings.update(
+        method=app.config['PASSWORD_HASH_METHOD'],
+        workers=app.config['PASSWORD_HASH_WORKERS'],
+        timeout=app.config['PASSWORD_HASH_TIMEOUT'],
+    )
+    _settings.pop('prefix', None)
+    _slots = threading.BoundedSemaphore(app.config['PASSWORD_HASH_QUEUE'])
+    _limiters['ip'] = TokenBucket(app.config['LOGIN_IP_BURST'], app.config['LOGIN_IP_REFILL_SECONDS'])
+    _limiters['phone'] = TokenBucket(app.config['LOGIN_PHONE_BURST'], app.config['LOGIN_PHONE_REFILL_SECONDS'])
+
+
+def _executor():
+    global _pool
+    with _lock:
+        if _pool is None:
+            # spawn: forking a process that already runs request and job threads is unsafe
+            _pool = ProcessPoolExecutor(max_workers=_settings['workers'],
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _finished(future):
+    global _in_flight
+    with _lock:
+        _in_flight -= 1
+    _slots.release()
+
+
+def _discard(pool):
+    """Drop a broken pool (a worker died) so the next hash starts a new one"""
+    global _pool
+    with _lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _run(operation, function, *args):
+    global _in_flight
+    started = time.perf_counter()
+    if not _settings['workers']:
+        result = function(*args)
+    else:
+        if not _slots.acquire(blocking=False):
+            metrics.count('password_hashes_total', f'operation="{operation}",outcome="busy"')
+            raise HashingBusy()
+        with _lock:
+            _in_flight += 1
+        pool = _executor()
+        try:
+            future = pool.submit(function, *args)
+        except BrokenProcessPool as error:
+            _finished(None)
+            _discard(pool)
+            metrics.count('password_hashes_total', f'operation="{operation}",outcome="error"')
+            raise HashingBusy() from error
+        future.add_done_callback(_finished)
+        try:
+            result = future.result(timeout=_settings['timeout'])
+        except FutureTimeout:
+            future.cancel()
+            metrics.count('password_hashes_total', f'operation="{operation}",outcome="busy"')
+            raise HashingBusy()
+        except BrokenProcessPool as error:
+            _discard(pool)
+            metrics.count('password_hashes_total', f'operation="{operation}",outcome="error"')
+            raise HashingBusy() from error
+    metrics.count('password_hashes_total', f'operation="{operation}",outcome="done"')
+    metrics.count('password_hash_seconds_total', f'operation="{operation}"', time.perf_counter() - started)
+    return result
+
+
+def hash_password(password):
+    return _run('hash', generate_password_hash, password, _settings['method'])
+
+
+def verify_password(password_hash, password):
+    return _run('verify', check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """True when the hash was made with other parameters than PASSWORD_HASH_METHOD"""
+    if 'prefix' not in _settings:
+        # werkzeug fills in defaults ('scrypt' is stored as 'scrypt:32768:8:1'), so
+        # compare with what the method really writes; hashed once per process
+        _settings['prefix'] = generate_password_hash('', _settings['method']).split('$', 1)[0]
+    return password_hash.split('$', 1)[0] != _settings['prefix']
+
+
+def allow_attempt(ip, phone=None):
+    """Take a token for the client IP (and phone); False means throttle the attempt"""
+    for scope, key in (('ip', ip), ('phone', phone)):
+        if key is not None and not _limiters[scope].allow(key):
+            metrics.count('login_throttled_total', f'scope="{scope}"')
+            return False
+    return True
+
+
+def in_flight():
+    return _in_flight
@@ -0,0 +1,97 @@
+from collections import Counter
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+
+from models import db
+from query_plans import admin_client, default_requests
+
+# Development/CI aid for spotting N+1 queries. With QUERY_AUDIT on, every SQL
+# statement a request issues is recorded along with whether a template was
+# being rendered at the time. Statements are grouped by their parametrised
+# text, so the same SELECT run once per row shows up as one repeated entry.
+# Requests with template queries or repeats past QUERY_AUDIT_REPEAT_LIMIT are
+# logged as warnings, and every response gets an X-Query-Count header.
+
+
+def _record(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'query_audit' in g:
+        g.query_audit.append((' '.join(statement.split()), g.query_audit_rendering > 0))
+
+
+def _rendering_started(sender, template, context, **extra):
+    if 'query_audit' in g:
+        g.query_audit_rendering += 1
+
+
+def _rendering_finished(sender, template, context, **extra):
+    if 'query_audit' in g:
+        g.query_audit_rendering -= 1
+
+
+def build_report(path, statements, repeat_limit):
+    counts = Counter(sql for sql, _ in statements)
+    return {
+        'path': path,
+        'queries': len(statements),
+        'repeated': [(sql, count) for sql, count in counts.most_common() if count > repeat_limit],
+        'in_templates': sorted({sql for sql, rendering in statements if rendering}),
+    }
+
+
+def has_problems(report):
+    return bool(report['repeated'] or report['in_templates'])
+
+
+def over_budget(report, budget):
+    """True if a request ran more than `budget` queries, repeated one or queried from a template"""
+    return report['queries'] > budget or has_problems(report)
+
+
+def format_report(report):
+    lines = [f"{report['path']}: {report['queries']} queries"]
+    lines += [f"  repeated {count}x: {sql}" for sql, count in report['repeated']]
+    lines += [f"  during template rendering: {sql}" for sql in report['in_templates']]
+    return '\n'.join(lines)
+
+
+def init_app(app):
+    """Install the auditor when app.config['QUERY_AUDIT'] is set; safe to call twice"""
+    if not app.config.get('QUERY_AUDIT') or 'query_audit' in app.extensions:
+        return
+    app.extensions['query_audit'] = True
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _record)
+    before_render_template.connect(_rendering_started, app)
+    template_rendered.connect(_rendering_finished, app)
+
+    @app.before_request
+    def _start_audit():
+        g.query_audit = []
+        g.query_audit_rendering = 0
+
+    @app.after_request
+    def _report(response):
+        report = build_report(request.full_path.rstrip('?'), g.get('query_audit', []),
+                              app.config['QUERY_AUDIT_REPEAT_LIMIT'])
+        g.query_audit_report = report
+        response.headers['X-Query-Count'] = str(report['queries'])
+        if has_problems(report):
+            app.logger.warning('Query audit\n%s', format_report(report))
+        return response
+
+
+def audit_requests(app, requests=None):
+    """Run the hot pages as an admin with the auditor on; returns one report per request"""
+    app.config['QUERY_AUDIT'] = True
+    init_app(app)
+    with app.app_context():
+        requests = requests or default_requests()
+
+    reports = []
+    client = admin_client(app)
+    with client:
+        for method, path, form in requests:
+            client.open(path, method=method, data=form)
+            reports.append(g.query_audit_report)
+    return reports
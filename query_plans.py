@@ -0,0 +1,93 @@
+import re
+from datetime import date, datetime
+
+from sqlalchemy import event
+
+from models import db, User, Student
+from pagination import encode_cursor
+
+# Regression check for the index suite: requests every read-only page as an
+# admin, records each SELECT it issues and runs EXPLAIN QUERY PLAN on it. A bare
+# "SCAN <table>" (reading a whole table without an index) is reported.
+
+_TABLE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)$')
+
+
+def default_requests():
+    """(method, path, form) for the hot pages, parameterised from the current data"""
+    today = date.today().isoformat()
+    older = encode_cursor(datetime.utcnow(), 2 ** 31)
+    student = Student.query.first()
+    branch, year = (student.branch, student.year) if student else ('CSE', 1)
+    requests = [('GET', path, None) for path in [
+        '/dashboard',
+        '/attendance',
+        f'/attendance/date/{today}',
+        f'/attendance/roster?branch={branch}&year={year}&date={today}',
+        '/attendance/reports',
+        f'/attendance/reports?branch={branch}&year={year}',
+        '/lost_found',
+        f'/lost_found?before={older}',
+        '/complaints',
+        f'/complaints?before={older}',
+        '/communication',
+        f'/communication?before={older}',
+        '/notes',
+        f'/notes?before={older}',
+        '/teachers',
+        '/search?q=exam',
+    ]]
+    requests.append(('POST', '/login', {'role': 'student', 'phone': '0000000001', 'password': 'x'}))
+    return requests
+
+
+def admin_client(app):
+    """A test client already logged in as the first admin (anonymous if there is none)"""
+    with app.app_context():
+        admin = User.query.filter_by(role='admin').first()
+    client = app.test_client()
+    if admin is not None:
+        with client.session_transaction() as session:
+            session['_user_id'] = str(admin.id)
+            session['_fresh'] = True
+    return client
+
+
+def capture_queries(app, requests=None):
+    """Run the requests and return {sql: (path, parameters)} for every SELECT issued"""
+    statements = {}
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            statements.setdefault(statement, (current_path[0], parameters))
+
+    with app.app_context():
+        requests = requests or default_requests()
+        engine = db.engine
+
+    client = admin_client(app)
+    current_path = [None]
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        for method, path, form in requests:
+            current_path[0] = path
+            client.open(path, method=method, data=form)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    return statements
+
+
+def find_table_scans(app, requests=None):
+    """[(path, sql, plan lines)] for every captured query that scans a whole table"""
+    tables = set(db.metadata.tables)
+    problems = []
+    statements = capture_queries(app, requests)
+    with app.app_context():
+        with db.engine.connect() as conn:
+            for sql, (path, parameters) in statements.items():
+                plan = [row[-1] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql, parameters)]
+                scans = [line for line in plan
+                         if _TABLE_SCAN.match(line) and _TABLE_SCAN.match(line).group(1) in tables]
+                if scans:
+                    problems.append((path, sql, plan))
+    return problems
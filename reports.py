@@ -0,0 +1,178 @@
+from sqlalchemy import case, func
+
+import attendance_store
+from attendance_store import ATTENDED_STATUSES
+from models import db, Student, Attendance
+
+# All aggregation is pushed into grouped SQL over the attendance table so a
+# college-wide report never materialises ORM objects per attendance row. With
+# bitmap storage the same reports are built from attendance_store's per-class
+# popcounts and per-student counters instead; there a class filter means the
+# class the student was in on the day rather than the one they are in now.
+
+
+def _attended():
+    return func.sum(case((Attendance.status.in_(ATTENDED_STATUSES), 1), else_=0))
+
+
+def _percentage(attended, total):
+    return round(attended * 100.0 / total, 1) if total else 0.0
+
+
+def _in_range(query, start, end):
+    if start:
+        query = query.filter(Attendance.date >= start)
+    if end:
+        query = query.filter(Attendance.date <= end)
+    return query
+
+
+def _for_class(query, branch, year):
+    if branch:
+        query = query.filter(Student.branch == branch)
+    if year:
+        query = query.filter(Student.year == year)
+    return query
+
+
+def _per_student_totals(start, end):
+    # Aggregating attendance by student_id first keeps the join to student at one row per student
+    attended = _attended().label('attended')
+    total = func.count().label('total')
+    query = db.session.query(Attendance.student_id, attended, total)
+    return _in_range(query, start, end).group_by(Attendance.student_id).subquery()
+
+
+def _per_student_query(start, end, branch=None, year=None):
+    per_student = _per_student_totals(start, end)
+
+    query = db.session.query(
+        Student.id, Student.name, Student.roll_number, Student.branch, Student.year,
+        per_student.c.attended, per_student.c.total
+    ).join(per_student, per_student.c.student_id == Student.id)
+    return _for_class(query, branch, year), per_student
+
+
+def _student_rows(rows):
+    return [
+        {
+            'student_id': student_id,
+            'name': name,
+            'roll_number': roll_number,
+            'branch': branch,
+            'year': year,
+            'attended': attended,
+            'total': total,
+            'percentage': _percentage(attended, total)
+        }
+        for student_id, name, roll_number, branch, year, attended, total in rows
+    ]
+
+
+def _students_by_id(student_ids, chunk=5000):
+    student_ids, students = list(student_ids), {}
+    for offset in range(0, len(student_ids), chunk):
+        students.update((row.id, row) for row in db.session.query(
+            Student.id, Student.name, Student.roll_number, Student.branch, Student.year
+        ).filter(Student.id.in_(student_ids[offset:offset + chunk])))
+    return students
+
+
+def _bitmap_student_rows(start, end, branch, year):
+    totals = attendance_store.student_totals(start, end, branch, year)
+    return _student_rows((student.id, student.name, student.roll_number, student.branch, student.year,
+                          *totals[student.id]) for student in _students_by_id(totals).values())
+
+
+def student_percentages(start=None, end=None, branch=None, year=None):
+    """Attendance percentage for every student with marks in [start, end]"""
+    if attendance_store.storage() == 'bitmap':
+        return sorted(_bitmap_student_rows(start, end, branch, year),
+                      key=lambda row: (row['branch'], row['year'], row['roll_number']))
+    query, _ = _per_student_query(start, end, branch, year)
+    return _student_rows(query.order_by(Student.branch, Student.year, Student.roll_number).all())
+
+
+def students_below_threshold(threshold, start=None, end=None, branch=None, year=None):
+    """Students whose attendance percentage over [start, end] is below `threshold`"""
+    if attendance_store.storage() == 'bitmap':
+        rows = [row for row in _bitmap_student_rows(start, end, branch, year)
+                if row['attended'] * 100.0 < threshold * row['total']]
+        return sorted(rows, key=lambda row: row['percentage'])
+    query, per_student = _per_student_query(start, end, branch, year)
+    query = query.filter(per_student.c.attended * 100.0 < threshold * per_student.c.total)
+    rows = _student_rows(query.all())
+    return sorted(rows, key=lambda row: row['percentage'])
+
+
+def branch_year_rollup(start=None, end=None):
+    """Attendance totals grouped by branch and year"""
+    if attendance_store.storage() == 'bitmap':
+        totals = attendance_store.class_totals(start, end)
+        return [
+            {
+                'branch': branch,
+                'year': year,
+                'students': students,
+                'attended': attended,
+                'total': total,
+                'percentage': _percentage(attended, total)
+            }
+            for (branch, year), (students, attended, total) in sorted(totals.items())
+        ]
+    per_student = _per_student_totals(start, end)
+    query = db.session.query(
+        Student.branch, Student.year,
+        func.count(),
+        func.sum(per_student.c.attended),
+        func.sum(per_student.c.total)
+    ).join(per_student, per_student.c.student_id == Student.id).group_by(Student.branch, Student.year)
+    return [
+        {
+            'branch': branch,
+            'year': year,
+            'students': students,
+            'attended': attended,
+            'total': total,
+            'percentage': _percentage(attended, total)
+        }
+        for branch, year, students, attended, total in query.order_by(Student.branch, Student.year).all()
+    ]
+
+
+def monthly_matrix(start=None, end=None, branch=None, year=None):
+    """Month-by-month percentages per student.
+
+    Returns (months, rows) where months is the sorted list of 'YYYY-MM' keys and
+    each row carries a `months` dict mapping those keys to a percentage.
+    """
+    if attendance_store.storage() == 'bitmap':
+        totals = attendance_store.student_totals(start, end, branch, year,
+                                                 period=lambda day: day.strftime('%Y-%m'))
+        students = _students_by_id({student_id for student_id, _ in totals})
+        monthly = sorted((students[student_id].roll_number, month_key, student_id, attended, total)
+                         for (student_id, month_key), (attended, total) in totals.items())
+        months = sorted({row[1] for row in monthly})
+        rows = []
+        for roll_number, month_key, student_id, attended, total in monthly:
+            if not rows or rows[-1]['student_id'] != student_id:
+                rows.append({'student_id': student_id, 'name': students[student_id].name,
+                             'roll_number': roll_number, 'months': {}})
+            rows[-1]['months'][month_key] = _percentage(attended, total)
+        return months, rows
+
+    month = func.strftime('%Y-%m', Attendance.date).label('month')
+    query = db.session.query(
+        Student.id, Student.name, Student.roll_number, month, _attended(), func.count()
+    ).join(Student, Student.id == Attendance.student_id)
+    query = _for_class(_in_range(query, start, end), branch, year)
+    monthly = query.group_by(Student.id, Student.name, Student.roll_number, month) \
+        .order_by(Student.roll_number, month).all()
+
+    months = sorted({row[3] for row in monthly})
+    rows = []
+    for student_id, name, roll_number, month_key, attended, total in monthly:
+        if not rows or rows[-1]['student_id'] != student_id:
+            rows.append({'student_id': student_id, 'name': name, 'roll_number': roll_number, 'months': {}})
+        rows[-1]['months'][month_key] = _percentage(attended, total)
+    return months, rows
@@ -0,0 +1,54 @@
+import time
+
+from sqlalchemy import delete, select, update
+
+import archive
+import attendance_store
+from models import db, Student
+from student_import import YEARS
+
+# Academic year rollover. Instead of editing every student through
+# edit_student() and deleting graduates one at a time, the whole college moves
+# up in a handful of set-based statements in one transaction: the final-year
+# cohort's attendance is copied to the yearly archives (or just dropped), the
+# cohort is deleted with its marks, and every remaining student's year goes up
+# by one. A dry run only counts: the same predicates go through SELECT COUNT
+# queries, so previewing never takes the database's write lock.
+#
+# Login accounts (User.year) are not touched; they are not tied to the roster.
+
+FINAL_YEAR = max(YEARS)
+GRADUATES = ('archive', 'remove')  # What happens to the final-year cohort's attendance
+
+
+def rollover(graduates='archive', dry_run=False):
+    """Promote every student one year and remove the final-year cohort; returns a report of the counts"""
+    if graduates not in GRADUATES:
+        raise ValueError(f"graduates must be one of {', '.join(GRADUATES)}, not {graduates!r}")
+    started = time.perf_counter()
+    cohort = select(Student.id).where(Student.year >= FINAL_YEAR)
+    report = {
+        'graduates': db.session.query(Student).filter(Student.year >= FINAL_YEAR).count(),
+        'promoted': dict(db.session.query(Student.year + 1, db.func.count(Student.id))
+                         .filter(Student.year < FINAL_YEAR).group_by(Student.year).all()),
+        'archived': 0,
+    }
+    if dry_run:
+        report['marks'] = attendance_store.count_students_marks(cohort)
+        report['seconds'] = time.perf_counter() - started
+        return report
+    try:
+        # Archiving attaches the archive files, which has to come before anything is written
+        if graduates == 'archive':
+            report['archived'] = archive.archive_student_marks(cohort)
+        report['marks'] = attendance_store.delete_students_marks(cohort)
+        db.session.execute(delete(Student).where(Student.year >= FINAL_YEAR),
+                           execution_options={'synchronize_session': False})
+        db.session.execute(update(Student).values(year=Student.year + 1),
+                           execution_options={'synchronize_session': False})
+    except Exception:
+        db.session.rollback()
+        raise
+    db.session.commit()
+    report['seconds'] = time.perf_counter() - started
+    return report
@@ -0,0 +1,92 @@
+import re
+
+from sqlalchemy import DDL, event, text
+from sqlalchemy.orm import joinedload
+
+from models import db, Note, Message, Complaint, LostFound
+
+# Full-text search over the posting tables using SQLite FTS5. Each source table
+# gets an external-content FTS index (the text is not stored twice) that
+# triggers keep in step with every insert, update and delete.
+
+SEARCH_SOURCES = {
+    'notes': (Note, ['title', 'content']),
+    'messages': (Message, ['content']),
+    'complaints': (Complaint, ['title', 'message']),
+    'lost_found': (LostFound, ['title', 'description', 'location']),
+}
+
+
+def _fts_ddl(model, columns):
+    table = model.__table__.name
+    fts = f'{table}_fts'
+    cols = ', '.join(columns)
+    new_values = ', '.join(f'new.{column}' for column in columns)
+    old_values = ', '.join(f'old.{column}' for column in columns)
+    insert_new = f'INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values});'
+    delete_old = f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{table}', "
+        f"content_rowid='id', tokenize='porter unicode61', prefix='2 3')",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN {insert_new} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN {delete_old} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {cols} ON {table} '
+        f'BEGIN {delete_old} {insert_new} END',
+    ]
+
+
+for _model, _columns in SEARCH_SOURCES.values():
+    for _statement in _fts_ddl(_model, _columns):
+        event.listen(_model.__table__, 'after_create', DDL(_statement))
+
+
+def rebuild_search_index():
+    """Create any missing FTS tables and triggers, then reindex every source table"""
+    for model, columns in SEARCH_SOURCES.values():
+        for statement in _fts_ddl(model, columns):
+            db.session.execute(text(statement))
+        fts = f'{model.__table__.name}_fts'
+        db.session.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+    db.session.commit()
+
+
+def build_match_query(query):
+    """Turn free text into a safe FTS5 expression: every word must appear, as a prefix"""
+    terms = re.findall(r'\w+', query or '')
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search(query, user, kinds=None, limit=20):
+    """Ranked matches per source as {kind: [(obj, snippet), ...]}.
+
+    Notes are restricted to public ones and the user's own private notes.
+    """
+    match = build_match_query(query)
+    if not match:
+        return {}
+
+    results = {}
+    for kind, (model, _) in SEARCH_SOURCES.items():
+        if kinds and kind not in kinds:
+            continue
+        table = model.__table__.name
+        fts = f'{table}_fts'
+        visibility = ''
+        params = {'match': match, 'limit': limit}
+        if model is Note:
+            visibility = 'AND (src.is_public = 1 OR src.posted_by = :user_id)'
+            params['user_id'] = user.id
+
+        rows = db.session.execute(text(
+            f"SELECT src.id, snippet({fts}, -1, '', '', '…', 12) FROM {fts} "
+            f"JOIN {table} AS src ON src.id = {fts}.rowid "
+            f"WHERE {fts} MATCH :match {visibility} "
+            f"ORDER BY bm25({fts}) LIMIT :limit"
+        ), params).all()
+        if not rows:
+            continue
+
+        ids = [row[0] for row in rows]
+        objects = {obj.id: obj for obj in model.query.options(joinedload(model.poster)).filter(model.id.in_(ids))}
+        results[kind] = [(objects[item_id], snippet) for item_id, snippet in rows if item_id in objects]
+    return results
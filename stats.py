@@ -0,0 +1,138 @@
+from datetime import date
+
+from sqlalchemy import DDL, event
+
+from models import db, User, Student, Teacher, Attendance, AttendanceDay, AttendanceOverride, Complaint, LostFound, LostFoundImage, Message, Note, StatCounter
+
+# Dashboard counters live in stat_counter and are kept current by SQLite
+# triggers, so every write path (ORM, bulk upserts, cascades) updates them in
+# the same transaction as the row change itself.
+
+_BUMP = ("INSERT INTO stat_counter (name, value) VALUES ({key}, {delta}) "
+         "ON CONFLICT(name) DO UPDATE SET value = value + ({delta});")
+
+_TRIGGERS = {
+    Student.__table__: [
+        ('trg_student_count_insert', 'AFTER INSERT', None, [("'students'", '1')]),
+        ('trg_student_count_delete', 'AFTER DELETE', None, [("'students'", '-1')]),
+    ],
+    Teacher.__table__: [
+        ('trg_teacher_count_insert', 'AFTER INSERT', None, [("'teachers'", '1')]),
+        ('trg_teacher_count_delete', 'AFTER DELETE', None, [("'teachers'", '-1')]),
+    ],
+    Attendance.__table__: [
+        ('trg_attendance_count_insert', 'AFTER INSERT', None, [("'attendance:' || NEW.date", '1')]),
+        ('trg_attendance_count_delete', 'AFTER DELETE', None, [("'attendance:' || OLD.date", '-1')]),
+        ('trg_attendance_count_move', 'AFTER UPDATE OF date', 'OLD.date != NEW.date',
+         [("'attendance:' || OLD.date", '-1'), ("'attendance:' || NEW.date", '1')]),
+    ],
+}
+
+for _table, _name in [(Complaint.__table__, 'pending_complaints'), (LostFound.__table__, 'open_lost_found')]:
+    _TRIGGERS[_table] = [
+        (f'trg_{_table.name}_open_insert', 'AFTER INSERT', 'COALESCE(NEW.is_resolved, 0) = 0',
+         [(f"'{_name}'", '1')]),
+        (f'trg_{_table.name}_open_delete', 'AFTER DELETE', 'COALESCE(OLD.is_resolved, 0) = 0',
+         [(f"'{_name}'", '-1')]),
+        (f'trg_{_table.name}_open_update', 'AFTER UPDATE OF is_resolved',
+         'COALESCE(OLD.is_resolved, 0) != COALESCE(NEW.is_resolved, 0)',
+         [(f"'{_name}'", 'CASE WHEN COALESCE(NEW.is_resolved, 0) = 0 THEN 1 ELSE -1 END')]),
+    ]
+
+# Table versions for page_cache.py and exports.py: any change to the rows a cached list is
+# built from moves its version on. Users only matter for the poster details.
+for _table, _timings in [
+    (Student.__table__, ['INSERT', 'UPDATE', 'DELETE']),
+    (Teacher.__table__, ['INSERT', 'UPDATE', 'DELETE']),
+    (Complaint.__table__, ['INSERT', 'UPDATE', 'DELETE']),
+    (LostFound.__table__, ['INSERT', 'UPDATE', 'DELETE']),
+    (LostFoundImage.__table__, ['INSERT', 'UPDATE', 'DELETE']),
+    (Message.__table__, ['INSERT', 'UPDATE', 'DELETE']),
+    (Note.__table__, ['INSERT', 'UPDATE', 'DELETE']),
+    (User.__table__, ['UPDATE OF name, branch, phone, role', 'DELETE']),
+]:
+    _TRIGGERS.setdefault(_table, []).extend(
+        (f"trg_{_table.name}_version_{timing.split()[0].lower()}", f'AFTER {timing}', None,
+         [(f"'cache:version:{_table.name}'", '1')])
+        for timing in _timings
+    )
+
+# Attendance is versioned per date so that an export of an unchanged date range
+# keeps its ETag while today's marks are being entered.
+_TRIGGERS[Attendance.__table__].extend([
+    ('trg_attendance_version_insert', 'AFTER INSERT', None, [("'cache:version:attendance:' || NEW.date", '1')]),
+    ('trg_attendance_version_update', 'AFTER UPDATE', None,
+     [("'cache:version:attendance:' || OLD.date", '1'), ("'cache:version:attendance:' || NEW.date", '1')]),
+    ('trg_attendance_version_delete', 'AFTER DELETE', None, [("'cache:version:attendance:' || OLD.date", '1')]),
+])
+
+# Bitmap attendance storage (attendance_store.py) keeps the same counters: a
+# class-day row carries its number of marks, and overrides only move versions.
+_TRIGGERS[AttendanceDay.__table__] = [
+    ('trg_attendance_day_count_insert', 'AFTER INSERT', None, [("'attendance:' || NEW.date", 'NEW.marked_count')]),
+    ('trg_attendance_day_count_update', 'AFTER UPDATE OF marked_count', 'OLD.marked_count != NEW.marked_count',
+     [("'attendance:' || NEW.date", 'NEW.marked_count - OLD.marked_count')]),
+    ('trg_attendance_day_count_delete', 'AFTER DELETE', None, [("'attendance:' || OLD.date", '-OLD.marked_count')]),
+]
+for _table in (AttendanceDay.__table__, AttendanceOverride.__table__):
+    _TRIGGERS.setdefault(_table, []).extend([
+        (f'trg_{_table.name}_version_insert', 'AFTER INSERT', None, [("'cache:version:attendance:' || NEW.date", '1')]),
+        (f'trg_{_table.name}_version_update', 'AFTER UPDATE', None, [("'cache:version:attendance:' || NEW.date", '1')]),
+        (f'trg_{_table.name}_version_delete', 'AFTER DELETE', None, [("'cache:version:attendance:' || OLD.date", '1')]),
+    ])
+
+
+def counter_trigger_ddl(table):
+    """CREATE TRIGGER statements that maintain stat_counter for `table`"""
+    statements = []
+    for trigger_name, timing, condition, bumps in _TRIGGERS.get(table, []):
+        when = f' WHEN {condition}' if condition else ''
+        body = ' '.join(_BUMP.format(key=key, delta=delta) for key, delta in bumps)
+        statements.append(
+            f'CREATE TRIGGER IF NOT EXISTS {trigger_name} {timing} ON {table.name} FOR EACH ROW{when} '
+            f'BEGIN {body} END'
+        )
+    return statements
+
+
+for _table in _TRIGGERS:
+    for _statement in counter_trigger_ddl(_table):
+        event.listen(_table, 'after_create', DDL(_statement))
+
+
+def rebuild_counters():
+    """Recompute every counter from the base tables (for databases that predate the triggers)"""
+    counters = {
+        'students': Student.query.count(),
+        'teachers': Teacher.query.count(),
+        # NULL flags were backfilled by migration 6, so these can use the partial/flag indexes
+        'pending_complaints': Complaint.query.filter(Complaint.is_resolved == False).count(),
+        'open_lost_found': LostFound.query.filter(LostFound.is_resolved == False).count(),
+    }
+    for attendance_date, total in db.session.query(Attendance.date, db.func.count(Attendance.id)) \
+            .group_by(Attendance.date).all():
+        counters[f'attendance:{attendance_date.isoformat()}'] = total
+    for attendance_date, total in db.session.query(AttendanceDay.date, db.func.sum(AttendanceDay.marked_count)) \
+            .group_by(AttendanceDay.date).all():
+        key = f'attendance:{attendance_date.isoformat()}'
+        counters[key] = counters.get(key, 0) + total
+
+    # Cache versions and the cache epoch are not derived from the data; keep them
+    StatCounter.query.filter(~StatCounter.name.startswith('cache:')).delete(synchronize_session=False)
+    db.session.add_all([StatCounter(name=name, value=value) for name, value in counters.items()])
+    db.session.commit()
+    return counters
+
+
+def get_dashboard_stats():
+    """Dashboard numbers read from the counter table in a single primary-key lookup"""
+    today_key = f'attendance:{date.today().isoformat()}'
+    names = ['students', 'teachers', today_key, 'pending_complaints', 'open_lost_found']
+    values = dict(db.session.query(StatCounter.name, StatCounter.value).filter(StatCounter.name.in_(names)).all())
+    return {
+        'total_students': values.get('students', 0),
+        'total_teachers': values.get('teachers', 0),
+        'today_attendance': values.get(today_key, 0),
+        'pending_complaints': values.get('pending_complaints', 0),
+        'recent_lost_found': values.get('open_lost_found', 0)
+    }
@@ -0,0 +1,182 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+
+from sqlalchemy import text
+from werkzeug.utils import secure_filename
+
+from models import db, UploadBlob
+
+# Content-addressed upload store. Every upload is hashed while it streams to
+# disk and kept once under blobs/<aa>/<sha256>, however many notes, messages
+# or lost & found posts reference it. Records store "<sha256>/<original name>"
+# so downloads keep their real filename, and upload_blob.ref_count decides
+# when the bytes can go.
+
+CHUNK_SIZE = 1024 * 1024
+BLOB_DIR = 'blobs'
+
+
+def blob_root(upload_folder):
+    return os.path.join(upload_folder, BLOB_DIR)
+
+
+def is_blob_ref(ref):
+    return bool(ref) and re.fullmatch(r'[0-9a-f]{64}/[^/]+', ref) is not None
+
+
+def blob_hash(ref):
+    return ref.split('/', 1)[0]
+
+
+def blob_path(upload_folder, ref):
+    digest = blob_hash(ref)
+    return os.path.join(blob_root(upload_folder), digest[:2], digest)
+
+
+def _stream_to_temp(stream, directory):
+    """Copy a stream into a temp file in `directory`, returning (path, sha256, size)"""
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return temp_path, digest.hexdigest(), size
+
+
+def _acquire(upload_folder, temp_path, digest, size):
+    # The upsert takes SQLite's write lock before the file is moved into place,
+    # so it cannot interleave with remove_orphan() deleting the same blob.
+    db.session.execute(text(
+        "INSERT INTO upload_blob (sha256, size, ref_count) VALUES (:sha256, :size, 1) "
+        "ON CONFLICT(sha256) DO UPDATE SET ref_count = ref_count + 1"
+    ), {'sha256': digest, 'size': size})
+    target = blob_path(upload_folder, digest)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if os.path.exists(target):
+        os.remove(temp_path)
+    else:
+        os.replace(temp_path, target)
+
+
+def store_upload(upload_folder, file_storage, filename=None):
+    """Save an uploaded FileStorage and return its reference ("<sha256>/<name>").
+
+    Adds one reference to the blob in the current transaction; the caller commits.
+    """
+    root = blob_root(upload_folder)
+    os.makedirs(root, exist_ok=True)
+    name = secure_filename(filename or file_storage.filename)
+    temp_path, digest, size = _stream_to_temp(file_storage.stream, root)
+    _acquire(upload_folder, temp_path, digest, size)
+    return f"{digest}/{name}"
+
+
+def store_file(upload_folder, path, filename):
+    """Copy an existing file on disk into the store (used by the dedupe migration).
+
+    Adds one reference in the current transaction; the caller removes the
+    original once that is committed.
+    """
+    root = blob_root(upload_folder)
+    os.makedirs(root, exist_ok=True)
+    with open(path, 'rb') as source:
+        temp_path, digest, size = _stream_to_temp(source, root)
+    _acquire(upload_folder, temp_path, digest, size)
+    return f"{digest}/{secure_filename(filename)}"
+
+
+def release(ref):
+    """Drop one reference in the current transaction. Returns True if it was the last.
+
+    The file itself stays until remove_orphan() runs after the commit, so a
+    rolled-back release never loses data.
+    """
+    if not is_blob_ref(ref):
+        return False
+    digest = blob_hash(ref)
+    db.session.execute(text("UPDATE upload_blob SET ref_count = ref_count - 1 WHERE sha256 = :sha256"),
+                       {'sha256': digest})
+    deleted = db.session.execute(text("DELETE FROM upload_blob WHERE sha256 = :sha256 AND ref_count <= 0"),
+                                 {'sha256': digest}).rowcount
+    return bool(deleted)
+
+
+def remove_orphan(upload_folder, digest):
+    """Delete a blob file that no longer has an upload_blob row. Returns True if removed."""
+    # A no-op write takes the write lock first, so a concurrent upload of the
+    # same content either sees the row gone and rewrites the file, or wins.
+    db.session.execute(text("UPDATE upload_blob SET ref_count = ref_count WHERE sha256 = :sha256"),
+                       {'sha256': digest})
+    if db.session.get(UploadBlob, digest) is not None:
+        return False
+    path = blob_path(upload_folder, digest)
+    if os.path.exists(path):
+        os.remove(path)
+    return True
+
+
+def dedupe_existing_uploads(upload_folder, batch_size=200):
+    """Move the legacy per-section upload folders into the blob store.
+
+    Records that already hold a blob reference are skipped, so the migration
+    can be interrupted and re-run. Returns (files moved, bytes reclaimed).
+    """
+    from models import Note, Message, LostFoundImage
+
+    sources = [
+        (Note, 'file_path', 'notes'),
+        (Message, 'file_path', 'messages'),
+        (LostFoundImage, 'filename', 'lost_found'),
+    ]
+    before = _tree_size(upload_folder)
+    moved = 0
+    for model, field, section in sources:
+        column = getattr(model, field)
+        while True:
+            batch = model.query.filter(column.isnot(None), ~column.contains('/')) \
+                .order_by(model.id).limit(batch_size).all()
+            if not batch:
+                break
+            copied = set()
+            for record in batch:
+                legacy_name = getattr(record, field)
+                legacy_path = os.path.join(upload_folder, section, legacy_name)
+                if not os.path.exists(legacy_path):
+                    legacy_path = os.path.join(upload_folder, legacy_name)
+                if os.path.exists(legacy_path):
+                    setattr(record, field, store_file(upload_folder, legacy_path, legacy_name))
+                    copied.add(legacy_path)
+                    moved += 1
+                else:
+                    # Nothing on disk to migrate; mark as a dangling reference
+                    setattr(record, field, f"missing/{secure_filename(legacy_name)}")
+            db.session.commit()
+            # Only now: until the commit the records still point at the legacy files
+            for legacy_path in copied:
+                if os.path.exists(legacy_path):
+                    os.remove(legacy_path)
+
+    # Variants of legacy lost & found images were keyed by filename; they are rebuilt per blob
+    shutil.rmtree(os.path.join(upload_folder, 'lost_found', 'derived'), ignore_errors=True)
+    return moved, max(before - _tree_size(upload_folder), 0)
+
+
+def _tree_size(path):
+    total = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(directory, name))
+    return total
@@ -0,0 +1,165 @@
+import codecs
+import csv
+import time
+
+from sqlalchemy.dialects.sqlite import insert
+
+from models import db, Student
+
+# Bulk student import from CSV or XLSX. Rows are read one at a time from the
+# uploaded stream and handled in batches: each batch is validated in Python,
+# checked against the database with a single roll_number IN (...) lookup and
+# written with one executemany INSERT in its own transaction. Duplicates inside
+# the file are caught with a set of the roll numbers seen so far.
+
+COLUMNS = ('name', 'branch', 'year', 'roll_number')
+YEARS = (1, 2, 3, 4)
+BATCH_SIZE = 5000
+MAX_ERRORS = 1000  # Errors kept for the report; the count covers all of them
+
+
+class ImportFormatError(ValueError):
+    """The file as a whole cannot be read (wrong type, missing columns, ...)"""
+
+
+def _header(cells):
+    columns = [str(cell or '').strip().lower().replace(' ', '_') for cell in cells]
+    missing = [column for column in COLUMNS if column not in columns]
+    if missing:
+        raise ImportFormatError(f"Missing column(s): {', '.join(missing)}")
+    return columns
+
+
+def _decoded_lines(stream):
+    # Excel on Windows saves CSV in the ANSI code page, not UTF-8, so a line
+    # that does not decode as UTF-8 is read as cp1252 instead of failing the
+    # import halfway through
+    for number, line in enumerate(stream):
+        if number == 0 and line.startswith(codecs.BOM_UTF8):
+            line = line[len(codecs.BOM_UTF8):]
+        try:
+            yield line.decode('utf-8')
+        except UnicodeDecodeError:
+            yield line.decode('cp1252', errors='replace')
+
+
+def _csv_rows(stream):
+    reader = csv.reader(_decoded_lines(stream))
+    columns = _header(next(reader, []))
+    for line, cells in enumerate(reader, start=2):
+        if any(cell.strip() for cell in cells):
+            yield line, dict(zip(columns, cells))
+
+
+def _xlsx_rows(stream):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFormatError('XLSX import needs the openpyxl package; upload a CSV instead')
+    # read_only mode streams the sheet XML instead of building every cell
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        columns = _header(next(rows, []))
+        for line, cells in enumerate(rows, start=2):
+            if any(cell not in (None, '') for cell in cells):
+                yield line, dict(zip(columns, ('' if cell is None else str(cell) for cell in cells)))
+    finally:
+        workbook.close()
+
+
+def read_rows(stream, filename):
+    """(line number, {column: text}) for every non-blank data row of a CSV or XLSX file"""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension == 'csv':
+        return _csv_rows(stream)
+    if extension == 'xlsx':
+        return _xlsx_rows(stream)
+    raise ImportFormatError('Upload a .csv or .xlsx file')
+
+
+def _validate(row, branches):
+    """(student dict, None) for a good row, else (None, error message)"""
+    name = (row.get('name') or '').strip()
+    branch = (row.get('branch') or '').strip()
+    roll_number = (row.get('roll_number') or '').strip()
+    year = (row.get('year') or '').strip()
+    if year.endswith('.0'):
+        year = year[:-2]  # Spreadsheets store numbers as floats
+
+    if not name or len(name) > 100:
+        return None, 'name is required (at most 100 characters)'
+    if not branch or len(branch) > 50:
+        return None, 'branch is required (at most 50 characters)'
+    if branches and branch.upper() not in branches:
+        return None, f'unknown branch {branch!r}'
+    if not year.isdigit() or int(year) not in YEARS:
+        return None, f'year must be one of {", ".join(map(str, YEARS))}'
+    if not roll_number or len(roll_number) > 20:
+        return None, 'roll_number is required (at most 20 characters)'
+    return {'name': name, 'branch': branch.upper() if branches else branch, 'year': int(year),
+            'roll_number': roll_number}, None
+
+
+def import_students(rows, branches=(), batch_size=BATCH_SIZE, dry_run=False):
+    """Validate and insert (line, row) pairs; returns a summary with a per-row error list.
+
+    `branches` restricts the accepted branch codes (any when empty). With
+    `dry_run` everything is checked but nothing is written.
+    """
+    branches = {branch.upper() for branch in branches}
+    started = time.perf_counter()
+    report = {'rows': 0, 'imported': 0, 'error_count': 0, 'errors': []}
+    seen = set()
+
+    def error(line, roll_number, message):
+        report['error_count'] += 1
+        if len(report['errors']) < MAX_ERRORS:
+            report['errors'].append((line, roll_number, message))
+
+    def flush(batch):
+        if not batch:
+            return
+        # One set-based lookup for the whole batch instead of a SELECT per student
+        existing = {roll for (roll,) in db.session.query(Student.roll_number)
+                    .filter(Student.roll_number.in_([student['roll_number'] for _, student in batch]))}
+        new_rows = []
+        for line, student in batch:
+            if student['roll_number'] in existing:
+                error(line, student['roll_number'], 'roll_number already exists')
+            else:
+                new_rows.append((line, student))
+        if new_rows and not dry_run:
+            # DO NOTHING covers a student added by someone else since the lookup;
+            # RETURNING tells which rows that skipped
+            statement = insert(Student.__table__).on_conflict_do_nothing(index_elements=['roll_number']) \
+                .returning(Student.__table__.c.roll_number)
+            inserted = set(db.session.execute(statement, [student for _, student in new_rows]).scalars())
+            db.session.commit()
+            report['imported'] += len(inserted)
+            for line, student in new_rows:
+                if student['roll_number'] not in inserted:
+                    error(line, student['roll_number'], 'roll_number already exists')
+        elif dry_run:
+            report['imported'] += len(new_rows)
+
+    batch = []
+    for line, row in rows:
+        report['rows'] += 1
+        student, message = _validate(row, branches)
+        if message:
+            error(line, (row.get('roll_number') or '').strip(), message)
+            continue
+        if student['roll_number'] in seen:
+            error(line, student['roll_number'], 'roll_number appears earlier in the file')
+            continue
+        seen.add(student['roll_number'])
+        batch.append((line, student))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    flush(batch)
+
+    report['errors'].sort()
+    report['seconds'] = time.perf_counter() - started
+    return report
@@ -0,0 +1,68 @@
+import os
+import sys
+
+import pytest
+from flask import g, request_finished
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+SEED_SCALE = 0.002  # 100 students, 400 messages, 40 notes and complaints: enough rows for N+1s to repeat
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """The application on a small seeded database; app.py reads its settings at import time"""
+    instance = tmp_path_factory.mktemp('instance')
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{instance / 'college_app.db'}",
+        'UPLOAD_FOLDER': str(instance / 'uploads'),
+        'ARCHIVE_DIR': str(instance / 'archive'),
+        'PAGE_CACHE_BACKEND': 'none',
+        'JOB_WORKERS': '0',
+        'PASSWORD_HASH_WORKERS': '0',
+        'QUERY_AUDIT': '1',  # The auditor has to be installed before the first request
+    })
+    import seed_data
+    seed_data.seed(SEED_SCALE, attendance_days=5, log=lambda message: None)
+    import app as application
+    application.init_db()
+    return application.app
+
+
+@pytest.fixture
+def admin_client(app):
+    from query_plans import admin_client
+    return admin_client(app)
+
+
+@pytest.fixture
+def query_budget(app):
+    """Query audit reports of the requests the test makes.
+
+    The test fails if any of them runs more than QUERY_BUDGET queries, repeats
+    a statement past QUERY_AUDIT_REPEAT_LIMIT (N+1) or queries from a template.
+    """
+    reports = []
+
+    def collect(sender, response, **extra):
+        reports.append(g.query_audit_report)
+
+    request_finished.connect(collect, app)
+    yield reports
+    request_finished.disconnect(collect, app)
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_call(item):
+    result = yield
+    reports = item.funcargs.get('query_budget')
+    if reports:
+        import query_audit
+        budget = item.funcargs['app'].config['QUERY_BUDGET']
+        failures = [report for report in reports if query_audit.over_budget(report, budget)]
+        if failures:
+            pytest.fail(f'{len(failures)} request(s) over the query budget of {budget} or with N+1 queries\n' +
+                        '\n'.join(query_audit.format_report(report) for report in failures), pytrace=False)
+    return result
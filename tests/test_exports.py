@@ -0,0 +1,24 @@
+import io
+import zipfile
+
+from models import db, Complaint, User
+
+
+def test_complaints_of_deleted_accounts_are_exported(app, admin_client):
+    with app.app_context():
+        user = User(name='Former Student', phone='5550000001', role='student', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(Complaint(title='Broken projector in lab 2', message='Since March', posted_by=user.id))
+        db.session.commit()
+        db.session.execute(db.text('DELETE FROM user WHERE id = :id'), {'id': user.id})
+        db.session.commit()
+
+    response = admin_client.get('/export/complaints')
+    assert response.status_code == 200
+    assert 'Broken projector in lab 2' in response.get_data(as_text=True)
+
+    response = admin_client.get('/export/complaints?format=xlsx')
+    with zipfile.ZipFile(io.BytesIO(response.data)) as workbook:
+        assert workbook.testzip() is None
+        assert b'Broken projector in lab 2' in workbook.read('xl/worksheets/sheet1.xml')
@@ -0,0 +1,91 @@
+import re
+
+import pytest
+from flask import Flask
+
+from file_responses import send_stored_file
+
+CONTENT = bytes(range(256)) * 64
+SIZE = len(CONTENT)
+
+
+@pytest.fixture
+def stored(tmp_path):
+    path = tmp_path / 'notes.pdf'
+    path.write_bytes(CONTENT)
+    app = Flask(__name__)
+    app.add_url_rule('/file', 'file', lambda: send_stored_file(str(path), etag='abc123'))
+    return app.test_client()
+
+
+def _parts(response):
+    """[(Content-Range, payload)] of a multipart/byteranges body"""
+    boundary = response.mimetype_params['boundary'].encode()
+    body = response.data
+    assert body.endswith(b'--' + boundary + b'--\r\n')
+    parts = []
+    for chunk in body.split(b'--' + boundary)[1:-1]:
+        head, payload = chunk.lstrip(b'\r\n').split(b'\r\n\r\n', 1)
+        headers = dict(line.split(': ', 1) for line in head.decode().split('\r\n'))
+        assert headers['Content-Type'] == 'application/pdf'
+        parts.append((headers['Content-Range'], payload[:-2] if payload.endswith(b'\r\n') else payload))
+    return parts
+
+
+@pytest.mark.parametrize('header, start, stop', [
+    ('bytes=10-19', 10, 20),
+    ('bytes=-100', SIZE - 100, SIZE),
+    ('bytes=16000-', 16000, SIZE),
+    ('bytes=0-99,50-149', 0, 150),  # Overlapping ranges are merged into one
+])
+def test_single_range(stored, header, start, stop):
+    response = stored.get('/file', headers={'Range': header})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes {start}-{stop - 1}/{SIZE}'
+    assert response.content_length == stop - start
+    assert response.data == CONTENT[start:stop]
+
+
+def test_multi_range(stored):
+    response = stored.get('/file', headers={'Range': 'bytes=0-9,100-109,-5'})
+    assert response.status_code == 206
+    assert response.mimetype == 'multipart/byteranges'
+    assert response.content_length == len(response.data)
+    assert _parts(response) == [
+        (f'bytes 0-9/{SIZE}', CONTENT[0:10]),
+        (f'bytes 100-109/{SIZE}', CONTENT[100:110]),
+        (f'bytes {SIZE - 5}-{SIZE - 1}/{SIZE}', CONTENT[-5:]),
+    ]
+
+
+@pytest.mark.parametrize('header', ['bytes=20000-', 'bytes=20000-,30000-'])
+def test_unsatisfiable_range(stored, header):
+    response = stored.get('/file', headers={'Range': header})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{SIZE}'
+
+
+def test_matching_etag_wins_over_multi_range(stored):
+    response = stored.get('/file', headers={'Range': 'bytes=0-9,100-109', 'If-None-Match': '"abc123"'})
+    assert response.status_code == 304
+    assert not response.data
+    assert 'Content-Range' not in response.headers
+
+
+def test_matching_etag_wins_over_single_range(stored):
+    response = stored.get('/file', headers={'Range': 'bytes=0-9', 'If-None-Match': '"abc123"'})
+    assert response.status_code == 304
+    assert not response.data
+
+
+def test_unmodified_since_wins_over_multi_range(stored):
+    last_modified = stored.get('/file').headers['Last-Modified']
+    response = stored.get('/file', headers={'Range': 'bytes=0-9,100-109', 'If-Modified-Since': last_modified})
+    assert response.status_code == 304
+    assert not response.data
+
+
+def test_stale_etag_gets_the_ranges(stored):
+    response = stored.get('/file', headers={'Range': 'bytes=0-9,100-109', 'If-None-Match': '"old"'})
+    assert response.status_code == 206
+    assert [payload for _, payload in _parts(response)] == [CONTENT[0:10], CONTENT[100:110]]
@@ -0,0 +1,30 @@
+import live
+from models import db, Message
+
+
+def test_long_poll_is_capped_with_the_streams(app, admin_client, monkeypatch):
+    with app.app_context():
+        newest = db.session.query(db.func.max(Message.id)).scalar()
+    monkeypatch.setitem(app.config, 'LIVE_MAX_STREAMS', 0)
+    # Nothing newer to hand back, so the poll would have to wait
+    response = admin_client.get(f'/communication/updates?after={newest}')
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
+    # A catch-up is still answered straight away
+    response = admin_client.get(f'/communication/updates?after={newest - 1}')
+    assert response.status_code == 200
+    assert [event['id'] for event in response.json['events']] == [newest]
+
+
+def test_watcher_publishes_messages_from_other_processes(app):
+    with app.app_context():
+        live.feed.watermark = None
+        live._watch_once()  # Starts from the current newest message
+        message = Message(content='Posted by another worker', posted_by=1)
+        db.session.add(message)
+        db.session.commit()
+        live._watch_once()
+        event = live.feed.events[-1]
+        assert (event.kind, event.message_id) == ('message', message.id)
+    assert f'href="/delete_message/{message.id}"' in event.html_admin
+    assert '<!--owner:1-->' in event.html_member
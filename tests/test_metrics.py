@@ -0,0 +1,32 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+
+import metrics
+from models import db
+
+
+def _stored(app, name, labels):
+    with app.app_context():
+        metrics.flush()
+        return db.session.execute(db.text('SELECT value FROM metric_value WHERE name = :name AND labels = :labels'),
+                                  {'name': name, 'labels': labels}).scalar() or 0
+
+
+def test_streamed_export_bytes_are_counted(app, admin_client):
+    labels = 'endpoint="export",method="GET"'
+    before = _stored(app, 'http_response_bytes_total', labels)
+    response = admin_client.get('/export/students')
+    body = response.get_data()
+    response.close()
+    assert body
+    assert _stored(app, 'http_response_bytes_total', labels) - before == len(body)
+
+
+def test_failed_statement_does_not_misalign_timings(app):
+    with app.app_context():
+        with db.engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.exec_driver_sql('SELECT * FROM no_such_table')
+            assert not conn.info.get('query_started')
+            conn.exec_driver_sql('SELECT 1')
+            assert not conn.info.get('query_started')
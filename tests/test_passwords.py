@@ -0,0 +1,32 @@
+import os
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+import passwords
+
+
+@pytest.fixture
+def configure(app):
+    """Re-initialise the passwords module with some settings changed; restored afterwards"""
+    def configure(**settings):
+        config = dict(app.config, **settings)
+        passwords.init_app(type('App', (), {'config': config}))
+    yield configure
+    passwords.init_app(app)
+
+
+@pytest.mark.parametrize('method', ['scrypt', 'pbkdf2', 'pbkdf2:sha256:1000'])
+def test_hash_made_with_the_configured_method_is_current(configure, method):
+    configure(PASSWORD_HASH_METHOD=method, PASSWORD_HASH_WORKERS=0)
+    assert not passwords.needs_rehash(generate_password_hash('secret', method))
+    assert passwords.needs_rehash(generate_password_hash('secret', 'pbkdf2:sha256:999'))
+
+
+def test_dead_worker_does_not_break_later_hashes(configure):
+    configure(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE=2, PASSWORD_HASH_METHOD='pbkdf2:sha256:1000')
+    with pytest.raises(passwords.HashingBusy):
+        passwords._run('hash', os._exit, 1)  # The worker process dies mid-call
+    assert passwords.in_flight() == 0
+    for _ in range(3):  # More than PASSWORD_HASH_QUEUE: every slot was given back
+        assert passwords.verify_password(passwords.hash_password('secret'), 'secret')
@@ -0,0 +1,10 @@
+from query_plans import default_requests
+
+
+def test_main_pages_within_query_budget(app, admin_client, query_budget):
+    with app.app_context():
+        requests = default_requests()
+    for method, path, form in requests:
+        response = admin_client.open(path, method=method, data=form)
+        assert response.status_code < 500, path
+    assert len(query_budget) == len(requests)
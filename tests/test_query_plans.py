@@ -0,0 +1,7 @@
+from query_plans import find_table_scans
+
+
+def test_main_pages_use_indexes(app):
+    scans = find_table_scans(app)
+    assert scans == [], '\n'.join(f"{path}: {' '.join(sql.split())}\n  plan: {'; '.join(plan)}"
+                                   for path, sql, plan in scans)
@@ -0,0 +1,36 @@
+from datetime import date
+
+from sqlalchemy import event
+
+import attendance_store
+import rollover
+from models import db, Student, User
+
+
+def test_dry_run_only_reads_and_matches_the_rollover(app):
+    with app.app_context():
+        admin_id = User.query.filter_by(role='admin').first().id
+        students = [Student(name=f'Rollover {year}', branch='MECH', year=year, roll_number=f'R{year}')
+                    for year in rollover.YEARS]
+        db.session.add_all(students)
+        db.session.flush()
+        for day in (1, 2):
+            attendance_store.upsert_attendance({student.id: 'Present' for student in students},
+                                               date(2026, 3, day), admin_id)
+        db.session.commit()
+
+        statements = []
+        record = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            preview = rollover.rollover(dry_run=True)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        assert all(statement.lstrip().upper().startswith('SELECT') for statement in statements)
+
+        report = rollover.rollover('remove')
+        for key in ('graduates', 'promoted', 'marks'):
+            assert preview[key] == report[key]
+        assert report['marks'] >= 2
+        assert Student.query.filter_by(roll_number=f'R{rollover.FINAL_YEAR}').first() is None
+        assert Student.query.filter_by(roll_number='R1').one().year == 2
@@ -0,0 +1,54 @@
+import hashlib
+import importlib
+import io
+import os
+
+import pytest
+
+from models import db, LostFound, LostFoundImage, Note, UploadBlob
+from storage import blob_path, dedupe_existing_uploads
+
+
+def test_interrupted_dedupe_keeps_the_legacy_files(app, monkeypatch):
+    upload_folder = app.config['UPLOAD_FOLDER']
+    os.makedirs(os.path.join(upload_folder, 'notes'), exist_ok=True)
+    legacy_path = os.path.join(upload_folder, 'notes', 'legacy_syllabus.pdf')
+    with open(legacy_path, 'wb') as f:
+        f.write(b'legacy syllabus')
+    with app.app_context():
+        note = Note(title='Syllabus', content='Old upload', posted_by=1, file_path='legacy_syllabus.pdf')
+        db.session.add(note)
+        db.session.commit()
+        note_id = note.id
+
+        def interrupted():
+            raise KeyboardInterrupt
+        with monkeypatch.context() as patch:
+            patch.setattr(db.session, 'commit', interrupted)
+            with pytest.raises(KeyboardInterrupt):
+                dedupe_existing_uploads(upload_folder)
+        db.session.rollback()
+        assert os.path.exists(legacy_path)
+        assert db.session.get(Note, note_id).file_path == 'legacy_syllabus.pdf'
+
+        assert dedupe_existing_uploads(upload_folder)[0] == 1
+        ref = db.session.get(Note, note_id).file_path
+    assert ref == f"{hashlib.sha256(b'legacy syllabus').hexdigest()}/legacy_syllabus.pdf"
+    assert not os.path.exists(legacy_path)
+    with open(blob_path(upload_folder, ref), 'rb') as f:
+        assert f.read() == b'legacy syllabus'
+
+
+def test_failed_image_does_not_keep_its_blob_reference(app, admin_client, monkeypatch):
+    def broken(kind, **payload):
+        raise RuntimeError('queue unavailable')
+    monkeypatch.setattr(importlib.import_module('app'), 'enqueue', broken)
+    content = b'\xff\xd8 not really a photo'
+    response = admin_client.post('/post_lost_found', data={
+        'title': 'Umbrella with a failed photo', 'description': 'Black umbrella', 'type': 'lost',
+        'item_images': (io.BytesIO(content), 'umbrella.jpg')})
+    assert response.status_code == 302
+    with app.app_context():
+        post = LostFound.query.filter_by(title='Umbrella with a failed photo').one()
+        assert LostFoundImage.query.filter_by(lost_found_id=post.id).count() == 0
+        assert db.session.get(UploadBlob, hashlib.sha256(content).hexdigest()) is None
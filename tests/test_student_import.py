@@ -0,0 +1,48 @@
+import io
+
+from sqlalchemy import event
+
+import student_import
+from models import db, Student
+
+
+def test_import_latin1_csv(app, admin_client):
+    # What Excel on Windows saves as "CSV": cp1252, not UTF-8
+    data = 'name,branch,year,roll_number\nJos\u00e9 Mu\u00f1oz,CSE,2,L1001\nRen\u00e9e Fa\u00dfbender,ECE,1,L1002\n'
+    response = admin_client.post('/import_students', data={'file': (io.BytesIO(data.encode('latin-1')), 'students.csv')})
+    assert response.status_code == 200
+    assert b'Imported 2 of 2 students' in response.data
+    with app.app_context():
+        names = {student.roll_number: student.name for student in Student.query.filter(
+            Student.roll_number.in_(['L1001', 'L1002']))}
+    assert names == {'L1001': 'Jos\u00e9 Mu\u00f1oz', 'L1002': 'Ren\u00e9e Fa\u00dfbender'}
+
+
+def test_import_utf8_csv_with_bom(app, admin_client):
+    data = '\ufeffname,branch,year,roll_number\nZo\u00eb \u0141ukasz,CSE,3,U1001\n'
+    response = admin_client.post('/import_students', data={'file': (io.BytesIO(data.encode('utf-8')), 'students.csv')})
+    assert b'Imported 1 of 1 students' in response.data
+    with app.app_context():
+        assert Student.query.filter_by(roll_number='U1001').one().name == 'Zo\u00eb \u0141ukasz'
+
+
+def test_student_added_during_the_import_is_reported(app):
+    rows = [(2, {'name': 'Asha', 'branch': 'CSE', 'year': '1', 'roll_number': 'C2001'}),
+            (3, {'name': 'Bilal', 'branch': 'CSE', 'year': '1', 'roll_number': 'C2002'})]
+
+    def someone_else_adds_c2002(conn, cursor, statement, parameters, context, executemany):
+        # Between the roll_number lookup and the INSERT, on the raw cursor so no event fires again
+        if statement.startswith('INSERT INTO student'):
+            cursor.connection.cursor().execute(
+                "INSERT INTO student (name, branch, year, roll_number) VALUES ('Other', 'CSE', 1, 'C2002')")
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', someone_else_adds_c2002)
+        try:
+            report = student_import.import_students(rows)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', someone_else_adds_c2002)
+        assert Student.query.filter_by(roll_number='C2002').one().name == 'Other'
+    assert report['imported'] == 1
+    assert report['errors'] == [(3, 'C2002', 'roll_number already exists')]
+    assert report['rows'] == report['imported'] + report['error_count']
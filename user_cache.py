@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from flask_login import UserMixin
+from sqlalchemy import event, inspect, text
+
+import metrics
+from models import db, User, UserCacheInvalidation
+
+# Flask-Login user cache. Every authenticated request (each image on a lost &
+# found page included) needs current_user, so users are kept as small
+# detached records for USER_CACHE_TTL seconds instead of being re-read each
+# time. Updating or deleting a User through the ORM evicts it locally and
+# appends its id to user_cache_invalidation in the same transaction; every
+# process reads that log at most once per USER_CACHE_POLL_SECONDS and evicts
+# the ids it finds, so a role change reaches all workers within a poll
+# interval. Bulk Query.update()/delete() bypass this and must call invalidate().
+
+CACHED_FIELDS = ('id', 'name', 'branch', 'year', 'phone', 'role')
+LOG_RETENTION = timedelta(days=1)  # Far longer than any TTL, so no cache can still need older entries
+
+
+class CachedUser(UserMixin):
+    """Read-only copy of the User columns that requests look at"""
+    __slots__ = CACHED_FIELDS
+
+    def __init__(self, user):
+        for field in CACHED_FIELDS:
+            setattr(self, field, getattr(user, field))
+
+    def __repr__(self):
+        return f'<CachedUser {self.id}>'
+
+
+_settings = {'ttl': 60, 'poll': 2, 'size': 10000}
+_entries = OrderedDict()
+_lock = threading.Lock()
+_log_position = [None, 0.0]  # Last invalidation id seen, when the log was last read
+
+
+def init_app(app):
+    _settings.update(
+        ttl=app.config['USER_CACHE_TTL'],
+        poll=app.config['USER_CACHE_POLL_SECONDS'],
+        size=app.config['USER_CACHE_SIZE'],
+    )
+
+
+def _evict(user_ids):
+    with _lock:
+        for user_id in user_ids:
+            _entries.pop(user_id, None)
+
+
+def _read_invalidations():
+    now = time.monotonic()
+    last_id, last_read = _log_position
+    if last_id is not None and now - last_read < _settings['poll']:
+        return
+    if last_id is None:
+        # First read in this process: nothing cached yet, just find the end of the log
+        end = db.session.execute(text('SELECT MAX(id) FROM user_cache_invalidation')).scalar()
+        _log_position[:] = [end or 0, now]
+        return
+    rows = db.session.execute(text('SELECT id, user_id FROM user_cache_invalidation WHERE id > :last_id'),
+                              {'last_id': last_id}).all()
+    _evict(row.user_id for row in rows)
+    _log_position[:] = [max((row.id for row in rows), default=last_id), now]
+
+
+def load(user_id):
+    """The CachedUser for an id, or None if there is no such user"""
+    if not _settings['ttl']:
+        user = db.session.get(User, user_id)
+        return CachedUser(user) if user else None
+
+    _read_invalidations()
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry and entry[1] > now:
+            _entries.move_to_end(user_id)
+            metrics.count('user_cache_lookups_total', 'result="hit"')
+            return entry[0]
+
+    metrics.count('user_cache_lookups_total', 'result="miss"')
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    record = CachedUser(user)
+    with _lock:
+        _entries[user_id] = (record, now + _settings['ttl'])
+        _entries.move_to_end(user_id)
+        while len(_entries) > _settings['size']:
+            _entries.popitem(last=False)
+    return record
+
+
+def invalidate(user_id, connection=None):
+    """Drop a user from every process's cache; commits with the caller's transaction"""
+    _evict([user_id])
+    log = UserCacheInvalidation.__table__
+    now = datetime.utcnow()
+    execute = connection.execute if connection is not None else db.session.execute
+    execute(log.insert().values(user_id=user_id, created_at=now))
+    execute(log.delete().where(log.c.created_at < now - LOG_RETENTION))
+
+
+def _user_changed(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in CACHED_FIELDS + ('password_hash',)):
+        invalidate(target.id, connection)
+
+
+def _user_deleted(mapper, connection, target):
+    invalidate(target.id, connection)
+
+
+event.listen(User, 'after_update', _user_changed)
+event.listen(User, 'after_delete', _user_deleted)